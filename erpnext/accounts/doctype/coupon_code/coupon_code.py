@@ -8,7 +8,10 @@ import json
 
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import (strip)
+from frappe.utils import (strip, cstr)
+
+# compiled coupon scripts keyed by site, coupon and modified timestamp
+compiled_scripts = {}
 
 class CouponCode(Document):
 	def autoname(self):
@@ -111,7 +114,6 @@ def run_brackets_script(script, doc, coupon):
 		doc - The document to run script against.
 		coupon - The coupon document being applied.
 	"""
-	from erpnext.bloombrackets import run_script
 	from erpnext.bloombrackets.coupon_commands import build_context
 
 	# Prime script context with the document, coupon and undo_script vars.
@@ -123,6 +125,31 @@ def run_brackets_script(script, doc, coupon):
 		}
 	}
 
+	compiled_script = get_compiled_script(script, coupon)
+	if not compiled_script:
+		return
+
+	# build the runtime context for the script but don't build metadata info.
+	build_context(ctx, doc.doctype, skip_meta=True)
+	compiled_script(ctx)
+
+	return ctx
+
+def get_compiled_script(script, coupon=None):
+	"""Returns the compiled bloombracket script, cached by coupon and its modified timestamp
+
+	Params:
+		script - The script to compile. Can be string or list block
+		coupon - The coupon document the script belongs to, if any.
+	"""
+	from erpnext.bloombrackets import compile_script
+
+	key = None
+	if coupon and script is coupon.brackets_code:
+		key = (frappe.local.site, coupon.name, cstr(coupon.modified))
+		if key in compiled_scripts:
+			return compiled_scripts[key]
+
 	# parse script if a string is passed.
 	if isinstance(script, str):
 		try:
@@ -131,8 +158,11 @@ def run_brackets_script(script, doc, coupon):
 			print(ex)
 			return
 
-	# build the runtime context for the script but don't build metadata info.
-	build_context(ctx, doc.doctype, skip_meta=True)
-	run_script(script, ctx)
+	compiled_script = compile_script(script)
 
-	return ctx
+	if key:
+		if len(compiled_scripts) > 1000:
+			compiled_scripts.clear()
+		compiled_scripts[key] = compiled_script
+
+	return compiled_script
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, add_months, cstr, flt, get_first_day, get_last_day, getdate, now
+
+# number of balance rows written per INSERT query
+GL_BALANCE_INSERT_BATCH_SIZE = 500
+
+BALANCE_DIMENSIONS = ["company", "account", "party_type", "party", "cost_center",
+	"period_start_date", "is_period_closing"]
+BALANCE_AMOUNTS = ["debit", "credit", "debit_in_account_currency", "credit_in_account_currency"]
+
+class GLBalance(Document):
+	pass
+
+def add_gl_balances(gl_entries):
+	"""Add the given GL Entries (names) to the balance of their monthly period"""
+	if gl_entries:
+		update_gl_balances(get_gl_entry_totals("name in ({0})".format(
+			", ".join(["%s"] * len(gl_entries))), tuple(gl_entries)))
+
+def remove_gl_balances(voucher_type, voucher_no):
+	"""Subtract the GL Entries of the voucher from the balances, call before deleting them"""
+	update_gl_balances(get_gl_entry_totals("voucher_type = %s and voucher_no = %s",
+		(voucher_type, voucher_no)), sign=-1)
+
+def get_gl_entry_totals(condition, values):
+	return frappe.db.sql("""
+		select company, account, ifnull(party_type, '') as party_type, ifnull(party, '') as party,
+			ifnull(cost_center, '') as cost_center, posting_date,
+			if(voucher_type = 'Period Closing Voucher', 1, 0) as is_period_closing,
+			sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
+		where {0}
+		group by company, account, party_type, party, cost_center, posting_date, is_period_closing
+	""".format(condition), values, as_dict=1)
+
+def update_gl_balances(gl_entry_totals, sign=1):
+	balances = {}
+	for d in gl_entry_totals:
+		d.period_start_date = get_first_day(d.posting_date)
+		key = tuple(cstr(d.get(dimension)) for dimension in BALANCE_DIMENSIONS)
+
+		if key not in balances:
+			balances[key] = frappe._dict({dimension: d.get(dimension) for dimension in BALANCE_DIMENSIONS})
+			balances[key].update({amount: 0.0 for amount in BALANCE_AMOUNTS})
+
+		for amount in BALANCE_AMOUNTS:
+			balances[key][amount] += sign * flt(d.get(amount))
+
+	if balances:
+		insert_gl_balances(balances)
+
+def insert_gl_balances(balances):
+	"""
+		Insert the amounts as new delta rows. Postings never update a shared row, so
+		concurrent postings to the same account do not wait for each other's commit.
+		The rows of the same dimensions are summed by the readers and merged by `compact_gl_balances`.
+	"""
+	timestamp, user = now(), frappe.session.user
+	columns = ["name", "creation", "modified", "owner", "modified_by", "docstatus"] \
+		+ BALANCE_DIMENSIONS + BALANCE_AMOUNTS
+
+	rows = []
+	for key, d in balances.items():
+		d.update({
+			"name": frappe.generate_hash(length=20),
+			"creation": timestamp,
+			"modified": timestamp,
+			"owner": user,
+			"modified_by": user,
+			"docstatus": 0
+		})
+		rows.append(d)
+
+	for start in range(0, len(rows), GL_BALANCE_INSERT_BATCH_SIZE):
+		batch = rows[start:start + GL_BALANCE_INSERT_BATCH_SIZE]
+
+		values = []
+		for d in batch:
+			values.extend([d.get(column) for column in columns])
+
+		frappe.db.sql("""insert into `tabGL Balance` ({0}) values {1}""".format(
+			", ".join("`{0}`".format(column) for column in columns),
+			", ".join(["({0})".format(", ".join(["%s"] * len(columns)))] * len(batch))),
+			tuple(values))
+
+def compact_gl_balances():
+	"""Merge the delta rows of the same dimensions into one row, one month at a time"""
+	for period_start_date in frappe.db.sql_list("""select period_start_date from `tabGL Balance`
+		group by period_start_date having count(*) > count(distinct company, account, party_type,
+			party, cost_center, is_period_closing)"""):
+		# only the rows read here are replaced, rows inserted meanwhile are merged by the next run
+		rows = frappe.db.sql("""select name, {0}, {1} from `tabGL Balance`
+			where period_start_date = %s for update""".format(", ".join(BALANCE_DIMENSIONS),
+				", ".join(BALANCE_AMOUNTS)), period_start_date, as_dict=1)
+
+		balances, names = {}, []
+		for d in rows:
+			key = tuple(cstr(d.get(dimension)) for dimension in BALANCE_DIMENSIONS)
+			if key not in balances:
+				balances[key] = frappe._dict({dimension: d.get(dimension) for dimension in BALANCE_DIMENSIONS})
+				balances[key].update({amount: 0.0 for amount in BALANCE_AMOUNTS})
+
+			for amount in BALANCE_AMOUNTS:
+				balances[key][amount] += flt(d.get(amount))
+			names.append(d.name)
+
+		for start in range(0, len(names), GL_BALANCE_INSERT_BATCH_SIZE):
+			batch = names[start:start + GL_BALANCE_INSERT_BATCH_SIZE]
+			frappe.db.sql("""delete from `tabGL Balance` where name in ({0})""".format(
+				", ".join(["%s"] * len(batch))), tuple(batch))
+
+		insert_gl_balances(balances)
+		frappe.db.commit()
+
+def rebuild_gl_balances(company=None):
+	"""Rebuild the balances from the GL Entries, one month at a time"""
+	frappe.db.sql("delete from `tabGL Balance` {0}".format("where company = %s" if company else ""),
+		company)
+
+	from_date, to_date = frappe.db.sql("""select min(posting_date), max(posting_date)
+		from `tabGL Entry` {0}""".format("where company = %s" if company else ""), company)[0]
+
+	month_start = from_date and get_first_day(from_date)
+	while month_start and month_start <= getdate(to_date):
+		condition = "posting_date between %s and %s"
+		values = [month_start, get_last_day(month_start)]
+		if company:
+			condition += " and company = %s"
+			values.append(company)
+
+		update_gl_balances(get_gl_entry_totals(condition, tuple(values)))
+		month_start = add_months(month_start, 1)
+
+def get_balance_from_gl_balances(select_field, conditions, from_date=None, to_date=None,
+	exclude_period_closing=False):
+	"""
+		Balance of the GL Entries matching the conditions (on alias `gle`) between the dates.
+
+		Whole months are read from the GL Balance rows, only the days
+		of the months not fully covered by the dates are read from the GL Entries.
+	"""
+	from_date, to_date = from_date and getdate(from_date), to_date and getdate(to_date)
+
+	# whole months covered by the dates
+	periods_from = from_date and (from_date if from_date == get_first_day(from_date)
+		else add_days(get_last_day(from_date), 1))
+	periods_to = to_date and (to_date if to_date == get_last_day(to_date)
+		else add_days(get_first_day(to_date), -1))
+
+	if periods_from and periods_to and periods_from > periods_to:
+		return get_balance_from_gl_entries(select_field, conditions, from_date, to_date,
+			exclude_period_closing)
+
+	period_conditions = list(conditions)
+	if periods_from:
+		period_conditions.append("gle.period_start_date >= %s" % frappe.db.escape(cstr(periods_from)))
+	if periods_to:
+		period_conditions.append("gle.period_start_date <= %s" % frappe.db.escape(cstr(periods_to)))
+	if exclude_period_closing:
+		period_conditions.append("gle.is_period_closing = 0")
+
+	balance = flt(frappe.db.sql("""select {0} from `tabGL Balance` gle {1}""".format(select_field,
+		"where " + " and ".join(period_conditions) if period_conditions else ""))[0][0])
+
+	if from_date and from_date != periods_from:
+		balance += get_balance_from_gl_entries(select_field, conditions, from_date,
+			add_days(periods_from, -1), exclude_period_closing)
+
+	if to_date and to_date != periods_to:
+		balance += get_balance_from_gl_entries(select_field, conditions, add_days(periods_to, 1),
+			to_date, exclude_period_closing)
+
+	return balance
+
+def get_balance_from_gl_entries(select_field, conditions, from_date=None, to_date=None,
+	exclude_period_closing=False):
+	conditions = list(conditions)
+	if from_date:
+		conditions.append("gle.posting_date >= %s" % frappe.db.escape(cstr(from_date)))
+	if to_date:
+		conditions.append("gle.posting_date <= %s" % frappe.db.escape(cstr(to_date)))
+	if exclude_period_closing:
+		conditions.append("gle.voucher_type != 'Period Closing Voucher'")
+
+	return flt(frappe.db.sql("""select {0} from `tabGL Entry` gle {1}""".format(select_field,
+		"where " + " and ".join(conditions) if conditions else ""))[0][0])
+
+def on_doctype_update():
+	frappe.db.add_index("GL Balance", ["account", "period_start_date"])
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, add_months, get_first_day, get_last_day, nowdate
+from erpnext.accounts.utils import get_balance_on, get_fiscal_year
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.gl_balance.gl_balance import (compact_gl_balances,
+	get_balance_from_gl_entries, rebuild_gl_balances)
+
+class TestGLBalance(unittest.TestCase):
+	def test_balance_from_gl_balances(self):
+		account = "_Test Bank - _TC"
+		month_start = get_first_day(add_months(nowdate(), -2))
+
+		jv = make_journal_entry(account, "_Test Account Cost for Goods Sold - _TC", 100,
+			posting_date=add_days(month_start, 10), submit=True)
+		make_journal_entry(account, "_Test Account Cost for Goods Sold - _TC", 30,
+			posting_date=add_days(month_start, 20), submit=True)
+
+		for date in (add_days(month_start, 15), get_last_day(month_start), nowdate()):
+			self.assertEqual(get_balance_on(account, date), get_raw_balance(account, date))
+
+		jv.cancel()
+		self.assertEqual(get_balance_on(account, nowdate()), get_raw_balance(account, nowdate()))
+
+		rebuild_gl_balances("_Test Company")
+		self.assertEqual(get_balance_on(account, nowdate()), get_raw_balance(account, nowdate()))
+
+	def test_profit_and_loss_balance_from_gl_balances(self):
+		account = "_Test Account Cost for Goods Sold - _TC"
+		make_journal_entry(account, "_Test Bank - _TC", 50,
+			posting_date=add_days(get_first_day(nowdate()), -1), submit=True)
+
+		year_start_date = get_fiscal_year(nowdate())[1]
+		self.assertEqual(get_balance_on(account, nowdate()),
+			get_raw_balance(account, nowdate(), year_start_date, exclude_period_closing=True))
+
+	def test_compact_gl_balances(self):
+		account = "_Test Bank - _TC"
+		month_start = get_first_day(add_months(nowdate(), -1))
+
+		for amount in (100, 30):
+			make_journal_entry(account, "_Test Account Cost for Goods Sold - _TC", amount,
+				posting_date=add_days(month_start, 5), submit=True)
+
+		# every posting adds its own row
+		self.assertTrue(get_balance_row_count(account, month_start) > 1)
+		balance = get_balance_on(account, nowdate())
+
+		compact_gl_balances()
+		self.assertEqual(get_balance_row_count(account, month_start), 1)
+		self.assertEqual(get_balance_on(account, nowdate()), balance)
+		self.assertEqual(balance, get_raw_balance(account, nowdate()))
+
+def get_balance_row_count(account, period_start_date):
+	return frappe.db.count("GL Balance", {"account": account, "period_start_date": period_start_date,
+		"cost_center": "_Test Cost Center - _TC"})
+
+def get_raw_balance(account, date, from_date=None, exclude_period_closing=False):
+	return get_balance_from_gl_entries("sum(debit_in_account_currency) - sum(credit_in_account_currency)",
+		["gle.account = %s" % frappe.db.escape(account)], from_date, date, exclude_period_closing)
@@ -56,7 +56,7 @@ class GLEntry(Document):
 			if not self.get(k):
 				frappe.throw(_("{0} is required").format(_(self.meta.get_label(k))))
 
-		account_type = frappe.db.get_value("Account", self.account, "account_type")
+		account_type = self.get_account_details().account_type
 		if not (self.party_type and self.party):
 			if account_type == "Receivable":
 				frappe.throw(_("{0} {1}: Customer is required against Receivable account {2}")
@@ -70,8 +70,16 @@ class GLEntry(Document):
 			frappe.throw(_("{0} {1}: Either debit or credit amount is required for {2}")
 				.format(self.voucher_type, self.voucher_no, self.account))
 
+	def get_account_details(self):
+		"""Returns account properties used in validations, prefetched in `flags.account_details` for bulk posting"""
+		if not self.flags.account_details:
+			self.flags.account_details = frappe.db.get_value("Account", self.account,
+				["account_type", "report_type", "is_group", "docstatus", "company"], as_dict=1) or frappe._dict()
+
+		return self.flags.account_details
+
 	def pl_must_have_cost_center(self):
-		if frappe.db.get_value("Account", self.account, "report_type") == "Profit and Loss":
+		if self.get_account_details().report_type == "Profit and Loss":
 			if not self.cost_center and self.voucher_type != 'Period Closing Voucher':
 				frappe.throw(_("{0} {1}: Cost Center is required for 'Profit and Loss' account {2}. Please set up a default Cost Center for the Company.")
 					.format(self.voucher_type, self.voucher_no, self.account))
@@ -84,7 +92,7 @@ class GLEntry(Document):
 
 	def validate_dimensions_for_pl_and_bs(self):
 
-		account_type = frappe.db.get_value("Account", self.account, "report_type")
+		account_type = self.get_account_details().report_type
 
 		for dimension in get_checks_for_pl_and_bs_accounts():
 
@@ -103,7 +111,7 @@ class GLEntry(Document):
 
 	def check_pl_account(self):
 		if self.is_opening=='Yes' and \
-				frappe.db.get_value("Account", self.account, "report_type")=="Profit and Loss" and \
+				self.get_account_details().report_type=="Profit and Loss" and \
 				self.voucher_type not in ['Purchase Invoice', 'Sales Invoice']:
 			frappe.throw(_("{0} {1}: 'Profit and Loss' type account {2} not allowed in Opening Entry")
 				.format(self.voucher_type, self.voucher_no, self.account))
@@ -111,8 +119,7 @@ class GLEntry(Document):
 	def validate_account_details(self, adv_adj):
 		"""Account must be ledger, active and not freezed"""
 
-		ret = frappe.db.sql("""select is_group, docstatus, company
-			from tabAccount where name=%s""", self.account, as_dict=1)[0]
+		ret = self.get_account_details()
 
 		if ret.is_group==1:
 			frappe.throw(_('''{0} {1}: Account {2} is a Group Account and group accounts cannot be used in
@@ -165,6 +172,13 @@ class GLEntry(Document):
 			self.fiscal_year = get_fiscal_year(self.posting_date, company=self.company)[0]
 
 
+def get_account_details_map(accounts):
+	"""Returns properties of the given accounts needed to validate GL Entries, keyed by account"""
+	return {d.name: d for d in frappe.get_all("Account",
+		filters={"name": ("in", list(set(accounts)))},
+		fields=["name", "account_type", "report_type", "is_group", "docstatus", "company",
+			"freeze_account", "balance_must_be"])}
+
 def validate_balance_type(account, adv_adj=False):
 	if not adv_adj and account:
 		balance_must_be = frappe.db.get_value("Account", account, "balance_must_be")
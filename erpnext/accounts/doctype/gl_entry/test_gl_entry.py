@@ -54,3 +54,31 @@ class TestGLEntry(unittest.TestCase):
 
 		new_naming_series_current_value = frappe.db.sql("SELECT current from tabSeries where name = %s", naming_series)[0][0]
 		self.assertEquals(old_naming_series_current_value + 2, new_naming_series_current_value)
+
+	def test_bulk_posting(self):
+		def get_gl_entries(voucher_no):
+			return frappe.get_all("GL Entry",
+				fields=["account", "debit", "credit", "cost_center", "fiscal_year", "docstatus"],
+				filters={"voucher_type": "Journal Entry", "voucher_no": voucher_no},
+				order_by="account")
+
+		je = make_journal_entry("_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC", 100, submit=True)
+
+		frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", 1)
+		try:
+			bulk_je = make_journal_entry("_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC", 100, submit=True)
+		finally:
+			frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", 0)
+
+		self.assertEqual(get_gl_entries(je.name), get_gl_entries(bulk_je.name))
+
+	def test_bulk_posting_validates_links(self):
+		from erpnext.accounts.general_ledger import validate_links
+
+		gle = frappe.get_doc({
+			"doctype": "GL Entry",
+			"account": "_Test Bank - _TC",
+			"company": "_Test Company",
+			"project": "_Test Missing Project"
+		})
+		self.assertRaises(frappe.LinkValidationError, validate_links, [gle])
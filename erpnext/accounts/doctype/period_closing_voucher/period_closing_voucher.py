@@ -6,6 +6,7 @@ import frappe
 from frappe.utils import flt
 from frappe import _
 from erpnext.accounts.utils import get_account_currency
+from erpnext.accounts.doctype.gl_balance.gl_balance import remove_gl_balances
 from erpnext.controllers.accounts_controller import AccountsController
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (get_accounting_dimensions,
 	get_dimension_filters)
@@ -19,6 +20,7 @@ class PeriodClosingVoucher(AccountsController):
 		self.make_gl_entries()
 
 	def on_cancel(self):
+		remove_gl_balances("Period Closing Voucher", self.name)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type = 'Period Closing Voucher' and voucher_no=%s""", self.name)
 
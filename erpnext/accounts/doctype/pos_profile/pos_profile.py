@@ -80,6 +80,9 @@ class POSProfile(Document):
 	def on_update(self):
 		self.set_defaults()
 
+		# rebuild the master data shared by the tills of this profile
+		frappe.cache().delete_keys("pos_master_data:" + self.name)
+
 	def on_trash(self):
 		self.set_defaults(include_current_pos=False)
 
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import now
 from erpnext.stock.get_item_details import get_pos_profile
 from erpnext.accounts.doctype.sales_invoice.pos import get_items_list, get_customers_list
 
@@ -29,6 +30,31 @@ class TestPOSProfile(unittest.TestCase):
 
 		frappe.db.sql("delete from `tabPOS Profile`")
 
+	def test_pos_data_updates(self):
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		pos_profile = make_pos_profile()
+		sync_token = now()
+
+		item = make_item("_Test POS Sync Item", {"is_sales_item": 1})
+		item.description = "Updated after the last sync"
+		item.save()
+
+		items = get_items_list(pos_profile, pos_profile.company, sync_token, None, 10)
+		self.assertEqual([d.name for d in items], [item.name])
+
+		# the next page starts after the last record of this one
+		self.assertFalse(get_items_list(pos_profile, pos_profile.company, sync_token,
+			(items[-1].modified, items[-1].name), 10))
+
+		# records modified after the cursor was taken are sent with the next page
+		item.description = "Updated while paging"
+		item.save()
+		items = get_items_list(pos_profile, pos_profile.company, sync_token, (items[-1].modified, items[-1].name), 10)
+		self.assertEqual([d.name for d in items], [item.name])
+
+		frappe.db.sql("delete from `tabPOS Profile`")
+
 def make_pos_profile():
 	frappe.db.sql("delete from `tabPOS Profile`")
 
@@ -32,6 +32,14 @@ class PricingRule(Document):
 
 		if not self.margin_type: self.margin_rate_or_amount = 0.0
 
+	def on_update(self):
+		from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index
+		clear_pricing_rule_index()
+
+	def on_trash(self):
+		from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index
+		clear_pricing_rule_index()
+
 	def validate_duplicate_apply_on(self):
 		field = apply_on_dict.get(self.apply_on)
 		if not field:
@@ -165,10 +173,16 @@ def apply_pricing_rule(args, doc=None):
 	set_serial_nos_based_on_fifo = frappe.db.get_single_value("Stock Settings",
 		"automatically_set_serial_nos_based_on_fifo")
 
+	from erpnext.accounts.doctype.pricing_rule.utils import get_pricing_rule_index
+
+	# rules of all the items are matched against the same index
+	pricing_rule_index = get_pricing_rule_index()
+
 	for item in item_list:
 		args_copy = copy.deepcopy(args)
 		args_copy.update(item)
-		data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc)
+		data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc,
+			pricing_rule_index=pricing_rule_index)
 		out.append(data)
 		if not item.get("serial_no") and set_serial_nos_based_on_fifo and not args.get('is_return'):
 			out[0].update(get_serial_no_for_item(args_copy))
@@ -187,7 +201,7 @@ def get_serial_no_for_item(args):
 		item_details.serial_no = get_serial_no(args)
 	return item_details
 
-def get_pricing_rule_for_item(args, price_list_rate=0, doc=None, for_validate=False):
+def get_pricing_rule_for_item(args, price_list_rate=0, doc=None, for_validate=False, pricing_rule_index=None):
 	from erpnext.accounts.doctype.pricing_rule.utils import (get_pricing_rules,
 		get_applied_pricing_rules, get_pricing_rule_items, get_product_discount_rule)
 
@@ -219,7 +233,7 @@ def get_pricing_rule_for_item(args, price_list_rate=0, doc=None, for_validate=Fa
 	update_args_for_pricing_rule(args)
 
 	pricing_rules = (get_applied_pricing_rules(args)
-		if for_validate and args.get("pricing_rules") else get_pricing_rules(args, doc))
+		if for_validate and args.get("pricing_rules") else get_pricing_rules(args, doc, pricing_rule_index))
 
 	if pricing_rules:
 		rules = []
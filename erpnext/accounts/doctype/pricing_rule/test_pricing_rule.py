@@ -11,6 +11,7 @@ from erpnext.stock.get_item_details import get_item_details
 from frappe import MandatoryError
 from erpnext.stock.doctype.item.test_item import make_item
 from erpnext.healthcare.doctype.lab_test_template.lab_test_template import make_item_price
+from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index, get_pricing_rule_index
 
 class TestPricingRule(unittest.TestCase):
 	def setUp(self):
@@ -430,6 +431,39 @@ class TestPricingRule(unittest.TestCase):
 
 		self.assertTrue(details)
 
+	def test_pricing_rule_index(self):
+		make_pricing_rule(title="_Test Index Rule 1", selling=1, discount_percentage=10)
+		make_pricing_rule(title="_Test Index Rule 2", selling=1, apply_on="Item Group",
+			item_group="_Test Item Group", discount_percentage=5)
+		make_pricing_rule(title="_Test Index Rule 3", buying=1, discount_percentage=20)
+
+		args = frappe._dict({
+			"item_code": "_Test Item",
+			"item_group": "_Test Item Group",
+			"company": "_Test Company",
+			"price_list": "_Test Price List",
+			"transaction_type": "selling",
+			"customer": "_Test Customer",
+			"transaction_date": frappe.utils.nowdate()
+		})
+
+		expected = {
+			"Item Code": [("_Test Index Rule 1", "_Test Item", None)],
+			"Item Group": [("_Test Index Rule 2", "_Test Item Group", None)],
+			"Brand": []
+		}
+
+		pricing_rule_index = get_pricing_rule_index()
+		for apply_on in ["Item Code", "Item Group", "Brand"]:
+			result = pricing_rule_index.get_pricing_rules(apply_on, args.copy())
+
+			self.assertEqual([(d.title, d.get(frappe.scrub(apply_on)), d.uom) for d in result],
+				expected[apply_on])
+
+		# index is rebuilt once a rule is disabled
+		frappe.db.set_value("Pricing Rule", {"title": "_Test Index Rule 1"}, "disable", 1)
+		self.assertFalse(get_pricing_rule_index().get_pricing_rules("Item Code", args.copy()))
+
 def make_pricing_rule(**args):
 	args = frappe._dict(args)
 
@@ -470,4 +504,6 @@ def delete_existing_pricing_rules():
 	for doctype in ["Pricing Rule", "Pricing Rule Item Code",
 		"Pricing Rule Item Group", "Pricing Rule Brand"]:
 
-		frappe.db.sql("delete from `tab{0}`".format(doctype))
\ No newline at end of file
+		frappe.db.sql("delete from `tab{0}`".format(doctype))
+
+	clear_pricing_rule_index()
\ No newline at end of file
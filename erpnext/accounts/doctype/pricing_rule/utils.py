@@ -13,12 +13,13 @@ from six import string_types
 import frappe
 from erpnext.setup.doctype.item_group.item_group import get_child_item_groups
 from erpnext.stock.doctype.warehouse.warehouse import get_child_warehouses
+from erpnext.utilities.tree_closure import get_ancestors
 from erpnext.stock.get_item_details import get_conversion_factor, get_default_income_account
 from erpnext.stock.doctype.item.item import get_item_defaults
 from erpnext.setup.doctype.item_group.item_group import get_item_group_defaults
 from erpnext.setup.doctype.brand.brand import get_brand_defaults
 from frappe import _, throw
-from frappe.utils import cint, flt, get_datetime, get_link_to_form, getdate, today
+from frappe.utils import cint, cstr, flt, get_datetime, get_link_to_form, getdate, today
 
 
 class MultiplePricingRuleConflict(frappe.ValidationError): pass
@@ -29,12 +30,13 @@ apply_on_table = {
     'Brand': 'brands'
 }
 
-def get_pricing_rules(args, doc=None):
+def get_pricing_rules(args, doc=None, pricing_rule_index=None):
 	pricing_rules = []
-	values =  {}
+	if not pricing_rule_index:
+		pricing_rule_index = get_pricing_rule_index()
 
 	for apply_on in ['Item Code', 'Item Group', 'Brand']:
-		pricing_rules.extend(_get_pricing_rules(apply_on, args, values))
+		pricing_rules.extend(pricing_rule_index.get_pricing_rules(apply_on, args))
 		if pricing_rules and not apply_multiple_pricing_rules(pricing_rules):
 			break
 
@@ -54,59 +56,148 @@ def get_pricing_rules(args, doc=None):
 
 	return rules
 
-def _get_pricing_rules(apply_on, args, values):
-	apply_on_field = frappe.scrub(apply_on)
-
-	if not args.get(apply_on_field): return []
-
-	child_doc = '`tabPricing Rule {0}`'.format(apply_on)
-
-	conditions = item_variant_condition = item_conditions = ""
-	values[apply_on_field] = args.get(apply_on_field)
-	if apply_on_field in ['item_code', 'brand']:
-		item_conditions = "{child_doc}.{apply_on_field}= %({apply_on_field})s".format(child_doc=child_doc,
-			apply_on_field = apply_on_field)
-
-		if apply_on_field == 'item_code':
-			if "variant_of" not in args:
-				args.variant_of = frappe.get_cached_value("Item", args.item_code, "variant_of")
-
-			if args.variant_of:
-				item_variant_condition = ' or {child_doc}.item_code=%(variant_of)s '.format(child_doc=child_doc)
-				values['variant_of'] = args.variant_of
-	elif apply_on_field == 'item_group':
-		item_conditions = _get_tree_conditions(args, "Item Group", child_doc, False)
-
-	conditions += get_other_conditions(conditions, values, args)
-	warehouse_conditions = _get_tree_conditions(args, "Warehouse", '`tabPricing Rule`')
-	if warehouse_conditions:
-		warehouse_conditions = " and {0}".format(warehouse_conditions)
-
-	if not args.price_list: args.price_list = None
-
-	conditions += " and ifnull(`tabPricing Rule`.for_price_list, '') in (%(price_list)s, '')"
-	values["price_list"] = args.get("price_list")
-
-	pricing_rules = frappe.db.sql("""select `tabPricing Rule`.*,
-			{child_doc}.{apply_on_field}, {child_doc}.uom
-		from `tabPricing Rule`, {child_doc}
-		where ({item_conditions} or (`tabPricing Rule`.apply_rule_on_other is not null
-			and `tabPricing Rule`.{apply_on_other_field}=%({apply_on_field})s) {item_variant_condition})
-			and {child_doc}.parent = `tabPricing Rule`.name
-			and `tabPricing Rule`.disable = 0 and
-			`tabPricing Rule`.{transaction_type} = 1 {warehouse_cond} {conditions}
-		order by `tabPricing Rule`.priority desc,
-			`tabPricing Rule`.name desc""".format(
-			child_doc = child_doc,
-			apply_on_field = apply_on_field,
-			item_conditions = item_conditions,
-			item_variant_condition = item_variant_condition,
-			transaction_type = args.transaction_type,
-			warehouse_cond = warehouse_conditions,
-			apply_on_other_field = "other_{0}".format(apply_on_field),
-			conditions = conditions), values, as_dict=1) or []
-
-	return pricing_rules
+def get_pricing_rules_for_items(items_args, doc=None):
+	"""Returns applicable pricing rules for every item row of a document, in the same order"""
+	pricing_rule_index = get_pricing_rule_index()
+	return [get_pricing_rules(args, doc, pricing_rule_index) for args in items_args]
+
+class PricingRuleIndex(object):
+	"""
+		In-memory index of enabled pricing rules, keyed by the item code, item group,
+		brand and `other_` fields of their apply-on child tables.
+
+		`get_pricing_rules` returns a row per matched child row, with the apply-on value and
+		uom of that row, ordered by priority and name, both descending.
+	"""
+	def __init__(self):
+		self.rules = {}
+		self.rows = {}
+		self.rows_by_value = {}
+		self.rules_by_other_value = {}
+
+		for rule in frappe.db.sql("""select * from `tabPricing Rule` where disable = 0""", as_dict=1):
+			self.rules[rule.name] = rule
+
+		for apply_on in apply_on_table:
+			apply_on_field = frappe.scrub(apply_on)
+			rows, rows_by_value, rules_by_other_value = {}, {}, {}
+
+			for row in frappe.db.sql("""select parent, {0}, uom from `tabPricing Rule {1}`
+				order by parent, idx""".format(apply_on_field, apply_on), as_dict=1):
+				if row.parent not in self.rules:
+					continue
+
+				rows.setdefault(row.parent, []).append(row)
+				rows_by_value.setdefault(get_index_key(row.get(apply_on_field)), []).append(row)
+
+			for rule in self.rules.values():
+				if rule.apply_rule_on_other is not None and rule.get("other_" + apply_on_field):
+					rules_by_other_value.setdefault(get_index_key(rule.get("other_" + apply_on_field)),
+						[]).append(rule.name)
+
+			self.rows[apply_on_field] = rows
+			self.rows_by_value[apply_on_field] = rows_by_value
+			self.rules_by_other_value[apply_on_field] = rules_by_other_value
+
+	def get_pricing_rules(self, apply_on, args):
+		apply_on_field = frappe.scrub(apply_on)
+
+		if not args.get(apply_on_field): return []
+
+		if apply_on_field == 'item_group':
+			values = get_ancestors("Item Group", args.get(apply_on_field), throw=True)
+		else:
+			values = [args.get(apply_on_field)]
+
+			if apply_on_field == 'item_code':
+				if "variant_of" not in args:
+					args.variant_of = frappe.get_cached_value("Item", args.item_code, "variant_of")
+
+				if args.variant_of:
+					values.append(args.variant_of)
+
+		# child rows matched on value, or all child rows of rules applied on other
+		matched_rows = []
+		for value in values:
+			matched_rows.extend(self.rows_by_value[apply_on_field].get(get_index_key(value), []))
+
+		for rule_name in self.rules_by_other_value[apply_on_field].get(get_index_key(args.get(apply_on_field)), []):
+			matched_rows.extend(self.rows[apply_on_field].get(rule_name, []))
+
+		if not args.price_list: args.price_list = None
+
+		pricing_rules, seen_rows = [], set()
+		for row in matched_rows:
+			if id(row) in seen_rows:
+				continue
+			seen_rows.add(id(row))
+
+			rule = self.rules[row.parent]
+			if not self.is_applicable(rule, args):
+				continue
+
+			pricing_rule = frappe._dict(rule)
+			pricing_rule.update({
+				apply_on_field: row.get(apply_on_field),
+				"uom": row.uom
+			})
+			pricing_rules.append(pricing_rule)
+
+		pricing_rules.sort(key=lambda d: (cstr(d.priority), d.name), reverse=True)
+
+		return pricing_rules
+
+	def is_applicable(self, rule, args):
+		if not cint(rule.get(args.transaction_type)):
+			return False
+
+		if args.get("warehouse") and not in_tree_values(rule.warehouse,
+			get_ancestors("Warehouse", args.get("warehouse"), throw=True) + ['']):
+			return False
+
+		for field in ["company", "customer", "supplier", "campaign", "sales_partner"]:
+			if not in_tree_values(rule.get(field), [args.get(field), ''] if args.get(field) else ['']):
+				return False
+
+		for parenttype in ["Customer Group", "Territory", "Supplier Group"]:
+			field = frappe.scrub(parenttype)
+			if args.get(field) and not in_tree_values(rule.get(field),
+				get_ancestors(parenttype, args.get(field), throw=True) + ['']):
+				return False
+
+		if args.get("transaction_date"):
+			transaction_date = getdate(args.get("transaction_date"))
+			if not (getdate(rule.valid_from or '2000-01-01') <= transaction_date
+				<= getdate(rule.valid_upto or '2500-12-31')):
+				return False
+
+		return in_tree_values(rule.for_price_list, [args.get("price_list") or '', ''])
+
+def get_index_key(value):
+	# match the database collation, which ignores case and trailing spaces
+	return cstr(value).lower().rstrip(" ")
+
+def in_tree_values(value, values):
+	return get_index_key(value) in [get_index_key(d) for d in values]
+
+def get_pricing_rule_index():
+	"""Returns the pricing rule index of the site, rebuilt whenever a Pricing Rule is changed"""
+	# also catches rolled back and directly updated rules
+	version = tuple(frappe.db.sql("""select count(name), max(modified) from `tabPricing Rule`""")[0])
+
+	index = pricing_rule_indexes.get(frappe.local.site)
+	if not index or index.version != version:
+		index = PricingRuleIndex()
+		index.version = version
+		pricing_rule_indexes[frappe.local.site] = index
+
+	return index
+
+def clear_pricing_rule_index():
+	pricing_rule_indexes.pop(frappe.local.site, None)
+
+# pricing rule index per site
+pricing_rule_indexes = {}
 
 def apply_multiple_pricing_rules(pricing_rules):
 	apply_multiple_rule = [d.apply_multiple_pricing_rules
@@ -122,19 +213,7 @@ def _get_tree_conditions(args, parenttype, table, allow_blank=True):
 	field = frappe.scrub(parenttype)
 	condition = ""
 	if args.get(field):
-		if not frappe.flags.tree_conditions:
-			frappe.flags.tree_conditions = {}
-		key = (parenttype, args.get(field))
-		if key in frappe.flags.tree_conditions:
-			return frappe.flags.tree_conditions[key]
-
-		try:
-			lft, rgt = frappe.db.get_value(parenttype, args.get(field), ["lft", "rgt"])
-		except TypeError:
-			frappe.throw(_("Invalid {0}").format(args.get(field)))
-
-		parent_groups = frappe.db.sql_list("""select name from `tab%s`
-			where lft<=%s and rgt>=%s""" % (parenttype, '%s', '%s'), (lft, rgt))
+		parent_groups = get_ancestors(parenttype, args.get(field), throw=True)
 
 		if parent_groups:
 			if allow_blank: parent_groups.append('')
@@ -143,8 +222,6 @@ def _get_tree_conditions(args, parenttype, table, allow_blank=True):
 				field=field,
 				parent_groups=", ".join([frappe.db.escape(d) for d in parent_groups])
 			)
-
-			frappe.flags.tree_conditions[key] = condition
 	return condition
 
 def get_other_conditions(conditions, values, args):
@@ -3,6 +3,7 @@
 from __future__ import unicode_literals
 
 import json
+import time
 
 import frappe
 from erpnext.accounts.party import get_party_account_currency
@@ -11,13 +12,44 @@ from erpnext.setup.utils import get_exchange_rate
 from erpnext.stock.get_item_details import get_pos_profile
 from frappe import _
 from frappe.core.doctype.communication.email import make
-from frappe.utils import nowdate, cint
+from frappe.utils import nowdate, now_datetime, cint, cstr, flt, add_to_date, get_datetime
 
+from collections import OrderedDict
 from six import string_types, iteritems
 
 
+# seconds for which the master data of a POS Profile is shared by the tills opening it
+POS_DATA_CACHE_EXPIRY = 600
+
+# items and customers per page of master data updates
+POS_DATA_PAGE_LENGTH = 500
+
+# seconds before the latest synced modification from which the next sync starts, so that
+# records of transactions committed after others with a later modified timestamp are not missed
+POS_SYNC_SAFETY_WINDOW = 300
+
+# doctypes whose records modified after the sync token are sent to the tills
+POS_SYNC_DOCTYPES = ("Item", "Customer", "Serial No", "Batch", "Item Price", "Bin")
+
 @frappe.whitelist()
 def get_pos_data():
+	doc, pos_profile = get_pos_invoice_doc()
+
+	default_print_format = pos_profile.get('print_format') or "Point of Sale"
+	print_template = frappe.db.get_value('Print Format', default_print_format, 'html')
+
+	data = get_pos_master_data(doc, pos_profile)
+	data.update({
+		'doc': doc,
+		'default_customer': pos_profile.get('customer'),
+		'print_template': print_template,
+		'pos_profile': pos_profile,
+		'meta': get_meta()
+	})
+
+	return data
+
+def get_pos_invoice_doc():
 	doc = frappe.new_doc('Sales Invoice')
 	doc.is_pos = 1
 	pos_profile = get_pos_profile(doc.company) or {}
@@ -36,34 +68,106 @@ def get_pos_data():
 	company_data = get_company_data(doc.company)
 	update_pos_profile_data(doc, pos_profile, company_data)
 	update_multi_mode_option(doc, pos_profile)
-	default_print_format = pos_profile.get('print_format') or "Point of Sale"
-	print_template = frappe.db.get_value('Print Format', default_print_format, 'html')
-	items_list = get_items_list(pos_profile, doc.company)
-	customers = get_customers_list(pos_profile)
 
 	doc.plc_conversion_rate = update_plc_conversion_rate(doc, pos_profile)
 
-	return {
-		'doc': doc,
-		'default_customer': pos_profile.get('customer'),
+	return doc, pos_profile
+
+def get_pos_master_data(doc, pos_profile):
+	"""Returns the items, customers and other master data of the POS Profile,
+	built once and shared by all the tills for `POS_DATA_CACHE_EXPIRY` seconds"""
+	cache_key = "pos_master_data:{0}:{1}:{2}:{3}".format(pos_profile.get('name') or doc.company,
+		doc.selling_price_list, doc.plc_conversion_rate, nowdate())
+
+	data = frappe.cache().get_value(cache_key)
+	if not data:
+		# records modified after the token are sent by get_pos_data_updates
+		sync_token = cstr(add_to_date(now_datetime(), seconds=-POS_SYNC_SAFETY_WINDOW))
+		items_list = get_items_list(pos_profile, doc.company)
+		customers = get_customers_list(pos_profile)
+
+		data = {
+			'sync_token': sync_token,
+			'items': items_list,
+			'item_groups': get_item_groups(pos_profile),
+			'customers': customers,
+			'address': get_customers_address(customers),
+			'contacts': get_contacts(customers),
+			'serial_no_data': get_serial_no_data(pos_profile, doc.company),
+			'batch_no_data': get_batch_no_data(),
+			'barcode_data': get_barcode_data(items_list),
+			'tax_data': get_item_tax_data(),
+			'price_list_data': get_price_list_data(doc.selling_price_list, doc.plc_conversion_rate),
+			'customer_wise_price_list': get_customer_wise_price_list(),
+			'bin_data': get_bin_data(pos_profile),
+			'pricing_rules': get_pricing_rule_data(doc)
+		}
+
+		frappe.cache().set_value(cache_key, data, expires_in_sec=POS_DATA_CACHE_EXPIRY)
+
+	return data
+
+@frappe.whitelist()
+def get_pos_data_updates(sync_token, item_cursor=None, customer_cursor=None):
+	"""
+		Returns the master data modified after `sync_token`, items and customers are
+		sent `POS_DATA_PAGE_LENGTH` at a time, each page after the (modified, name) cursor
+		of the last record of the previous page. The first page carries the token for the
+		next sync and the rest of the updated data.
+	"""
+	doc, pos_profile = get_pos_invoice_doc()
+	item_cursor, customer_cursor = get_sync_cursor(item_cursor), get_sync_cursor(customer_cursor)
+	first_page = not (item_cursor or customer_cursor)
+
+	items_list = get_items_list(pos_profile, doc.company, sync_token, item_cursor, POS_DATA_PAGE_LENGTH)
+	customers = get_customers_list(pos_profile, sync_token, customer_cursor, POS_DATA_PAGE_LENGTH)
+
+	data = {
+		'has_more': len(items_list) == POS_DATA_PAGE_LENGTH or len(customers) == POS_DATA_PAGE_LENGTH,
+		'item_cursor': [cstr(items_list[-1].modified), items_list[-1].name] if items_list else item_cursor,
+		'customer_cursor': [cstr(customers[-1].modified), customers[-1].name] if customers else customer_cursor,
 		'items': items_list,
-		'item_groups': get_item_groups(pos_profile),
 		'customers': customers,
 		'address': get_customers_address(customers),
 		'contacts': get_contacts(customers),
-		'serial_no_data': get_serial_no_data(pos_profile, doc.company),
-		'batch_no_data': get_batch_no_data(),
-		'barcode_data': get_barcode_data(items_list),
-		'tax_data': get_item_tax_data(),
-		'price_list_data': get_price_list_data(doc.selling_price_list, doc.plc_conversion_rate),
-		'customer_wise_price_list': get_customer_wise_price_list(),
-		'bin_data': get_bin_data(pos_profile),
-		'pricing_rules': get_pricing_rule_data(doc),
-		'print_template': print_template,
-		'pos_profile': pos_profile,
-		'meta': get_meta()
+		'barcode_data': get_barcode_data(items_list)
 	}
 
+	if first_page:
+		data.update({
+			'sync_token': get_next_sync_token(sync_token),
+			'removed_items': frappe.db.sql_list("""select name from `tabItem`
+				where modified > %s and (disabled = 1 or has_variants = 1 or is_sales_item = 0)""", sync_token),
+			'removed_customers': frappe.db.sql_list("""select name from `tabCustomer`
+				where modified > %s and disabled = 1""", sync_token),
+			'serial_no_data': get_serial_no_data(pos_profile, doc.company, sync_token),
+			'batch_no_data': get_batch_no_data(sync_token),
+			'tax_data': get_item_tax_data(),
+			'price_list_data': get_price_list_data(doc.selling_price_list, doc.plc_conversion_rate, sync_token),
+			'bin_data': get_bin_data(pos_profile, sync_token),
+			'pricing_rules': get_pricing_rule_data(doc)
+		})
+
+	return data
+
+def get_sync_cursor(cursor):
+	if isinstance(cursor, string_types):
+		cursor = json.loads(cursor)
+
+	return tuple(cursor) if cursor else None
+
+def get_next_sync_token(sync_token):
+	"""Returns the token for the next sync, the latest modified timestamp of the records
+	to be synced less `POS_SYNC_SAFETY_WINDOW`, never before the current token"""
+	latest = [frappe.db.sql("""select max(modified) from `tab{0}` where modified > %s""".format(doctype),
+		sync_token)[0][0] for doctype in POS_SYNC_DOCTYPES]
+	latest = [get_datetime(d) for d in latest if d]
+
+	if not latest:
+		return sync_token
+
+	return cstr(max(add_to_date(max(latest), seconds=-POS_SYNC_SAFETY_WINDOW), get_datetime(sync_token)))
+
 def update_plc_conversion_rate(doc, pos_profile):
 	conversion_rate = 1.0
 
@@ -165,8 +269,8 @@ def update_tax_table(doc):
 		doc.append('taxes', tax)
 
 
-def get_items_list(pos_profile, company):
-	cond = ""
+def get_items_list(pos_profile, company, modified_since=None, after=None, page_length=None):
+	cond = limit = ""
 	args_list = []
 	if pos_profile.get('item_groups'):
 		# Get items based on the item groups defined in the POS profile
@@ -175,10 +279,22 @@ def get_items_list(pos_profile, company):
 		if args_list:
 			cond = "and i.item_group in (%s)" % (', '.join(['%s'] * len(args_list)))
 
+	if modified_since:
+		cond += " and i.modified > %s"
+		args_list.append(modified_since)
+
+	if after:
+		# keyset paging, records modified while paging move after the cursor instead of shifting the pages
+		cond += " and (i.modified, i.name) > (%s, %s)"
+		args_list.extend(after)
+
+	if page_length:
+		limit = "order by i.modified, i.name limit %d" % cint(page_length)
+
 	return frappe.db.sql("""
 		select
 			i.name, i.item_code, i.item_name, i.description, i.item_group, i.has_batch_no,
-			i.has_serial_no, i.is_stock_item, i.brand, i.stock_uom, i.image,
+			i.has_serial_no, i.is_stock_item, i.brand, i.stock_uom, i.image, i.modified,
 			id.expense_account, id.selling_cost_center, id.default_warehouse,
 			i.sales_uom, c.conversion_factor, it.item_tax_template, it.valid_from
 		from
@@ -190,7 +306,8 @@ def get_items_list(pos_profile, company):
 			i.disabled = 0 and i.has_variants = 0 and i.is_sales_item = 1
 			{cond}
 		group by i.item_code
-		""".format(cond=cond), tuple([company] + args_list), as_dict=1)
+		{limit}
+		""".format(cond=cond, limit=limit), tuple([company] + args_list), as_dict=1)
 
 
 def get_item_groups(pos_profile):
@@ -203,8 +320,9 @@ def get_item_groups(pos_profile):
 	return item_group_dict
 
 
-def get_customers_list(pos_profile={}):
+def get_customers_list(pos_profile={}, modified_since=None, after=None, page_length=None):
 	cond = "1=1"
+	limit = ""
 	customer_groups = []
 	if pos_profile.get('customer_groups'):
 		# Get customers based on the customer groups defined in the POS profile
@@ -212,9 +330,20 @@ def get_customers_list(pos_profile={}):
 			customer_groups.extend([d.get('name') for d in get_child_nodes('Customer Group', d.get('customer_group'))])
 		cond = "customer_group in (%s)" % (', '.join(['%s'] * len(customer_groups)))
 
+	if modified_since:
+		cond += " and modified > %s"
+		customer_groups.append(modified_since)
+
+	if after:
+		cond += " and (modified, name) > (%s, %s)"
+		customer_groups.extend(after)
+
+	if page_length:
+		limit = "order by modified, name limit %d" % cint(page_length)
+
 	return frappe.db.sql(""" select name, customer_name, customer_group,
-		territory, customer_pos_id from tabCustomer where disabled = 0
-		and {cond}""".format(cond=cond), tuple(customer_groups), as_dict=1) or {}
+		territory, customer_pos_id, modified from tabCustomer where disabled = 0
+		and {cond} {limit}""".format(cond=cond, limit=limit), tuple(customer_groups), as_dict=1) or {}
 
 
 def get_customers_address(customers):
@@ -259,7 +388,7 @@ def get_child_nodes(group_type, root):
 			lft >= {lft} and rgt <= {rgt} order by lft""".format(tab=group_type, lft=lft, rgt=rgt), as_dict=1)
 
 
-def get_serial_no_data(pos_profile, company):
+def get_serial_no_data(pos_profile, company, modified_since=None):
 	# get itemwise serial no data
 	# example {'Nokia Lumia 1020': {'SN0001': 'Pune'}}
 	# where Nokia Lumia 1020 is item code, SN0001 is serial no and Pune is warehouse
@@ -268,9 +397,13 @@ def get_serial_no_data(pos_profile, company):
 	if pos_profile.get('update_stock') and pos_profile.get('warehouse'):
 		cond = "warehouse = %(warehouse)s"
 
+	if modified_since:
+		cond += " and modified > %(modified_since)s"
+
 	serial_nos = frappe.db.sql("""select name, warehouse, item_code
 		from `tabSerial No` where {0} and company = %(company)s """.format(cond),{
-			'company': company, 'warehouse': frappe.db.escape(pos_profile.get('warehouse'))
+			'company': company, 'warehouse': frappe.db.escape(pos_profile.get('warehouse')),
+			'modified_since': modified_since
 		}, as_dict=1)
 
 	itemwise_serial_no = {}
@@ -282,14 +415,16 @@ def get_serial_no_data(pos_profile, company):
 	return itemwise_serial_no
 
 
-def get_batch_no_data():
+def get_batch_no_data(modified_since=None):
 	# get itemwise batch no data
 	# exmaple: {'LED-GRE': [Batch001, Batch002]}
 	# where LED-GRE is item code, SN0001 is serial no and Pune is warehouse
 
 	itemwise_batch = {}
 	batches = frappe.db.sql("""select name, item from `tabBatch`
-		where ifnull(expiry_date, '4000-10-10') >= curdate()""", as_dict=1)
+		where ifnull(expiry_date, '4000-10-10') >= curdate() {0}""".format(
+			"and modified > %(modified_since)s" if modified_since else ""),
+		{'modified_since': modified_since}, as_dict=1)
 
 	for batch in batches:
 		if batch.item not in itemwise_batch:
@@ -333,11 +468,12 @@ def get_item_tax_data():
 	return itemwise_tax
 
 
-def get_price_list_data(selling_price_list, conversion_rate):
+def get_price_list_data(selling_price_list, conversion_rate, modified_since=None):
 	itemwise_price_list = {}
 	price_lists = frappe.db.sql("""Select ifnull(price_list_rate, 0) as price_list_rate,
-		item_code from `tabItem Price` ip where price_list = %(price_list)s""",
-        {'price_list': selling_price_list}, as_dict=1)
+		item_code from `tabItem Price` ip where price_list = %(price_list)s {0}""".format(
+			"and modified > %(modified_since)s" if modified_since else ""),
+        {'price_list': selling_price_list, 'modified_since': modified_since}, as_dict=1)
 
 	for item in price_lists:
 		itemwise_price_list[item.item_code] = item.price_list_rate * conversion_rate
@@ -360,12 +496,17 @@ def get_customer_wise_price_list():
 
 	return customer_wise_price
 
-def get_bin_data(pos_profile):
+def get_bin_data(pos_profile, modified_since=None):
 	itemwise_bin_data = {}
 	filters = { 'actual_qty': ['>', 0] }
 	if pos_profile.get('warehouse'):
 		filters.update({ 'warehouse': pos_profile.get('warehouse') })
 
+	if modified_since:
+		# bins which ran out of stock are sent as well
+		del filters['actual_qty']
+		filters.update({ 'modified': ['>', modified_since] })
+
 	bin_data = frappe.db.get_all('Bin', fields = ['item_code', 'warehouse', 'actual_qty'], filters=filters)
 
 	for bins in bin_data:
@@ -388,6 +529,15 @@ def get_pricing_rule_data(doc):
 	return pricing_rules
 
 
+# offline invoices submitted per background job, smaller queues are synced in the request
+POS_INVOICE_SYNC_CHUNK_SIZE = 20
+
+# seconds after which invoices queued for a background sync are sent again, the job timeout
+POS_INVOICE_SYNC_TIMEOUT = 3600
+
+# seconds for which the invoice statuses of a background sync are kept for the client to poll
+POS_INVOICE_SYNC_STATUS_EXPIRY = 24 * 60 * 60
+
 @frappe.whitelist()
 def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={}):
 	import json
@@ -402,36 +552,34 @@ def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={
 		customers_list = json.loads(customers_list)
 
 	customers_list = make_customer_and_address(customers_list)
-	name_list = []
+
+	offline_invoices = OrderedDict()
 	for docs in doc_list:
 		for name, doc in iteritems(docs):
-			if not frappe.db.exists('Sales Invoice', {'offline_pos_name': name}):
-				if isinstance(doc, dict):
-					validate_records(doc)
-					si_doc = frappe.new_doc('Sales Invoice')
-					si_doc.offline_pos_name = name
-					si_doc.update(doc)
-					si_doc.set_posting_time = 1
-					si_doc.customer = get_customer_id(doc)
-					si_doc.due_date = doc.get('posting_date')
-					name_list = submit_invoice(si_doc, name, doc, name_list)
-				else:
-					doc.due_date = doc.get('posting_date')
-					doc.customer = get_customer_id(doc)
-					doc.set_posting_time = 1
-					doc.offline_pos_name = name
-					name_list = submit_invoice(doc, name, doc, name_list)
-			else:
-				name_list.append(name)
+			offline_invoices[name] = doc
+
+	# invoices synced earlier, or still being synced by a background job, are skipped
+	name_list = get_synced_offline_invoices(list(offline_invoices))
+	invoices_in_sync = get_offline_invoices_in_sync()
+	invoices = [(name, doc) for name, doc in iteritems(offline_invoices)
+		if name not in name_list and cstr(name) not in invoices_in_sync]
+
+	sync_id = None
+	if len(invoices) > POS_INVOICE_SYNC_CHUNK_SIZE:
+		sync_id = enqueue_offline_invoices(invoices)
+	else:
+		for name, doc in invoices:
+			name_list = make_offline_invoice(name, doc, name_list)
 
 	email_queue = make_email_queue(email_queue_list)
-	
+
 	if isinstance(pos_profile, string_types):
 		pos_profile = json.loads(pos_profile)
-	
+
 	customers = get_customers_list(pos_profile)
 	return {
 		'invoice': name_list,
+		'sync_id': sync_id,
 		'email_queue': email_queue,
 		'customers': customers_list,
 		'synced_customers_list': customers,
@@ -439,6 +587,92 @@ def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={
 		'synced_contacts': get_contacts(customers)
 	}
 
+def get_synced_offline_invoices(names):
+	if not names:
+		return []
+
+	synced_names = set(frappe.db.sql_list("""select offline_pos_name from `tabSales Invoice`
+		where offline_pos_name in ({0})""".format(", ".join(["%s"] * len(names))), tuple(names)))
+
+	# keep the names as sent by the client, they are matched against its local storage
+	return [name for name in names if cstr(name) in synced_names]
+
+def make_offline_invoice(name, doc, name_list):
+	if isinstance(doc, dict):
+		validate_records(doc)
+		si_doc = frappe.new_doc('Sales Invoice')
+		si_doc.offline_pos_name = name
+		si_doc.update(doc)
+		si_doc.set_posting_time = 1
+		si_doc.customer = get_customer_id(doc)
+		si_doc.due_date = doc.get('posting_date')
+		return submit_invoice(si_doc, name, doc, name_list)
+	else:
+		doc.due_date = doc.get('posting_date')
+		doc.customer = get_customer_id(doc)
+		doc.set_posting_time = 1
+		doc.offline_pos_name = name
+		return submit_invoice(doc, name, doc, name_list)
+
+def enqueue_offline_invoices(invoices):
+	"""Submit offline invoices in background jobs of `POS_INVOICE_SYNC_CHUNK_SIZE` invoices, returns the sync id"""
+	sync_id = frappe.generate_hash(length=10)
+
+	for name, doc in invoices:
+		frappe.cache().hset("pos_invoices_in_sync", cstr(name), {"sync_id": sync_id, "queued_on": time.time()})
+		frappe.cache().hset("pos_invoice_sync:" + sync_id, cstr(name), "Queued")
+	expire_offline_invoice_sync_status(sync_id)
+
+	for start in range(0, len(invoices), POS_INVOICE_SYNC_CHUNK_SIZE):
+		frappe.enqueue(sync_offline_invoices, queue="long", timeout=POS_INVOICE_SYNC_TIMEOUT,
+			sync_id=sync_id, invoices=invoices[start:start + POS_INVOICE_SYNC_CHUNK_SIZE])
+
+	return sync_id
+
+def get_offline_invoices_in_sync():
+	"""Returns the invoices queued for a background sync, invoices of a job which did not
+	finish within its timeout are left out so that they are synced again"""
+	invoices_in_sync = {}
+	for name, d in iteritems(frappe.cache().hgetall("pos_invoices_in_sync") or {}):
+		if isinstance(d, dict) and time.time() - flt(d.get("queued_on")) < POS_INVOICE_SYNC_TIMEOUT:
+			invoices_in_sync[cstr(name)] = d
+		else:
+			frappe.cache().hdel("pos_invoices_in_sync", name)
+
+	return invoices_in_sync
+
+def sync_offline_invoices(sync_id, invoices):
+	try:
+		for name, doc in invoices:
+			status = "Failed"
+			try:
+				# the client may have sent the invoice again before this job ran
+				if get_synced_offline_invoices([name]) or make_offline_invoice(name, doc, []):
+					status = get_offline_invoice_status(name)
+			except Exception:
+				frappe.db.rollback()
+				frappe.log_error(frappe.get_traceback())
+
+			frappe.cache().hset("pos_invoice_sync:" + sync_id, cstr(name), status)
+			expire_offline_invoice_sync_status(sync_id)
+			frappe.cache().hdel("pos_invoices_in_sync", cstr(name))
+	finally:
+		# invoices left by a failed job are sent again with the next sync
+		for name, doc in invoices:
+			frappe.cache().hdel("pos_invoices_in_sync", cstr(name))
+
+def expire_offline_invoice_sync_status(sync_id):
+	frappe.cache().expire(frappe.cache().make_key("pos_invoice_sync:" + sync_id), POS_INVOICE_SYNC_STATUS_EXPIRY)
+
+def get_offline_invoice_status(name):
+	# invoices which could not be submitted are saved as drafts by `submit_invoice`
+	docstatus = frappe.db.get_value("Sales Invoice", {"offline_pos_name": name}, "docstatus")
+	return "Synced" if cint(docstatus) == 1 else "Draft"
+
+@frappe.whitelist()
+def get_offline_invoice_sync_status(sync_id):
+	"""Returns the status, Queued, Synced, Draft or Failed, of every invoice of a background sync"""
+	return frappe.cache().hgetall("pos_invoice_sync:" + sync_id) or {}
 
 def validate_records(doc):
 	validate_item(doc)
@@ -794,6 +794,49 @@ class TestSalesInvoice(unittest.TestCase):
 		if allow_negative_stock:
 			frappe.db.set_value('Stock Settings', None, 'allow_negative_stock', 1)
 
+	def test_sync_offline_pos_invoices(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import (make_invoice, sync_offline_invoices,
+			get_offline_invoice_sync_status)
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		pos_profile = make_pos_profile()
+		timestamp = cint(time.time())
+
+		item = make_item("_Test POS Item")
+		pos = copy.deepcopy(test_records[1])
+		pos['items'][0]['item_code'] = item.name
+		pos['items'][0]['warehouse'] = "_Test Warehouse - _TC"
+		pos["is_pos"] = 1
+		pos["offline_pos_name"] = timestamp
+		pos["payments"] = [{'mode_of_payment': 'Cash', 'account': 'Cash - _TC', 'amount': 630}]
+
+		sync_offline_invoices("_test_sync", [(timestamp, copy.deepcopy(pos))])
+		self.assertEqual(get_offline_invoice_sync_status("_test_sync"), {str(timestamp): "Synced"})
+		self.assertTrue(frappe.cache().ttl(frappe.cache().make_key("pos_invoice_sync:_test_sync")) > 0)
+
+		# invoices sent again are not created twice
+		si = make_invoice(pos_profile, [{timestamp: pos}]).get('invoice')
+		self.assertEqual(si, [timestamp])
+		self.assertEqual(frappe.db.count('Sales Invoice', {'offline_pos_name': timestamp}), 1)
+
+		frappe.cache().delete_key("pos_invoice_sync:_test_sync")
+
+	def test_offline_invoices_of_stale_sync_are_sent_again(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import (POS_INVOICE_SYNC_TIMEOUT,
+			get_offline_invoices_in_sync)
+
+		frappe.cache().hset("pos_invoices_in_sync", "_test_fresh", {"sync_id": "_test_sync",
+			"queued_on": time.time()})
+		frappe.cache().hset("pos_invoices_in_sync", "_test_stale", {"sync_id": "_test_sync",
+			"queued_on": time.time() - POS_INVOICE_SYNC_TIMEOUT - 1})
+
+		invoices_in_sync = get_offline_invoices_in_sync()
+		self.assertIn("_test_fresh", invoices_in_sync)
+		self.assertNotIn("_test_stale", invoices_in_sync)
+		self.assertFalse(frappe.cache().hget("pos_invoices_in_sync", "_test_stale"))
+
+		frappe.cache().hdel("pos_invoices_in_sync", "_test_fresh")
+
 	def pos_gl_entry(self, si, pos, cash_amount):
 		# check stock ledger entries
 		sle = frappe.db.sql("""select * from `tabStock Ledger Entry`
@@ -4,13 +4,18 @@
 
 from __future__ import unicode_literals
 
-import frappe
+import frappe, time
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils.data import nowdate, getdate, cstr, cint, add_days, date_diff, get_last_day, add_to_date, flt
+from frappe.utils.data import nowdate, getdate, cstr, cint, add_days, date_diff, get_last_day, add_to_date, flt, now
 from erpnext.accounts.doctype.subscription_plan.subscription_plan import get_plan_rate
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
 
+# number of due subscriptions processed by one background job, larger runs are split across workers
+SUBSCRIPTION_PROCESS_CHUNK_SIZE = 100
+
+# seconds for which the metrics of a run of `process_all` are kept
+SUBSCRIPTION_PROCESS_METRICS_EXPIRY = 7 * 24 * 60 * 60
 
 class Subscription(Document):
 	def before_insert(self):
@@ -243,6 +248,7 @@ class Subscription(Document):
 		self.validate_plans_billing_cycle(self.get_billing_cycle_and_interval())
 		self.validate_end_date()
 		self.validate_to_follow_calendar_months()
+		self.set_next_action_date()
 
 	def validate_trial_period(self):
 		"""
@@ -275,6 +281,71 @@ class Subscription(Document):
 			if billing_info[0]['billing_interval'] != 'Month':
 				frappe.throw('Billing Interval in Subscription Plan must be Month to follow calendar months')
 
+	def set_next_action_date(self):
+		"""
+		Sets the first date on which `process` can change the `Subscription`. The
+		scheduler only processes subscriptions whose next action date has come.
+		"""
+		self.next_action_date = self.get_next_action_date()
+
+	def get_next_action_date(self):
+		if self.status in ['Cancelled', 'Completed']:
+			return None
+
+		# overdue invoices can be paid any time, so these are checked on every run
+		if self.status in ['Past Due Date', 'Unpaid']:
+			return getdate()
+
+		# a missing invoice is reported by `process`
+		doctype = 'Sales Invoice' if self.party_type == 'Customer' else 'Purchase Invoice'
+		if self.invoices and not frappe.db.exists(doctype, self.invoices[-1].invoice):
+			return getdate()
+
+		if self.has_pending_action():
+			return getdate()
+
+		dates = [add_days(self.trial_period_end, 1) if self.trial_period_end else None,
+			add_days(self.end_date, 1) if self.end_date else None]
+
+		if self.current_invoice_end:
+			# period change, postpaid invoice and cancellation at period end
+			dates.append(add_days(self.current_invoice_end, 1))
+			if getdate(self.current_invoice_start) == getdate(self.current_invoice_end):
+				dates.append(self.current_invoice_end)
+
+		if self.generate_invoice_at_period_start and not self.is_current_invoice_generated():
+			dates.append(self.current_invoice_start)
+
+		current_invoice = self.get_current_invoice()
+		if current_invoice and not self.is_paid(current_invoice):
+			dates.append(add_days(current_invoice.due_date, 1))
+
+		dates = [getdate(d) for d in dates if d and getdate(d) > getdate()]
+		return min(dates) if dates else None
+
+	def has_pending_action(self):
+		"""
+		Returns `True` if `process` would change the `Subscription` today
+		"""
+		if self.status == 'Trialling':
+			return not self.is_trialling()
+
+		if self.status != 'Active':
+			return False
+
+		if self.end_date and getdate() > getdate(self.end_date):
+			return True
+
+		if self.current_invoice_end and getdate() > getdate(self.current_invoice_end) \
+			and (self.generate_invoice_at_period_start or (self.cancel_at_period_end and not self.end_date)):
+			return True
+
+		if not self.is_current_invoice_generated() and (self.is_postpaid_to_invoice()
+			or self.is_prepaid_to_invoice()):
+			return True
+
+		return bool(self.current_invoice_is_past_due())
+
 	def after_insert(self):
 		# todo: deal with users who collect prepayments. Maybe a new Subscription Invoice doctype?
 		self.set_subscription_status()
@@ -593,11 +664,92 @@ def get_prorata_factor(period_end, period_start):
 
 def process_all():
 	"""
-	Task to updates the status of all `Subscription` apart from those that are cancelled
+	Task to process the `Subscription`s whose next action date has come. Large runs
+	are split into background jobs of `SUBSCRIPTION_PROCESS_CHUNK_SIZE` subscriptions.
+	"""
+	subscriptions = get_due_subscriptions()
+	run_id = frappe.generate_hash(length=10)
+	frappe.cache().set_value("subscription_process_last_run", run_id,
+		expires_in_sec=SUBSCRIPTION_PROCESS_METRICS_EXPIRY)
+
+	for chunk_no, start in enumerate(range(0, len(subscriptions), SUBSCRIPTION_PROCESS_CHUNK_SIZE)):
+		chunk = [d.name for d in subscriptions[start:start + SUBSCRIPTION_PROCESS_CHUNK_SIZE]]
+
+		if len(subscriptions) > SUBSCRIPTION_PROCESS_CHUNK_SIZE:
+			frappe.enqueue(process_subscriptions, queue='long', timeout=3600,
+				subscriptions=chunk, run_id=run_id, chunk_no=chunk_no)
+		else:
+			process_subscriptions(chunk, run_id, chunk_no)
+
+	return run_id
+
+
+def process_subscriptions(subscriptions, run_id, chunk_no):
+	"""
+	Processes a chunk of due `Subscription`s and records the counts and timings of the chunk
+	"""
+	metrics = frappe._dict({
+		"total": len(subscriptions),
+		"processed": 0,
+		"skipped": 0,
+		"failed": [],
+		"elapsed": 0.0,
+		"started_on": now()
+	})
+
+	for name in subscriptions:
+		start = time.time()
+		result = process({'name': name})
+
+		if result is None:
+			metrics.skipped += 1
+		elif result:
+			metrics.processed += 1
+		else:
+			metrics.failed.append(name)
+
+		metrics.elapsed += time.time() - start
+
+	metrics.completed_on = now()
+	# one hash field per chunk, so that workers never overwrite each other
+	frappe.cache().hset("subscription_process_run:" + run_id, chunk_no, metrics)
+	frappe.cache().expire(frappe.cache().make_key("subscription_process_run:" + run_id),
+		SUBSCRIPTION_PROCESS_METRICS_EXPIRY)
+
+
+def get_subscription_process_metrics(run_id=None):
+	"""
+	Returns the counts and throughput of a run of `process_all`, the latest run by default
 	"""
-	subscriptions = get_all_subscriptions()
-	for subscription in subscriptions:
-		process(subscription)
+	run_id = run_id or frappe.cache().get_value("subscription_process_last_run")
+	if not run_id:
+		return {}
+
+	chunks = frappe.cache().hgetall("subscription_process_run:" + run_id) or {}
+	chunks = {cint(chunk_no): frappe._dict(d) for chunk_no, d in chunks.items()}
+
+	metrics = frappe._dict({
+		"run_id": run_id,
+		"chunks": chunks,
+		"total": sum(d.total for d in chunks.values()),
+		"processed": sum(d.processed for d in chunks.values()),
+		"skipped": sum(d.skipped for d in chunks.values()),
+		"failed": sum(len(d.failed) for d in chunks.values()),
+		"elapsed": sum(d.elapsed for d in chunks.values())
+	})
+	metrics.per_second = flt(metrics.processed / metrics.elapsed) if metrics.elapsed else 0.0
+
+	return metrics
+
+
+def get_due_subscriptions(date=None):
+	"""
+	Returns the `Subscription`s whose next action date is on or before the given date
+	"""
+	return frappe.db.get_all('Subscription', {
+		'status': ('!=', 'Cancelled'),
+		'next_action_date': ('<=', getdate(date))
+	}, order_by='next_action_date, name')
 
 
 def get_all_subscriptions():
@@ -609,18 +761,29 @@ def get_all_subscriptions():
 
 def process(data):
 	"""
-	Checks a `Subscription` and updates it status as necessary
+	Checks a `Subscription` and updates it status as necessary. Returns `True` if processed,
+	`False` if it failed and `None` if it is no longer due.
 	"""
 	if data:
 		try:
+			# an overlapping run may have processed it since it was picked
+			next_action_date = frappe.db.sql("""select next_action_date from `tabSubscription`
+				where name = %s for update""", data['name'])
+			if not (next_action_date and next_action_date[0][0]
+				and getdate(next_action_date[0][0]) <= getdate()):
+				frappe.db.commit()
+				return None
+
 			subscription = frappe.get_doc('Subscription', data['name'])
 			subscription.process()
 			frappe.db.commit()
+			return True
 		except frappe.ValidationError:
 			frappe.db.rollback()
 			frappe.db.begin()
 			frappe.log_error(frappe.get_traceback())
 			frappe.db.commit()
+			return False
 
 
 @frappe.whitelist()
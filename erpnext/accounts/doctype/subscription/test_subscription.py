@@ -8,7 +8,7 @@ import unittest
 import frappe
 from erpnext.accounts.doctype.subscription.subscription import get_prorata_factor
 from frappe.utils.data import (nowdate, add_days, add_to_date, add_months, date_diff, flt, get_date_str,
-	get_first_day, get_last_day)
+	get_first_day, get_last_day, getdate)
 
 def create_plan():
 	if not frappe.db.exists('Subscription Plan', '_Test Plan Name'):
@@ -284,6 +284,42 @@ class TestSubscription(unittest.TestCase):
 
 		subscription.delete()
 
+	def test_subscription_next_action_date(self):
+		from erpnext.accounts.doctype.subscription.subscription import (get_due_subscriptions, process,
+			process_all, get_subscription_process_metrics)
+
+		subscription = frappe.new_doc('Subscription')
+		subscription.party_type = 'Customer'
+		subscription.party = '_Test Customer'
+		subscription.append('plans', {'plan': '_Test Plan Name', 'qty': 1})
+		subscription.save()
+
+		# nothing to do until the end of the billing period
+		self.assertEqual(getdate(subscription.next_action_date), getdate(add_days(subscription.current_invoice_end, 1)))
+		self.assertNotIn(subscription.name, [d.name for d in get_due_subscriptions()])
+		self.assertEqual(process({'name': subscription.name}), None)
+
+		# prepaid subscriptions are invoiced right away
+		subscription.generate_invoice_at_period_start = 1
+		subscription.save()
+		self.assertEqual(getdate(subscription.next_action_date), getdate(nowdate()))
+		self.assertIn(subscription.name, [d.name for d in get_due_subscriptions()])
+
+		run_id = process_all()
+		metrics = get_subscription_process_metrics(run_id)
+		self.assertTrue(metrics.processed >= 1)
+		self.assertEqual(metrics.failed, 0)
+		# the metrics of a run expire
+		self.assertTrue(frappe.cache().ttl(frappe.cache().make_key("subscription_process_run:" + run_id)) > 0)
+
+		subscription.reload()
+		self.assertEqual(len(subscription.invoices), 1)
+		# the invoice becomes overdue the day after its due date
+		self.assertEqual(getdate(subscription.next_action_date), getdate(add_days(nowdate(), 1)))
+		self.assertEqual(process({'name': subscription.name}), None)
+
+		subscription.delete()
+
 	def test_subscription_cancelation(self):
 		subscription = frappe.new_doc('Subscription')
 		subscription.party_type = 'Customer'
@@ -3,18 +3,22 @@
 
 from __future__ import unicode_literals
 import frappe, erpnext
-from frappe.utils import flt, cstr, cint, comma_and
+from frappe.utils import flt, cstr, cint, comma_and, now
 from frappe import _
 from erpnext.accounts.utils import get_stock_and_account_balance
 from frappe.model.meta import get_field_precision
 from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
+from erpnext.accounts.doctype.gl_balance.gl_balance import add_gl_balances, remove_gl_balances
 
 
 class ClosedAccountingPeriod(frappe.ValidationError): pass
 class StockAccountInvalidTransaction(frappe.ValidationError): pass
 class StockValueAndAccountBalanceOutOfSync(frappe.ValidationError): pass
 
+# number of GL Entries inserted per query when posting in bulk
+GL_ENTRY_INSERT_BATCH_SIZE = 500
+
 def make_gl_entries(gl_map, cancel=False, adv_adj=False, merge_entries=True, update_outstanding='Yes', from_repost=False):
 	if gl_map:
 		if not cancel:
@@ -75,11 +79,13 @@ def process_gl_map(gl_map, merge_entries=True):
 
 def merge_similar_entries(gl_map):
 	merged_gl_map = []
+	merged_entries = {}
 	accounting_dimensions = get_accounting_dimensions()
 	for entry in gl_map:
 		# if there is already an entry in this account then just add it
 		# to that entry
-		same_head = check_if_in_list(entry, merged_gl_map, accounting_dimensions)
+		key = get_account_head_key(entry, accounting_dimensions)
+		same_head = merged_entries.get(key)
 		if same_head:
 			same_head.debit	= flt(same_head.debit) + flt(entry.debit)
 			same_head.debit_in_account_currency	= \
@@ -88,6 +94,7 @@ def merge_similar_entries(gl_map):
 			same_head.credit_in_account_currency = \
 				flt(same_head.credit_in_account_currency) + flt(entry.credit_in_account_currency)
 		else:
+			merged_entries[key] = entry
 			merged_gl_map.append(entry)
 
 	company = gl_map[0].company if gl_map else erpnext.get_default_company()
@@ -100,36 +107,38 @@ def merge_similar_entries(gl_map):
 
 	return merged_gl_map
 
-def check_if_in_list(gle, gl_map, dimensions=None):
+def get_account_head_key(gle, dimensions=None):
+	"""Returns the key on which similar GL entries are merged"""
 	account_head_fieldnames = ['party_type', 'party', 'against_voucher', 'against_voucher_type',
 		'cost_center', 'project']
 
 	if dimensions:
 		account_head_fieldnames = account_head_fieldnames + dimensions
 
-	for e in gl_map:
-		same_head = True
-		if e.account != gle.account:
-			same_head = False
-
-		for fieldname in account_head_fieldnames:
-			if cstr(e.get(fieldname)) != cstr(gle.get(fieldname)):
-				same_head = False
-
-		if same_head:
-			return e
+	return (gle.account,) + tuple(cstr(gle.get(fieldname)) for fieldname in account_head_fieldnames)
 
 def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 	if not from_repost:
 		validate_cwip_accounts(gl_map)
 
 	round_off_debit_credit(gl_map)
-	for entry in gl_map:
-		make_entry(entry, adv_adj, update_outstanding, from_repost)
+
+	if cint(frappe.db.get_single_value("Accounts Settings", "post_gl_entries_in_bulk")):
+		gl_entries = make_entries_in_bulk(gl_map, adv_adj, update_outstanding, from_repost)
 
 		# check against budget
 		if not from_repost:
-			validate_expense_against_budget(entry)
+			validate_budget_for_entries(gl_map)
+	else:
+		gl_entries = []
+		for entry in gl_map:
+			gl_entries.append(make_entry(entry, adv_adj, update_outstanding, from_repost))
+
+			# check against budget
+			if not from_repost:
+				validate_expense_against_budget(entry)
+
+	add_gl_balances([gle.name for gle in gl_entries])
 
 	if not from_repost:
 		validate_account_for_perpetual_inventory(gl_map)
@@ -146,6 +155,139 @@ def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	gle.flags.ignore_validate = True
 	gle.submit()
 
+	return gle
+
+def make_entries_in_bulk(gl_map, adv_adj, update_outstanding, from_repost=False):
+	"""
+		Validate all entries of a voucher with shared account and cost center lookups,
+		insert them with multi-row inserts and update outstanding once per against voucher.
+
+		The mandatory, length and link checks of `Document.submit` run for every entry,
+		links with one query per linked doctype. The `on_update`, `on_submit` and `on_change`
+		doc_events of GL Entry run after the insert, as they do for entries posted one by one.
+	"""
+	from erpnext.accounts.doctype.gl_entry.gl_entry import get_account_details_map, \
+		check_freezing_date, update_outstanding_amt, validate_frozen_account, validate_balance_type
+
+	account_details = get_account_details_map([d.account for d in gl_map])
+	cost_center_company, fiscal_years = {}, {}
+
+	gl_entries = []
+	for args in gl_map:
+		gle = frappe.new_doc("GL Entry")
+		gle.update(args)
+		gle.flags.ignore_permissions = 1
+		gle.flags.from_repost = from_repost
+		gle.flags.account_details = account_details.get(gle.account) or frappe._dict()
+		gle.cost_center_company = cost_center_company
+
+		if not gle.fiscal_year and gle.posting_date in fiscal_years:
+			gle.fiscal_year = fiscal_years[gle.posting_date]
+
+		gle.validate()
+		gle._validate_mandatory()
+		gle._validate_length()
+		fiscal_years.setdefault(gle.posting_date, gle.fiscal_year)
+
+		if not from_repost:
+			gle.validate_account_details(adv_adj)
+			gle.validate_dimensions_for_pl_and_bs()
+
+		gl_entries.append(gle)
+
+	if not from_repost:
+		for posting_date in set(gle.posting_date for gle in gl_entries):
+			check_freezing_date(posting_date, adv_adj)
+
+	validate_links(gl_entries)
+	insert_gl_entries(gl_entries)
+
+	for gle in gl_entries:
+		gle._action = "submit"
+		for method in ("on_update", "on_submit", "on_change"):
+			gle.run_method(method)
+
+	for account in set(gle.account for gle in gl_entries):
+		details = account_details.get(account) or frappe._dict()
+		if details.freeze_account == "Yes":
+			validate_frozen_account(account, adv_adj)
+		if details.balance_must_be:
+			validate_balance_type(account, adv_adj)
+
+	if update_outstanding == 'Yes' and not from_repost:
+		against_vouchers = []
+		for gle in gl_entries:
+			if gle.against_voucher_type in ['Journal Entry', 'Sales Invoice', 'Purchase Invoice', 'Fees'] \
+				and gle.against_voucher:
+				key = (gle.account, gle.party_type, gle.party, gle.against_voucher_type, gle.against_voucher)
+				if key not in against_vouchers:
+					against_vouchers.append(key)
+
+		for key in against_vouchers:
+			update_outstanding_amt(*key)
+
+	return gl_entries
+
+def validate_links(gl_entries):
+	"""Check the links of all entries with one query per linked doctype"""
+	meta = frappe.get_meta("GL Entry")
+	links = {}
+	for gle in gl_entries:
+		for df in meta.get_link_fields() + meta.get_dynamic_link_fields():
+			doctype = df.options if df.fieldtype == "Link" else gle.get(df.options)
+			if doctype and gle.get(df.fieldname):
+				links.setdefault(doctype, {}).setdefault(cstr(gle.get(df.fieldname)).lower(),
+					(df, gle.get(df.fieldname)))
+
+	for doctype, values in links.items():
+		docstatus = {cstr(d.name).lower(): d.docstatus for d in frappe.db.sql("""select name, docstatus
+			from `tab{0}` where name in ({1})""".format(doctype, ", ".join(["%s"] * len(values))),
+			tuple(values), as_dict=1)}
+
+		for key, (df, value) in values.items():
+			if key not in docstatus:
+				frappe.throw(_("Could not find {0}: {1}").format(_(df.label), value), frappe.LinkValidationError)
+			elif docstatus[key] == 2 and frappe.get_meta(doctype).is_submittable:
+				frappe.throw(_("Cannot link cancelled document: {0}: {1}").format(_(df.label), value),
+					frappe.CancelledLinkError)
+
+def insert_gl_entries(gl_entries):
+	"""Insert submitted GL Entries with multi-row insert queries"""
+	timestamp, user = now(), frappe.session.user
+
+	rows = []
+	for gle in gl_entries:
+		gle.autoname()
+		gle.docstatus = 1
+		gle.creation = gle.modified = timestamp
+		gle.owner = gle.modified_by = user
+		rows.append(gle.get_valid_dict(convert_dates_to_str=True))
+
+	columns = list(rows[0])
+	for start in range(0, len(rows), GL_ENTRY_INSERT_BATCH_SIZE):
+		batch = rows[start:start + GL_ENTRY_INSERT_BATCH_SIZE]
+
+		values = []
+		for row in batch:
+			values.extend([row.get(column) for column in columns])
+
+		frappe.db.sql("""insert into `tabGL Entry` ({0}) values {1}""".format(
+			", ".join("`{0}`".format(column) for column in columns),
+			", ".join(["({0})".format(", ".join(["%s"] * len(columns)))] * len(batch))),
+			tuple(values))
+
+def validate_budget_for_entries(gl_map):
+	"""Check budget only for entries whose account is part of a submitted Budget of the company"""
+	budget_accounts = frappe.db.sql_list("""select distinct ba.account
+		from `tabBudget` b, `tabBudget Account` ba
+		where b.name = ba.parent and b.docstatus = 1 and b.company = %s
+		and ba.account in ({0})""".format(", ".join(["%s"] * len(gl_map))),
+		tuple([gl_map[0].company] + [d.account for d in gl_map]))
+
+	for entry in gl_map:
+		if entry.account in budget_accounts:
+			validate_expense_against_budget(entry)
+
 def validate_account_for_perpetual_inventory(gl_map):
 	if cint(erpnext.is_perpetual_inventory_enabled(gl_map[0].company)):
 		account_list = [gl_entries.account for gl_entries in gl_map]
@@ -298,8 +440,12 @@ def delete_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 	if gl_entries:
 		check_freezing_date(gl_entries[0]["posting_date"], adv_adj)
 
+	voucher_type = voucher_type or gl_entries[0]["voucher_type"]
+	voucher_no = voucher_no or gl_entries[0]["voucher_no"]
+
+	remove_gl_balances(voucher_type, voucher_no)
 	frappe.db.sql("""delete from `tabGL Entry` where voucher_type=%s and voucher_no=%s""",
-		(voucher_type or gl_entries[0]["voucher_type"], voucher_no or gl_entries[0]["voucher_no"]))
+		(voucher_type, voucher_no))
 
 	for entry in gl_entries:
 		validate_frozen_account(entry["account"], adv_adj)
@@ -316,6 +316,7 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 		this.customer_wise_price_list = r.message.customer_wise_price_list
 		this.bin_data = r.message.bin_data;
 		this.pricing_rules = r.message.pricing_rules;
+		this.sync_token = r.message.sync_token;
 		this.print_template = r.message.print_template;
 		this.pos_profile_data = r.message.pos_profile;
 		this.default_customer = r.message.default_customer || null;
@@ -1788,9 +1789,90 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 		setInterval(function () {
 			me.freeze_screen = false;
 			me.sync_sales_invoice()
+			me.sync_master_data()
 		}, 180000)
 	},
 
+	sync_master_data: function (item_cursor, customer_cursor) {
+		// fetch the master data modified since the last sync, page by page
+		var me = this;
+		var first_page = !(item_cursor || customer_cursor);
+
+		frappe.call({
+			method: "erpnext.accounts.doctype.sales_invoice.pos.get_pos_data_updates",
+			args: {
+				sync_token: me.sync_token,
+				item_cursor: item_cursor || null,
+				customer_cursor: customer_cursor || null
+			},
+			callback: function (r) {
+				if (!r.message) return;
+
+				if (first_page) {
+					me.next_sync_token = r.message.sync_token;
+				}
+
+				me.update_master_data(r.message);
+				if (r.message.has_more) {
+					me.sync_master_data(r.message.item_cursor, r.message.customer_cursor);
+				} else {
+					me.sync_token = me.next_sync_token;
+				}
+			}
+		})
+	},
+
+	update_master_data: function (data) {
+		var me = this;
+
+		var updated_items = {};
+		$.each((data.items || []).concat(data.removed_items || []), function (i, d) {
+			updated_items[d.name || d] = true;
+		});
+		this.item_data = $.grep(this.item_data, function (d) {
+			return !updated_items[d.name];
+		}).concat(data.items || []);
+		this.items = this.item_data;
+
+		var updated_customers = {};
+		$.each((data.customers || []).concat(data.removed_customers || []), function (i, d) {
+			updated_customers[d.name || d] = true;
+		});
+		this.customers = $.grep(this.customers, function (d) {
+			return !updated_customers[d.name];
+		}).concat(data.customers || []);
+
+		$.extend(this.address, data.address);
+		$.extend(this.contacts, data.contacts);
+		$.extend(this.barcode_data, data.barcode_data);
+		$.extend(this.price_list_data, data.price_list_data);
+		$.extend(true, this.serial_no_data, data.serial_no_data);
+		$.extend(true, this.bin_data, data.bin_data);
+
+		$.each(data.batch_no_data || {}, function (item_code, batches) {
+			var batch_nos = me.batch_no_data[item_code] || [];
+			$.each(batches, function (i, batch_no) {
+				if (!in_list(batch_nos, batch_no)) {
+					batch_nos.push(batch_no);
+				}
+			});
+			me.batch_no_data[item_code] = batch_nos;
+		});
+
+		if (data.tax_data) {
+			this.tax_data = data.tax_data;
+		}
+
+		if (data.pricing_rules) {
+			this.pricing_rules = data.pricing_rules;
+		}
+
+		if (data.customers && data.customers.length) {
+			this.prepare_customer_mapper();
+			this.autocomplete_customers();
+		}
+	},
+
 	sync_sales_invoice: function () {
 		var me = this;
 		this.si_docs = this.get_submitted_invoice() || [];
@@ -1822,12 +1904,54 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 						me.prepare_customer_mapper();
 						me.autocomplete_customers();
 						me.render_list_customers();
+
+						if (r.message.sync_id) {
+							me.poll_invoice_sync(r.message.sync_id);
+						}
 					}
 				}
 			})
 		}
 	},
 
+	poll_invoice_sync: function (sync_id) {
+		// large queues are submitted in the background, remove invoices once they are synced
+		var me = this;
+		frappe.call({
+			method: "erpnext.accounts.doctype.sales_invoice.pos.get_offline_invoice_sync_status",
+			args: {
+				sync_id: sync_id
+			},
+			callback: function (r) {
+				var queued = false;
+				var drafts = [];
+				me.removed_items = [];
+				$.each(r.message || {}, function (name, status) {
+					if (status == "Queued") {
+						queued = true;
+					} else if (status == "Synced") {
+						me.removed_items.push(name);
+					} else if (status == "Draft") {
+						// saved on the server, but it has to be submitted from there
+						me.removed_items.push(name);
+						drafts.push(name);
+					}
+				});
+
+				me.remove_doc_from_localstorage();
+				if (drafts.length) {
+					frappe.msgprint(__("Offline invoices {0} could not be submitted and were saved as drafts",
+						[drafts.join(", ")]));
+				}
+				if (queued) {
+					setTimeout(function () {
+						me.poll_invoice_sync(sync_id);
+					}, 5000);
+				}
+			}
+		})
+	},
+
 	get_submitted_invoice: function () {
 		var invoices = [];
 		var index = 1;
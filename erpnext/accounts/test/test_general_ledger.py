@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+import unittest
+import frappe
+from erpnext.accounts.general_ledger import merge_similar_entries
+
+class TestGeneralLedger(unittest.TestCase):
+	def test_merge_similar_entries(self):
+		gl_map = [
+			make_gle("_Test Account Cost for Goods Sold - _TC", debit=100),
+			make_gle("_Test Bank - _TC", credit=100),
+			make_gle("_Test Account Cost for Goods Sold - _TC", debit=50),
+			make_gle("_Test Account Cost for Goods Sold - _TC", debit=25, project="_Test Project"),
+			make_gle("_Test Bank - _TC", credit=75)
+		]
+
+		merged_gl_map = merge_similar_entries(gl_map)
+
+		self.assertEqual([(d.account, d.debit, d.credit, d.project) for d in merged_gl_map], [
+			("_Test Account Cost for Goods Sold - _TC", 150, 0, None),
+			("_Test Bank - _TC", 0, 175, None),
+			("_Test Account Cost for Goods Sold - _TC", 25, 0, "_Test Project")
+		])
+
+	def test_merge_similar_entries_is_linear(self):
+		import erpnext.accounts.general_ledger as general_ledger
+
+		gl_map = [make_gle("_Test Account Cost for Goods Sold - _TC", debit=1, party=str(i % 1000))
+			for i in range(8000)]
+
+		# every entry is keyed once, a pairwise merge would build keys for every pair of entries
+		calls = []
+		get_account_head_key = general_ledger.get_account_head_key
+		def count_key(gle, dimensions=None):
+			calls.append(1)
+			return get_account_head_key(gle, dimensions)
+
+		general_ledger.get_account_head_key = count_key
+		try:
+			merged_gl_map = merge_similar_entries(gl_map)
+		finally:
+			general_ledger.get_account_head_key = get_account_head_key
+
+		self.assertEqual(len(calls), 8000)
+		self.assertEqual(len(merged_gl_map), 1000)
+		self.assertEqual(set(d.debit for d in merged_gl_map), {8})
+		self.assertEqual([d.party for d in merged_gl_map], [str(i) for i in range(1000)])
+
+def make_gle(account, debit=0, credit=0, **args):
+	gle = frappe._dict({
+		"account": account,
+		"company": "_Test Company",
+		"debit": debit,
+		"credit": credit,
+		"debit_in_account_currency": debit,
+		"credit_in_account_currency": credit
+	})
+	gle.update(args)
+	return gle
@@ -15,6 +15,8 @@ from erpnext.accounts.doctype.account.account import get_account_currency
 
 from erpnext.stock.utils import get_stock_value_on
 from erpnext.stock import get_warehouse_account_map
+from erpnext.accounts.doctype.gl_balance.gl_balance import get_balance_from_gl_balances, \
+	add_gl_balances, remove_gl_balances
 
 
 class FiscalYearError(frappe.ValidationError): pass
@@ -103,9 +105,8 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 
 
 	cond = []
-	if date:
-		cond.append("posting_date <= %s" % frappe.db.escape(cstr(date)))
-	else:
+	to_date = date
+	if not date:
 		# get balance of all entries that exist
 		date = nowdate()
 
@@ -126,6 +127,7 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 
 	allow_cost_center_in_entry_of_bs_account = get_allow_cost_center_in_entry_of_bs_account()
 
+	from_date = None
 	if account:
 		report_type = acc.report_type
 	else:
@@ -151,13 +153,11 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 
 		if report_type == 'Profit and Loss':
 			# for pl accounts, get balance within a fiscal year
-			cond.append("posting_date >= '%s' and voucher_type != 'Period Closing Voucher'" \
-				% year_start_date)
+			from_date = year_start_date
 		# different filter for group and ledger - improved performance
 		if acc.is_group:
-			cond.append("""exists (
-				select name from `tabAccount` ac where ac.name = gle.account
-				and ac.lft >= %s and ac.rgt <= %s
+			cond.append("""gle.account in (
+				select name from `tabAccount` ac where ac.lft >= %s and ac.rgt <= %s
 			)""" % (acc.lft, acc.rgt))
 
 			# If group and currency same as company,
@@ -179,13 +179,10 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 			select_field = "sum(debit_in_account_currency) - sum(credit_in_account_currency)"
 		else:
 			select_field = "sum(debit) - sum(credit)"
-		bal = frappe.db.sql("""
-			SELECT {0}
-			FROM `tabGL Entry` gle
-			WHERE {1}""".format(select_field, " and ".join(cond)))[0][0]
 
-		# if bal is None, return 0
-		return flt(bal)
+		# whole months are read from the balances maintained on posting
+		return get_balance_from_gl_balances(select_field, cond, from_date, to_date,
+			exclude_period_closing=(report_type == 'Profit and Loss'))
 
 def get_count_on(account, fieldname, date):
 	cond = []
@@ -559,10 +556,13 @@ def fix_total_debit_credit():
 		if abs(d.diff) > 0:
 			dr_or_cr = d.voucher_type == "Sales Invoice" and "credit" or "debit"
 
+			remove_gl_balances(d.voucher_type, d.voucher_no)
 			frappe.db.sql("""update `tabGL Entry` set %s = %s + %s
 				where voucher_type = %s and voucher_no = %s and %s > 0 limit 1""" %
 				(dr_or_cr, dr_or_cr, '%s', '%s', '%s', dr_or_cr),
 				(d.diff, d.voucher_type, d.voucher_no))
+			add_gl_balances(frappe.db.sql_list("""select name from `tabGL Entry`
+				where voucher_type = %s and voucher_no = %s""", (d.voucher_type, d.voucher_no)))
 
 def get_stock_and_account_balance(account=None, posting_date=None, company=None):
 	if not posting_date: posting_date = nowdate()
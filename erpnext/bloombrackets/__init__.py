@@ -55,6 +55,88 @@ def resolve_expression(expression, ctx):
 	else:
 		return expression
 
+class CompiledScript(object):
+	"""A bloombracket script compiled into a tree of closures.
+
+	Type detection and command lookups are done once while compiling, so running the
+	compiled script only evaluates the commands. Results match `run_script`.
+
+	Params:
+		script: list -> An expression list
+	"""
+
+	def __init__(self, script):
+		# compiled code blocks passed around as values (ex: IF branches) keyed by id
+		self.blocks = {}
+		self.run_block = self.compile_block(script)
+
+	def __call__(self, ctx):
+		"""Runs the compiled script against the passed context"""
+		ctx.update({
+			"#RUN": lambda script: self.run(script, ctx),
+			"#VAR": lambda path: resolve_variable(path, ctx),
+			"#VARS": ctx.get("#VARS", {})
+		})
+
+		self.run_block(ctx)
+		return ctx
+
+	def run(self, script, ctx):
+		run_block = self.blocks.get(id(script))
+		if run_block is None:
+			# block built while running, compile it on the fly
+			run_block = self.compile_block(script)
+
+		run_block(ctx)
+
+	def compile_block(self, script):
+		statements = [self.compile_expression(statement) for statement in script]
+
+		def run_block(ctx):
+			for statement in statements:
+				statement(ctx)
+
+		return run_block
+
+	def compile_expression(self, expression):
+		expression_type = resolve_type(expression)
+
+		if expression_type == TYPE_EXPRESSION:
+			cmd = expression[0]
+			args = [self.compile_expression(arg) for arg in expression[1:]]
+
+			fn = COMMANDS.get(cmd, CMD_UNSUPPORTED)
+			if fn == CMD_UNSUPPORTED:
+				def run_expression(ctx):
+					for arg in args:
+						arg(ctx)
+					return fn(cmd, ctx)
+			else:
+				def run_expression(ctx):
+					return fn([arg(ctx) for arg in args], ctx)
+
+			return run_expression
+		elif expression_type == TYPE_LIST:
+			args = [self.compile_expression(arg) for arg in expression[1:]]
+
+			return lambda ctx: [arg(ctx) for arg in args]
+		else:
+			if expression_type == TYPE_BLOCK:
+				self.blocks[id(expression)] = self.compile_block(expression)
+
+			return lambda ctx: expression
+
+def compile_script(script):
+	"""Compiles a block of bloombracket expressions.
+
+	Params:
+		script: list -> An expression list
+
+	Returns:
+		A CompiledScript which can be called with a script context any number of times.
+	"""
+	return CompiledScript(script)
+
 def resolve_type(value):
 	"""Resolves data types of passed values. Internally called to distinguish expressions from data.
 	
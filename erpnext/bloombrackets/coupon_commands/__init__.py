@@ -7,9 +7,18 @@ def build_context(ctx, for_doctype, skip_meta):
 		build_coupon_meta(ctx, for_doctype)
 		build_coupon_var_meta(ctx, for_doctype)
 
+# command tables built from hooks, per site and doctype
+coupon_commands = {}
+
 def build_coupon_commands(ctx, for_doctype):
+	key = (frappe.local.site, for_doctype)
+	if key not in coupon_commands:
+		commands = {}
+		call_hooks("coupon_brackets_extend_commands", commands=commands, for_doctype=for_doctype)
+		coupon_commands[key] = commands
+
 	ctx.update({ "#CALLS": ctx.get("#CALLS", {}) })
-	call_hooks("coupon_brackets_extend_commands", commands=ctx["#CALLS"], for_doctype=for_doctype)
+	ctx["#CALLS"].update(coupon_commands[key])
 
 def build_coupon_vars(ctx, for_doctype):
 	ctx.update({ "#VARS": ctx.get("#VARS", {}) })
@@ -5,7 +5,7 @@ from unittest.mock import patch
 from frappe import _dict
 from frappe.model.document import Document
 from frappe.utils.mock import mock_meta, build_get_meta_side_effects, build_get_doc_side_effect
-from erpnext.bloombrackets import resolve_expression
+from erpnext.bloombrackets import resolve_expression, run_script, compile_script
 from erpnext.bloombrackets.commands import *
 
 QUOTATION_META = mock_meta("Quotation", fields=[
@@ -147,4 +147,24 @@ class TestBloomBrackets(unittest.TestCase):
 		get_meta.assert_called()
 		self.assertTrue(full_name == "Mr. Test Customer")
 
-	
\ No newline at end of file
+	def test_compiled_script(self):
+		script = [
+			[CMD_IF, [CMD_NOT_EQUALS, [CMD_VAR, "foo"], "bar"], [
+				[CMD_SET, "foo", "bar"]
+			], [
+				[CMD_SET, "foo", "nvm"],
+				[CMD_SET, "foo_set", True]
+			]],
+			[CMD_SET, "values", [CMD_ARRAY, [CMD_ADD, 1, [CMD_ADD, 1, 1]], 4, 5]]
+		]
+		compiled_script = compile_script(script)
+
+		for script_vars in ({}, { "foo": "bar" }):
+			ctx1 = { "#VARS": dict(script_vars) }
+			run_script(script, ctx1)
+
+			# compiled scripts can be run any number of times
+			for i in range(2):
+				ctx2 = { "#VARS": dict(script_vars) }
+				compiled_script(ctx2)
+				self.assertEqual(ctx1.get("#VARS"), ctx2.get("#VARS"))
@@ -18,9 +18,7 @@ def calculate_cannabis_tax(doc):
 	if frappe.get_cached_value("Stock Settings", None, "disable_cannabis_taxes_calculation"):
 		return
 
-	compliance_items = frappe.get_all('Item',
-		filters={'is_compliance_item': True},
-		fields=['item_code', 'enable_cultivation_tax', 'item_category'])
+	compliance_items = get_compliance_items([item.get("item_code") for item in doc.get("items") or []])
 
 	if not compliance_items:
 		return
@@ -29,7 +27,7 @@ def calculate_cannabis_tax(doc):
 		if doc.doctype == "Purchase Receipt" and frappe.db.get_single_value("Buying Settings", "disable_cultivation_tax_for_purchase_receipt"):
 			return
 		# calculate cultivation tax for buying cycle
-		cultivation_taxes = calculate_cultivation_tax(doc)
+		cultivation_taxes = calculate_cultivation_tax(doc, compliance_items)
 		for account, tax in cultivation_taxes.items():
 			cultivation_tax_row = get_cultivation_tax_row(account, tax)
 			set_taxes(doc, cultivation_tax_row)
@@ -50,7 +48,7 @@ def calculate_cannabis_tax(doc):
 		license_for = frappe.db.get_value("Compliance Info", default_customer_license, "license_for")
 		if license_for == "Distributor":
 			# calculate cultivation tax for selling cycle if customer is a distributor
-			cultivation_taxes = calculate_cultivation_tax(doc)
+			cultivation_taxes = calculate_cultivation_tax(doc, compliance_items)
 			for account, tax in cultivation_taxes.items():
 				cultivation_tax_row = get_cultivation_tax_row(account, tax)
 				set_taxes(doc, cultivation_tax_row)
@@ -60,26 +58,71 @@ def calculate_cannabis_tax(doc):
 			set_taxes(doc, excise_tax_row)
 
 
-def calculate_cultivation_tax(doc):
+def get_compliance_items(item_codes):
+	"""
+	Returns compliance details of the given items, keyed by item code.
+
+	Only the requested item codes are loaded. Results are cached for the rest
+	of the request and cleared whenever an Item is saved.
+	"""
+	if not hasattr(frappe.local, "compliance_items"):
+		frappe.local.compliance_items = {}
+
+	cache = frappe.local.compliance_items
+	item_codes = [item_code for item_code in item_codes if item_code]
+
+	items_to_load = list(set(item_code for item_code in item_codes if item_code not in cache))
+	if items_to_load:
+		cache.update(dict.fromkeys(items_to_load))
+
+		for item in frappe.get_all('Item',
+			filters={'is_compliance_item': True, 'item_code': ('in', items_to_load)},
+			fields=['item_code', 'enable_cultivation_tax', 'item_category']):
+			cache[item.item_code] = item
+
+	return {item_code: cache[item_code] for item_code in item_codes if cache.get(item_code)}
+
+
+def clear_compliance_items_cache(doc=None, method=None):
+	frappe.local.compliance_items = {}
+
+
+def calculate_cultivation_tax(doc, compliance_items=None):
+	if compliance_items is None:
+		compliance_items = get_compliance_items([item.get("item_code") for item in doc.get("items") or []])
+
 	cultivation_taxes = {}
+	tax_accounts = []
 	for item in doc.get("items"):
-		cultivation_taxes = calculate_item_cultivation_tax(doc, item, cultivation_taxes)
+		cultivation_taxes = calculate_item_cultivation_tax(doc, item, cultivation_taxes,
+			compliance_items, tax_accounts)
 
 	return cultivation_taxes
 
 
-def calculate_item_cultivation_tax(doc, item, cultivation_taxes=None):
-	compliance_items = frappe.get_all('Item',
-		filters={'is_compliance_item': True},
-		fields=['item_code', 'enable_cultivation_tax', 'item_category'])
+def get_cultivation_tax_accounts(company):
+	return [
+		get_company_default(company, "default_cultivation_tax_account_flower"),
+		get_company_default(company, "default_cultivation_tax_account_leaf"),
+		get_company_default(company, "default_cultivation_tax_account_plant")
+	]
 
-	compliance_item = next((data for data in compliance_items if data.get("item_code") == item.get("item_code")), None)
+
+def calculate_item_cultivation_tax(doc, item, cultivation_taxes=None, compliance_items=None, tax_accounts=None):
+	if compliance_items is None:
+		compliance_items = get_compliance_items([item.get("item_code")])
+
+	compliance_item = compliance_items.get(item.get("item_code"))
 	if not compliance_item or not compliance_item.enable_cultivation_tax:
 		return cultivation_taxes
 
-	flower_tax_account = get_company_default(doc.get("company"), "default_cultivation_tax_account_flower")
-	leaf_tax_account = get_company_default(doc.get("company"), "default_cultivation_tax_account_leaf")
-	plant_tax_account = get_company_default(doc.get("company"), "default_cultivation_tax_account_plant")
+	# tax accounts are looked up once for all the items of a document
+	if tax_accounts is None:
+		tax_accounts = []
+	if not tax_accounts:
+		tax_accounts.extend(get_cultivation_tax_accounts(doc.get("company")))
+
+	flower_tax_account, leaf_tax_account, plant_tax_account = tax_accounts
 
 	if not cultivation_taxes:
 		cultivation_taxes = dict.fromkeys([flower_tax_account, leaf_tax_account, plant_tax_account], float())
@@ -134,15 +177,15 @@ def calculate_excise_tax(doc, compliance_items):
 	total_excise_tax = total_shipping_charge = 0
 
 	if doc.get("taxes"):
+		shipping_account = get_company_default(doc.get("company"), "default_shipping_account")
 		for tax in doc.get("taxes"):
-			if tax.get("account_head") == get_company_default(doc.get("company"), "default_shipping_account"):
+			if tax.get("account_head") == shipping_account:
 				total_shipping_charge += tax.tax_amount
 
 	# if order type is sample then pass tax_ammount zero to remove excise tax row automatically.
 	if not doc.get("order_type") == "Sample":
 		for item in (doc.get("items") or []):
-			compliance_item = next((data for data in compliance_items if data.get("item_code") == item.get("item_code")), None)
-			if not compliance_item:
+			if not compliance_items.get(item.get("item_code")):
 				continue
 
 			# fetch either the transaction rate or price list rate, whichever is higher
@@ -210,7 +253,7 @@ def set_excise_tax(doc):
 	if isinstance(doc, str):
 		doc = frappe._dict(json.loads(doc))
 
-	compliance_items = frappe.get_all('Item', filters={'is_compliance_item': True}, fields=['item_code'])
+	compliance_items = get_compliance_items([item.get("item_code") for item in doc.get("items") or []])
 	if not compliance_items:
 		return
 
@@ -225,11 +268,11 @@ def set_cultivation_tax(doc):
 	if doc.doctype == "Purchase Receipt" and frappe.db.get_single_value("Buying Settings", "disable_cultivation_tax_for_purchase_receipt"):
 		return
 
-	compliance_items = frappe.get_all('Item', filters={'is_compliance_item': True}, fields=['item_code'])
+	compliance_items = get_compliance_items([item.get("item_code") for item in doc.get("items") or []])
 	if not compliance_items:
 		return
 	cultivation_tax_row = []
-	cultivation_taxes = calculate_cultivation_tax(doc)
+	cultivation_taxes = calculate_cultivation_tax(doc, compliance_items)
 	for account, tax in cultivation_taxes.items():
 		cultivation_tax_row.append(get_cultivation_tax_row(account, tax))
 	return cultivation_tax_row
@@ -243,9 +286,11 @@ def get_cultivation_tax(doc, items):
 		doc = frappe._dict(json.loads(doc))
 
 	items = json.loads(items)
+	compliance_items = get_compliance_items([item.get("item_code") for item in items])
+	tax_accounts = []
 
 	for item in items:
-		tax = calculate_item_cultivation_tax(doc, item)
+		tax = calculate_item_cultivation_tax(doc, item, compliance_items=compliance_items, tax_accounts=tax_accounts)
 		if tax:
 			item['amount'] = flt(item.get("amount")) + sum(tax.values())
 
@@ -7,7 +7,7 @@ import json
 from frappe import _, throw
 from frappe.utils import (today, flt, cint, fmt_money, formatdate,
 	getdate, add_days, add_months, get_last_day, nowdate, get_link_to_form)
-from erpnext.stock.get_item_details import get_conversion_factor, get_item_details
+from erpnext.stock.get_item_details import get_conversion_factor, get_items_details_bulk
 from erpnext.setup.utils import get_exchange_rate
 from erpnext.accounts.utils import get_fiscal_years, validate_fiscal_year, get_account_currency
 from erpnext.utilities.transaction_base import TransactionBase
@@ -262,6 +262,7 @@ class AccountsController(TransactionBase):
 			if self.doctype == "Quotation" and self.quotation_to == "Customer" and parent_dict.get("party_name"):
 				parent_dict.update({"customer": parent_dict.get("party_name")})
 
+			items, args_list = [], []
 			for item in self.get("items"):
 				if item.get("item_code"):
 					args = parent_dict.copy()
@@ -277,29 +278,35 @@ class AccountsController(TransactionBase):
 					if self.get("is_subcontracted"):
 						args["is_subcontracted"] = self.is_subcontracted
 
-					ret = get_item_details(args, self, for_validate=True, overwrite_warehouse=False)
+					items.append(item)
+					args_list.append(args)
 
-					for fieldname, value in ret.items():
-						if item.meta.get_field(fieldname) and value is not None:
-							if (item.get(fieldname) is None or fieldname in force_item_fields):
-								item.set(fieldname, value)
+			# the details of all the rows are read together
+			item_details = get_items_details_bulk(self, args_list, for_validate=True,
+				overwrite_warehouse=False) if args_list else []
 
-							elif fieldname in ['cost_center', 'conversion_factor'] and not item.get(fieldname):
-								item.set(fieldname, value)
+			for item, ret in zip(items, item_details):
+				for fieldname, value in ret.items():
+					if item.meta.get_field(fieldname) and value is not None:
+						if (item.get(fieldname) is None or fieldname in force_item_fields):
+							item.set(fieldname, value)
 
-							elif fieldname == "serial_no":
-								# Ensure that serial numbers are matched against Stock UOM
-								item_conversion_factor = item.get("conversion_factor") or 1.0
-								item_qty = abs(item.get("qty")) * item_conversion_factor
+						elif fieldname in ['cost_center', 'conversion_factor'] and not item.get(fieldname):
+							item.set(fieldname, value)
 
-								if item_qty != len(get_serial_nos(item.get('serial_no'))):
-									item.set(fieldname, value)
+						elif fieldname == "serial_no":
+							# Ensure that serial numbers are matched against Stock UOM
+							item_conversion_factor = item.get("conversion_factor") or 1.0
+							item_qty = abs(item.get("qty")) * item_conversion_factor
+
+							if item_qty != len(get_serial_nos(item.get('serial_no'))):
+								item.set(fieldname, value)
 
-					if self.doctype in ["Purchase Invoice", "Sales Invoice"] and item.meta.get_field('is_fixed_asset'):
-						item.set('is_fixed_asset', ret.get('is_fixed_asset', 0))
+				if self.doctype in ["Purchase Invoice", "Sales Invoice"] and item.meta.get_field('is_fixed_asset'):
+					item.set('is_fixed_asset', ret.get('is_fixed_asset', 0))
 
-					if ret.get("pricing_rules"):
-						self.apply_pricing_rule_on_items(item, ret)
+				if ret.get("pricing_rules"):
+					self.apply_pricing_rule_on_items(item, ret)
 
 			if self.doctype == "Purchase Invoice":
 				self.set_expense_account(for_validate)
@@ -5,6 +5,7 @@ import erpnext
 import frappe
 import frappe.defaults
 from erpnext.accounts.general_ledger import delete_gl_entries, make_gl_entries, process_gl_map
+from erpnext.accounts.doctype.gl_balance.gl_balance import remove_gl_balances
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.compliance.doctype.compliance_info.compliance_info import validate_license_expiry
 from erpnext.compliance.taxes import calculate_cannabis_tax
@@ -389,6 +390,7 @@ class StockController(AccountsController):
 def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for_items=None,
 		warehouse_account=None, company=None):
 	def _delete_gl_entries(voucher_type, voucher_no):
+		remove_gl_balances(voucher_type, voucher_no)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
 
@@ -5,11 +5,14 @@ from __future__ import unicode_literals
 import json
 import frappe, erpnext
 from frappe import _, scrub
-from frappe.utils import cint, flt, round_based_on_smallest_currency_fraction
+from frappe.utils import cint, cstr, flt, round_based_on_smallest_currency_fraction
 from erpnext.controllers.accounts_controller import validate_conversion_rate, \
 	validate_taxes_and_charges, validate_inclusive_tax
 from erpnext.stock.get_item_details import _get_item_tax_template
 
+# documents with at least this many items calculate taxes column by column
+COLUMNAR_TAXES_MIN_ITEMS = 50
+
 class calculate_taxes_and_totals(object):
 	def __init__(self, doc):
 		self.doc = doc
@@ -20,6 +23,8 @@ class calculate_taxes_and_totals(object):
 			return
 
 		self.discount_amount_applied = False
+		self.item_tax_maps = None
+		self.columnar = self.use_columnar_mode()
 		self._calculate()
 
 		if self.doc.meta.get_field("discount_amount"):
@@ -151,10 +156,50 @@ class calculate_taxes_and_totals(object):
 
 			self.doc.round_floats_in(tax)
 
+	def use_columnar_mode(self):
+		"""
+			Large documents calculate each tax for all the items at once instead of
+			each item for all the taxes, `flags.taxes_and_totals_mode` can force either mode
+		"""
+		mode = self.doc.flags.taxes_and_totals_mode
+		if mode:
+			return mode == "Columnar"
+
+		return len(self.doc.get("items")) >= COLUMNAR_TAXES_MIN_ITEMS
+
+	def get_item_tax_maps(self):
+		"""Item tax maps of all the items, parsed once per document"""
+		if self.item_tax_maps is None:
+			self.item_tax_maps = [self._load_item_tax_rate(item.item_tax_rate)
+				for item in self.doc.get("items")]
+
+		return self.item_tax_maps
+
+	def get_tax_rate_column(self, tax):
+		"""Tax rate of each item for the given tax, rounding every distinct item tax rate once"""
+		precision = self.doc.precision("rate", tax)
+		rates = {}
+
+		column = []
+		for item_tax_map in self.get_item_tax_maps():
+			if tax.account_head in item_tax_map:
+				rate = item_tax_map.get(tax.account_head)
+				key = cstr(rate)
+				if key not in rates:
+					rates[key] = flt(rate, precision)
+				column.append(rates[key])
+			else:
+				column.append(tax.rate)
+
+		return column
+
 	def determine_exclusive_rate(self):
 		if not any((cint(tax.included_in_print_rate) for tax in self.doc.get("taxes"))):
 			return
 
+		if self.columnar:
+			return self.determine_exclusive_rate_columnar()
+
 		for item in self.doc.get("items"):
 			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
 			cumulated_tax_fraction = 0
@@ -178,6 +223,57 @@ class calculate_taxes_and_totals(object):
 
 				self._set_in_company_currency(item, ["net_rate", "net_amount"])
 
+	def determine_exclusive_rate_columnar(self):
+		items, taxes = self.doc.get("items"), self.doc.get("taxes")
+		tax_fractions, grand_total_fractions = [], []
+		cumulated_tax_fractions = [0] * len(items)
+
+		for i, tax in enumerate(taxes):
+			tax_fraction = [0] * len(items)
+
+			if cint(tax.included_in_print_rate):
+				rates = self.get_tax_rate_column(tax)
+
+				if tax.charge_type == "On Net Total":
+					tax_fraction = [rate / 100.0 for rate in rates]
+
+				elif tax.charge_type == "On Previous Row Amount":
+					tax_fraction = [(rate / 100.0) * fraction for rate, fraction
+						in zip(rates, tax_fractions[cint(tax.row_id) - 1])]
+
+				elif tax.charge_type == "On Previous Row Total":
+					tax_fraction = [(rate / 100.0) * fraction for rate, fraction
+						in zip(rates, grand_total_fractions[cint(tax.row_id) - 1])]
+
+			if getattr(tax, "add_deduct_tax", None):
+				sign = -1.0 if (tax.add_deduct_tax == "Deduct") else 1.0
+				tax_fraction = [fraction * sign for fraction in tax_fraction]
+
+			if i==0:
+				grand_total_fraction = [1 + fraction for fraction in tax_fraction]
+			else:
+				grand_total_fraction = [previous + fraction for previous, fraction
+					in zip(grand_total_fractions[i-1], tax_fraction)]
+
+			cumulated_tax_fractions = [cumulated + fraction for cumulated, fraction
+				in zip(cumulated_tax_fractions, tax_fraction)]
+
+			tax_fractions.append(tax_fraction)
+			grand_total_fractions.append(grand_total_fraction)
+
+			# rows keep the values of the last item, as in the row wise calculation
+			tax.tax_fraction_for_current_item = tax_fraction[-1]
+			tax.grand_total_fraction_for_current_item = grand_total_fraction[-1]
+
+		for item, cumulated_tax_fraction in zip(items, cumulated_tax_fractions):
+			if cumulated_tax_fraction and not self.discount_amount_applied and item.qty:
+				item.net_amount = flt(item.amount / (1 + cumulated_tax_fraction))
+				item.net_rate = flt(item.net_amount / item.qty, item.precision("net_rate"))
+				item.discount_percentage = flt(item.discount_percentage,
+					item.precision("discount_percentage"))
+
+				self._set_in_company_currency(item, ["net_rate", "net_amount"])
+
 	def _load_item_tax_rate(self, item_tax_rate):
 		return json.loads(item_tax_rate) if item_tax_rate else {}
 
@@ -228,6 +324,9 @@ class calculate_taxes_and_totals(object):
 			self.doc.pos_total_qty = self.doc.total_qty
 
 	def calculate_taxes(self):
+		if self.columnar:
+			return self.calculate_taxes_columnar()
+
 		self.doc.rounding_adjustment = 0
 		# maintain actual tax rate based on idx
 		actual_tax_dict = dict([[tax.idx, flt(tax.tax_amount, tax.precision("tax_amount"))]
@@ -282,6 +381,93 @@ class calculate_taxes_and_totals(object):
 								- flt(self.doc.discount_amount) - tax.total,
 								self.doc.precision("rounding_adjustment"))
 
+	def calculate_taxes_columnar(self):
+		"""
+			Same calculation as `calculate_taxes`, but each tax is applied to all the items at once.
+			The amounts of every item are added in item order, so totals round exactly as before.
+		"""
+		self.doc.rounding_adjustment = 0
+		items, taxes = self.doc.get("items"), self.doc.get("taxes")
+		net_amounts = [item.net_amount for item in items]
+		item_keys = [item.item_code or item.item_name for item in items]
+		accumulate_tax_amount = not (self.discount_amount_applied and self.doc.apply_discount_on=="Grand Total")
+		tax_amounts, grand_totals = [], []
+
+		for i, tax in enumerate(taxes):
+			rates = self.get_tax_rate_column(tax)
+			current_tax_amounts = self.get_current_tax_amount_column(tax, rates, net_amounts,
+				tax_amounts, grand_totals)
+
+			# store tax breakup for each item
+			for key, tax_rate, current_tax_amount in zip(item_keys, rates, current_tax_amounts):
+				item_wise_tax_amount = current_tax_amount*self.doc.conversion_rate
+				if tax.item_wise_tax_detail.get(key):
+					item_wise_tax_amount += tax.item_wise_tax_detail[key][1]
+
+				tax.item_wise_tax_detail[key] = [tax_rate, flt(item_wise_tax_amount)]
+
+			# Adjust divisional loss to the last item
+			if tax.charge_type == "Actual":
+				remaining_tax_amount = flt(tax.tax_amount, tax.precision("tax_amount"))
+				for current_tax_amount in current_tax_amounts:
+					remaining_tax_amount -= current_tax_amount
+				current_tax_amounts[-1] += remaining_tax_amount
+
+			for current_tax_amount in current_tax_amounts:
+				if tax.charge_type != "Actual" and accumulate_tax_amount:
+					tax.tax_amount += current_tax_amount
+				tax.tax_amount_after_discount_amount += current_tax_amount
+
+			tax.tax_amount_for_current_item = current_tax_amounts[-1]
+
+			net_tax_amounts = [self.get_tax_amount_if_for_valuation_or_deduction(current_tax_amount, tax)
+				for current_tax_amount in current_tax_amounts]
+
+			if i==0:
+				grand_total = [flt(net_amount + tax_amount)
+					for net_amount, tax_amount in zip(net_amounts, net_tax_amounts)]
+			else:
+				grand_total = [flt(previous + tax_amount)
+					for previous, tax_amount in zip(grand_totals[i-1], net_tax_amounts)]
+
+			tax.grand_total_for_current_item = grand_total[-1]
+			tax_amounts.append(current_tax_amounts)
+			grand_totals.append(grand_total)
+
+			self.round_off_totals(tax)
+			self.set_cumulative_total(i, tax)
+
+			self._set_in_company_currency(tax,
+				["total", "tax_amount", "tax_amount_after_discount_amount"])
+
+			# adjust Discount Amount loss in last tax iteration
+			if i == (len(taxes) - 1) and self.discount_amount_applied \
+				and self.doc.discount_amount and self.doc.apply_discount_on == "Grand Total":
+					self.doc.rounding_adjustment = flt(self.doc.grand_total
+						- flt(self.doc.discount_amount) - tax.total,
+						self.doc.precision("rounding_adjustment"))
+
+	def get_current_tax_amount_column(self, tax, rates, net_amounts, tax_amounts, grand_totals):
+		"""Tax amount of each item for the given tax, see `get_current_tax_amount`"""
+		if tax.charge_type == "Actual":
+			# distribute the tax amount proportionally to each item row
+			actual = flt(tax.tax_amount, tax.precision("tax_amount"))
+			return [net_amount*actual / self.doc.net_total if self.doc.net_total else 0.0
+				for net_amount in net_amounts]
+
+		elif tax.charge_type == "On Net Total":
+			return [(tax_rate / 100.0) * net_amount for tax_rate, net_amount in zip(rates, net_amounts)]
+		elif tax.charge_type == "On Previous Row Amount":
+			return [(tax_rate / 100.0) * previous for tax_rate, previous
+				in zip(rates, tax_amounts[cint(tax.row_id) - 1])]
+		elif tax.charge_type == "On Previous Row Total":
+			return [(tax_rate / 100.0) * previous for tax_rate, previous
+				in zip(rates, grand_totals[cint(tax.row_id) - 1])]
+		elif tax.charge_type == "On Item Quantity":
+			return [tax_rate * item.stock_qty for tax_rate, item in zip(rates, self.doc.get("items"))]
+
+		return [0.0] * len(net_amounts)
+
 	def get_tax_amount_if_for_valuation_or_deduction(self, tax_amount, tax):
 		# if just for valuation, do not add the tax amount in total
 		# if tax/charges is for deduction, multiply by -1
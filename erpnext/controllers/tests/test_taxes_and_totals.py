@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+import json
+import unittest
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+
+class TestTaxesAndTotals(unittest.TestCase):
+	def test_columnar_mode_parity(self):
+		for inclusive in (0, 1):
+			for apply_discount_on in ("", "Net Total", "Grand Total"):
+				row_wise = self.calculate(make_invoice(inclusive, apply_discount_on), "Row")
+				columnar = self.calculate(make_invoice(inclusive, apply_discount_on), "Columnar")
+
+				self.assertEqual(get_values(row_wise), get_values(columnar))
+
+	def test_columnar_mode_for_large_documents(self):
+		from erpnext.controllers.taxes_and_totals import COLUMNAR_TAXES_MIN_ITEMS, calculate_taxes_and_totals
+
+		self.assertTrue(calculate_taxes_and_totals(make_invoice(0, "", COLUMNAR_TAXES_MIN_ITEMS)).columnar)
+		self.assertFalse(calculate_taxes_and_totals(make_invoice(0, "", 1)).columnar)
+
+	def calculate(self, si, mode):
+		si.flags.taxes_and_totals_mode = mode
+		si.calculate_taxes_and_totals()
+		return si
+
+def make_invoice(inclusive, apply_discount_on, no_of_items=120):
+	si = create_sales_invoice(conversion_rate=1.37, currency="USD", do_not_save=True)
+	si.items = []
+
+	for i in range(no_of_items):
+		si.append("items", {
+			# repeated item codes add up in the item wise tax breakup
+			"item_code": "_Test Item" if i % 2 else "_Test Item 2",
+			"warehouse": "_Test Warehouse - _TC",
+			"qty": i % 7 + 1,
+			"rate": 13.37 * (i % 11 + 1),
+			"income_account": "Sales - _TC",
+			"expense_account": "Cost of Goods Sold - _TC",
+			"cost_center": "_Test Cost Center - _TC",
+			"item_tax_rate": json.dumps({"_Test Account Excise Duty - _TC": 12.3456}) if i % 3 else None
+		})
+
+	for tax in [
+		{"charge_type": "On Net Total", "account_head": "_Test Account Excise Duty - _TC", "rate": 12,
+			"included_in_print_rate": inclusive},
+		{"charge_type": "On Previous Row Amount", "account_head": "_Test Account Education Cess - _TC",
+			"rate": 2, "row_id": 1, "included_in_print_rate": inclusive},
+		{"charge_type": "On Previous Row Total", "account_head": "_Test Account S&H Education Cess - _TC",
+			"rate": 1.5, "row_id": 2, "included_in_print_rate": inclusive},
+		{"charge_type": "Actual", "account_head": "_Test Account Shipping Charges - _TC", "tax_amount": 100.03},
+		{"charge_type": "On Item Quantity", "account_head": "_Test Account Customs Duty - _TC", "rate": 0.35},
+		{"charge_type": "On Previous Row Total", "account_head": "_Test Account VAT - _TC", "rate": 7.5, "row_id": 5}
+	]:
+		tax.update({
+			"category": "Total",
+			"add_deduct_tax": "Add",
+			"cost_center": "_Test Cost Center - _TC",
+			"description": tax["account_head"]
+		})
+		si.append("taxes", tax)
+
+	if apply_discount_on:
+		si.apply_discount_on = apply_discount_on
+		si.additional_discount_percentage = 7.77
+
+	return si
+
+def get_values(si):
+	values = [si.as_dict().get(fieldname) for fieldname in ("total", "net_total", "total_taxes_and_charges",
+		"base_total_taxes_and_charges", "grand_total", "base_grand_total", "rounding_adjustment",
+		"discount_amount", "rounded_total")]
+
+	for item in si.items:
+		values.append([item.get(fieldname) for fieldname in ("net_rate", "net_amount", "base_net_rate",
+			"base_net_amount", "discount_percentage")])
+
+	for tax in si.taxes:
+		values.append([tax.get(fieldname) for fieldname in ("tax_amount", "base_tax_amount",
+			"tax_amount_after_discount_amount", "base_tax_amount_after_discount_amount", "total",
+			"base_total", "tax_amount_for_current_item", "grand_total_for_current_item",
+			"tax_fraction_for_current_item", "grand_total_fraction_for_current_item", "item_wise_tax_detail")])
+
+	return values
@@ -39,6 +39,7 @@ setup_wizard_test = "erpnext.setup.setup_wizard.test_setup_wizard.run_setup_wiza
 
 before_install = "erpnext.setup.install.check_setup_wizard_not_completed"
 after_install = "erpnext.setup.install.after_install"
+after_migrate = ["erpnext.utilities.tree_closure.bump_all_tree_versions"]
 
 boot_session = "erpnext.startup.boot.boot_session"
 notification_config = "erpnext.startup.notifications.get_notification_config"
@@ -232,7 +233,24 @@ standard_queries = {
 	"Healthcare Practitioner": "erpnext.healthcare.doctype.healthcare_practitioner.healthcare_practitioner.get_practitioner_list"
 }
 
+_tree_closure_events = {
+	"on_update": "erpnext.utilities.tree_closure.clear_tree_closure",
+	"on_trash": "erpnext.utilities.tree_closure.clear_tree_closure",
+	"after_rename": "erpnext.utilities.tree_closure.clear_tree_closure"
+}
+
 doc_events = {
+	"Item Group": _tree_closure_events,
+	"Warehouse": _tree_closure_events,
+	"Account": _tree_closure_events,
+	"Cost Center": _tree_closure_events,
+	"Territory": _tree_closure_events,
+	"Customer Group": _tree_closure_events,
+	"Supplier Group": _tree_closure_events,
+	"Item": {
+		"on_update": "erpnext.compliance.taxes.clear_compliance_items_cache",
+		"on_trash": "erpnext.compliance.taxes.clear_compliance_items_cache"
+	},
 	"Stock Entry": {
 		"on_submit": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty",
 		"on_cancel": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty"
@@ -294,7 +312,8 @@ auto_cancel_exempt_doctypes = ["Payment Entry"]
 scheduler_events = {
 	"all": [
 		"erpnext.projects.doctype.project.project.project_status_update_reminder",
-		"erpnext.healthcare.doctype.patient_appointment.patient_appointment.set_appointment_reminder"
+		"erpnext.healthcare.doctype.patient_appointment.patient_appointment.set_appointment_reminder",
+		"erpnext.stock.doctype.stock_repost_request.stock_repost_request.process_repost_requests"
 	],
 	"hourly": [
 		'erpnext.hr.doctype.daily_work_summary_group.daily_work_summary_group.trigger_emails',
@@ -306,6 +325,8 @@ scheduler_events = {
 		"erpnext.projects.doctype.project.project.collect_project_status",
 		"erpnext.hr.doctype.shift_type.shift_type.process_auto_attendance_for_all_shifts",
 		"erpnext.support.doctype.issue.issue.set_service_level_agreement_variance",
+		"erpnext.accounts.doctype.gl_balance.gl_balance.compact_gl_balances",
+		"erpnext.hr.doctype.payroll_entry.payroll_entry.requeue_stale_employees",
 	],
 	"daily": [
 		"erpnext.stock.reorder_item.reorder_item",
@@ -332,6 +353,7 @@ scheduler_events = {
 		"erpnext.stock.doctype.stock_entry.stock_entry.raw_material_update_on_bom"
 	],
 	"daily_long": [
+		"erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot.make_stock_balance_snapshots",
 		"erpnext.setup.doctype.email_digest.email_digest.send",
 		"erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool.update_latest_price_in_all_boms",
 		"erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry.process_expired_allocation",
@@ -6,11 +6,17 @@ from __future__ import unicode_literals
 import frappe
 from frappe.model.document import Document
 from dateutil.relativedelta import relativedelta
-from frappe.utils import cint, flt, nowdate, add_days, getdate, fmt_money, add_to_date, DATE_FORMAT, date_diff
+from frappe.utils import cint, flt, nowdate, now_datetime, add_days, getdate, fmt_money, add_to_date, DATE_FORMAT, date_diff
 from frappe import _
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
 
+# number of employees whose salary slips are created or submitted per background job
+PAYROLL_CHUNK_SIZE = 50
+
+# seconds after which a chunk job is killed, employees processed for longer are queued again
+PAYROLL_JOB_TIMEOUT = 600
+
 class PayrollEntry(Document):
 	def onload(self):
 		if not self.docstatus==1 or self.salary_slips_submitted:
@@ -113,24 +119,30 @@ class PayrollEntry(Document):
 		self.created = 1
 		emp_list = [d.employee for d in self.get_emp_list()]
 		if emp_list:
-			args = frappe._dict({
-				"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
-				"payroll_frequency": self.payroll_frequency,
-				"start_date": self.start_date,
-				"end_date": self.end_date,
-				"company": self.company,
-				"posting_date": self.posting_date,
-				"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
-				"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
-				"payroll_entry": self.name
-			})
+			args = self.get_salary_slip_args()
 			if len(emp_list) > 30:
-				frappe.enqueue(create_salary_slips_for_employees, timeout=600, employees=emp_list, args=args)
+				self.queue_employees(emp_list)
+				for start in range(0, len(emp_list), PAYROLL_CHUNK_SIZE):
+					frappe.enqueue(create_salary_slips_for_chunk, timeout=PAYROLL_JOB_TIMEOUT,
+						employees=emp_list[start:start + PAYROLL_CHUNK_SIZE], args=args)
 			else:
 				create_salary_slips_for_employees(emp_list, args, publish_progress=False)
 				# since this method is called via frm.call this doc needs to be updated manually
 				self.reload()
 
+	def get_salary_slip_args(self):
+		return frappe._dict({
+			"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
+			"payroll_frequency": self.payroll_frequency,
+			"start_date": self.start_date,
+			"end_date": self.end_date,
+			"company": self.company,
+			"posting_date": self.posting_date,
+			"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
+			"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
+			"payroll_entry": self.name
+		})
+
 	def get_sal_slip_list(self, ss_status, as_dict=False):
 		"""
 			Returns list of salary slips based on selected criteria
@@ -148,10 +160,61 @@ class PayrollEntry(Document):
 		self.check_permission('write')
 		ss_list = self.get_sal_slip_list(ss_status=0)
 		if len(ss_list) > 30:
-			frappe.enqueue(submit_salary_slips_for_employees, timeout=600, payroll_entry=self, salary_slips=ss_list)
+			salary_slips = [ss[0] for ss in ss_list]
+			self.queue_employees(frappe.db.sql_list("""select distinct employee from `tabSalary Slip`
+				where name in %s""", (tuple(salary_slips),)))
+
+			for start in range(0, len(salary_slips), PAYROLL_CHUNK_SIZE):
+				frappe.enqueue(submit_salary_slips_for_chunk, timeout=PAYROLL_JOB_TIMEOUT, payroll_entry=self.name,
+					salary_slips=salary_slips[start:start + PAYROLL_CHUNK_SIZE])
 		else:
 			submit_salary_slips_for_employees(self, ss_list, publish_progress=False)
 
+	def queue_employees(self, employees):
+		"""
+			Mark the employees processed by the background jobs as queued in the employees table,
+			which keeps the status and the error of every employee. The job that finds
+			no queued employee left completes the step for the Payroll Entry.
+		"""
+		listed_employees = [d.employee for d in self.employees]
+		for employee in employees:
+			if employee not in listed_employees:
+				self.append("employees", {"employee": employee}).db_insert()
+
+		frappe.db.sql("""update `tabPayroll Employee Detail`
+			set salary_slip_status = 'Queued', error_message = '', modified = %s
+			where parent = %s and employee in %s""", (now_datetime(), self.name, tuple(employees)))
+
+	def requeue_employees(self, employees):
+		"""
+			Queue again the employees left processing by a chunk job that was killed. A created or
+			submitted salary slip is skipped by the jobs, so an employee can be queued twice.
+		"""
+		self.queue_employees(employees)
+		if not self.salary_slips_created:
+			args = self.get_salary_slip_args()
+			for start in range(0, len(employees), PAYROLL_CHUNK_SIZE):
+				frappe.enqueue(create_salary_slips_for_chunk, timeout=PAYROLL_JOB_TIMEOUT,
+					employees=employees[start:start + PAYROLL_CHUNK_SIZE], args=args)
+			return
+
+		salary_slips = frappe.db.sql("""select name, employee from `tabSalary Slip`
+			where payroll_entry = %s and employee in %s and docstatus < 2""",
+			(self.name, tuple(employees)), as_dict=1)
+
+		for employee in set(employees) - set(d.employee for d in salary_slips):
+			update_payroll_employee_status(self.name, employee, "Failed",
+				error_message=_("Salary Slip not found"))
+
+		salary_slips = [d.name for d in salary_slips]
+		for start in range(0, len(salary_slips), PAYROLL_CHUNK_SIZE):
+			frappe.enqueue(submit_salary_slips_for_chunk, timeout=PAYROLL_JOB_TIMEOUT, payroll_entry=self.name,
+				salary_slips=salary_slips[start:start + PAYROLL_CHUNK_SIZE])
+
+		if not salary_slips:
+			frappe.db.commit()
+			complete_salary_slip_submission(self.name)
+
 	def email_salary_slip(self, submitted_ss):
 		if frappe.db.get_single_value("HR Settings", "email_salary_slip_to_employee"):
 			for ss in submitted_ss:
@@ -220,7 +283,7 @@ class PayrollEntry(Document):
 
 		return payroll_payable_account
 
-	def make_accrual_jv_entry(self):
+	def make_accrual_jv_entry(self, raise_exception=False):
 		self.check_permission('write')
 		earnings = self.get_salary_component_total(component_type = "earnings") or {}
 		deductions = self.get_salary_component_total(component_type = "deductions") or {}
@@ -301,6 +364,8 @@ class PayrollEntry(Document):
 				jv_name = journal_entry.name
 				self.update_salary_slip_status(jv_name = jv_name)
 			except Exception as e:
+				if raise_exception:
+					raise
 				frappe.msgprint(e)
 
 		return jv_name
@@ -366,9 +431,9 @@ class PayrollEntry(Document):
 
 	def update_salary_slip_status(self, jv_name = None):
 		ss_list = self.get_sal_slip_list(ss_status=1)
-		for ss in ss_list:
-			ss_obj = frappe.get_doc("Salary Slip",ss[0])
-			frappe.db.set_value("Salary Slip", ss_obj.name, "journal_entry", jv_name)
+		if ss_list:
+			frappe.db.sql("""update `tabSalary Slip` set journal_entry = %s where name in %s""",
+				(jv_name, tuple(ss[0] for ss in ss_list)))
 
 	def set_start_end_dates(self):
 		self.update(get_start_end_dates(self.payroll_frequency,
@@ -509,20 +574,28 @@ def payroll_entry_has_bank_entries(name):
 	return response
 
 def create_salary_slips_for_employees(employees, args, publish_progress=True):
+	from erpnext.hr.doctype.salary_slip.salary_slip import preload_data_for_eval
+
 	salary_slips_exists_for = get_existing_salary_slips(employees, args)
+	preload_data_for_eval([emp for emp in employees if emp not in salary_slips_exists_for])
+
 	count=0
-	for emp in employees:
-		if emp not in salary_slips_exists_for:
-			args.update({
-				"doctype": "Salary Slip",
-				"employee": emp
-			})
-			ss = frappe.get_doc(args)
-			ss.insert()
-			count+=1
-			if publish_progress:
-				frappe.publish_progress(count*100/len(set(employees) - set(salary_slips_exists_for)),
-					title = _("Creating Salary Slips..."))
+	try:
+		for emp in employees:
+			if emp not in salary_slips_exists_for:
+				args.update({
+					"doctype": "Salary Slip",
+					"employee": emp
+				})
+				ss = frappe.get_doc(args)
+				ss.insert()
+				update_payroll_employee_status(args.payroll_entry, emp, "Created", salary_slip=ss.name)
+				count+=1
+				if publish_progress:
+					frappe.publish_progress(count*100/len(set(employees) - set(salary_slips_exists_for)),
+						title = _("Creating Salary Slips..."))
+	finally:
+		frappe.flags.salary_slip_eval_data = None
 
 	payroll_entry = frappe.get_doc("Payroll Entry", args.payroll_entry)
 	payroll_entry.db_set("salary_slips_created", 1)
@@ -538,25 +611,37 @@ def get_existing_salary_slips(employees, args):
 		[args.company, args.start_date, args.end_date] + employees)
 
 def submit_salary_slips_for_employees(payroll_entry, salary_slips, publish_progress=True):
+	from erpnext.hr.doctype.salary_slip.salary_slip import preload_data_for_eval
+
 	submitted_ss = []
 	not_submitted_ss = []
 	frappe.flags.via_payroll_entry = True
 
+	# the slips are calculated again on submit
+	if salary_slips:
+		preload_data_for_eval(frappe.db.sql_list("""select distinct employee from `tabSalary Slip`
+			where name in %s""", (tuple(ss[0] for ss in salary_slips),)))
+
 	count = 0
-	for ss in salary_slips:
-		ss_obj = frappe.get_doc("Salary Slip",ss[0])
-		if ss_obj.net_pay<0:
-			not_submitted_ss.append(ss[0])
-		else:
-			try:
-				ss_obj.submit()
-				submitted_ss.append(ss_obj)
-			except frappe.ValidationError:
+	try:
+		for ss in salary_slips:
+			ss_obj = frappe.get_doc("Salary Slip",ss[0])
+			if ss_obj.net_pay<0:
 				not_submitted_ss.append(ss[0])
-
-		count += 1
-		if publish_progress:
-			frappe.publish_progress(count*100/len(salary_slips), title = _("Submitting Salary Slips..."))
+			else:
+				try:
+					ss_obj.submit()
+					submitted_ss.append(ss_obj)
+					update_payroll_employee_status(payroll_entry.name, ss_obj.employee, "Submitted",
+						salary_slip=ss_obj.name)
+				except frappe.ValidationError:
+					not_submitted_ss.append(ss[0])
+
+			count += 1
+			if publish_progress:
+				frappe.publish_progress(count*100/len(salary_slips), title = _("Submitting Salary Slips..."))
+	finally:
+		frappe.flags.salary_slip_eval_data = None
 	if submitted_ss:
 		payroll_entry.make_accrual_jv_entry()
 		frappe.msgprint(_("Salary Slip submitted for period from {0} to {1}")
@@ -573,6 +658,147 @@ def submit_salary_slips_for_employees(payroll_entry, salary_slips, publish_progr
 	if not_submitted_ss:
 		frappe.msgprint(_("Could not submit some Salary Slips"))
 
+def create_salary_slips_for_chunk(employees, args):
+	"""
+		Background job creating the salary slips of a chunk of the employees of a Payroll Entry.
+		Every slip is committed on its own and the employees who already have a slip are skipped,
+		so a failed employee does not undo the others and a job can be run again.
+	"""
+	from erpnext.hr.doctype.salary_slip.salary_slip import preload_data_for_eval
+
+	start_processing_employees(args.payroll_entry, employees)
+
+	salary_slips_exists_for = get_existing_salary_slips(employees, args)
+	preload_data_for_eval([emp for emp in employees if emp not in salary_slips_exists_for])
+
+	try:
+		for emp in employees:
+			if emp in salary_slips_exists_for:
+				update_payroll_employee_status(args.payroll_entry, emp, "Created")
+			else:
+				try:
+					ss = frappe.get_doc(dict(args, doctype="Salary Slip", employee=emp))
+					ss.insert()
+					update_payroll_employee_status(args.payroll_entry, emp, "Created", salary_slip=ss.name)
+				except Exception:
+					frappe.db.rollback()
+					update_payroll_employee_status(args.payroll_entry, emp, "Failed",
+						error_message=frappe.get_traceback())
+
+			frappe.db.commit()
+	finally:
+		frappe.flags.salary_slip_eval_data = None
+
+	if not get_queued_employees(args.payroll_entry):
+		payroll_entry = frappe.get_doc("Payroll Entry", args.payroll_entry)
+		payroll_entry.db_set("salary_slips_created", 1)
+		payroll_entry.notify_update()
+
+def submit_salary_slips_for_chunk(payroll_entry, salary_slips):
+	"""
+		Background job submitting a chunk of the salary slips of a Payroll Entry, every slip is
+		committed on its own. The job that submits the last slips makes the accrual Journal Entry.
+	"""
+	from erpnext.hr.doctype.salary_slip.salary_slip import preload_data_for_eval
+
+	employees = frappe.db.sql_list("""select distinct employee from `tabSalary Slip`
+		where name in %s""", (tuple(salary_slips),))
+	start_processing_employees(payroll_entry, employees)
+
+	frappe.flags.via_payroll_entry = True
+	preload_data_for_eval(employees)
+
+	submitted_ss = []
+	try:
+		for salary_slip in salary_slips:
+			ss_obj = frappe.get_doc("Salary Slip", salary_slip)
+			try:
+				if ss_obj.docstatus == 0:
+					if ss_obj.net_pay < 0:
+						frappe.throw(_("Net Pay cannot be negative"))
+
+					ss_obj.submit()
+					submitted_ss.append(ss_obj)
+
+				update_payroll_employee_status(payroll_entry, ss_obj.employee, "Submitted",
+					salary_slip=ss_obj.name)
+			except Exception:
+				frappe.db.rollback()
+				update_payroll_employee_status(payroll_entry, ss_obj.employee, "Failed",
+					salary_slip=ss_obj.name, error_message=frappe.get_traceback())
+
+			frappe.db.commit()
+	finally:
+		frappe.flags.salary_slip_eval_data = None
+
+	frappe.get_doc("Payroll Entry", payroll_entry).email_salary_slip(submitted_ss)
+	frappe.db.commit()
+
+	complete_salary_slip_submission(payroll_entry)
+
+def complete_salary_slip_submission(payroll_entry):
+	"""Makes the accrual Journal Entry once no employee is queued, only the job that claims the step makes it"""
+	if get_queued_employees(payroll_entry) or not frappe.db.exists("Payroll Employee Detail",
+		{"parent": payroll_entry, "salary_slip_status": "Submitted"}):
+		return
+
+	# the locking read waits for the claim of another job, and sees it once that job is committed
+	if frappe.db.sql("""select salary_slips_submitted from `tabPayroll Entry`
+		where name = %s for update""", payroll_entry)[0][0]:
+		return
+
+	frappe.db.sql("""update `tabPayroll Entry` set salary_slips_submitted = 1
+		where name = %s""", payroll_entry)
+
+	payroll_entry_doc = frappe.get_doc("Payroll Entry", payroll_entry)
+	try:
+		payroll_entry_doc.make_accrual_jv_entry(raise_exception=True)
+	except Exception:
+		# the claim is rolled back with the Journal Entry, so that the step can be completed again
+		frappe.db.rollback()
+		frappe.log_error(frappe.get_traceback(),
+			_("Accrual Journal Entry failed for Payroll Entry {0}").format(payroll_entry))
+		frappe.db.commit()
+		raise
+
+	payroll_entry_doc.notify_update()
+
+def update_payroll_employee_status(payroll_entry, employee, status, salary_slip=None, error_message=None):
+	frappe.db.sql("""update `tabPayroll Employee Detail`
+		set salary_slip_status = %s, salary_slip = ifnull(%s, salary_slip), error_message = %s, modified = %s
+		where parent = %s and employee = %s""",
+		(status, salary_slip, error_message or "", now_datetime(), payroll_entry, employee))
+
+def start_processing_employees(payroll_entry, employees):
+	"""Mark the queued employees picked up by a chunk job as processing, a job that is killed leaves them so"""
+	frappe.db.sql("""update `tabPayroll Employee Detail`
+		set salary_slip_status = 'Processing', modified = %s
+		where parent = %s and employee in %s and salary_slip_status = 'Queued'""",
+		(now_datetime(), payroll_entry, tuple(employees)))
+	frappe.db.commit()
+
+def get_queued_employees(payroll_entry):
+	"""
+		Returns the employees still queued or processing. The rows are read with a locking read, which sees
+		the rows committed by the other jobs and not the snapshot of the current transaction.
+	"""
+	return frappe.db.sql_list("""select employee from `tabPayroll Employee Detail`
+		where parent = %s and salary_slip_status in ('Queued', 'Processing') for update""", payroll_entry)
+
+def requeue_stale_employees():
+	"""Hourly job queueing again the employees whose chunk job was killed while processing them"""
+	stale_employees = {}
+	for d in frappe.db.sql("""select parent, employee from `tabPayroll Employee Detail`
+		where parenttype = 'Payroll Entry' and salary_slip_status = 'Processing' and modified < %s
+		order by parent, idx""", add_to_date(now_datetime(), seconds=-PAYROLL_JOB_TIMEOUT), as_dict=1):
+		stale_employees.setdefault(d.parent, []).append(d.employee)
+
+	for payroll_entry, employees in stale_employees.items():
+		payroll_entry = frappe.get_doc("Payroll Entry", payroll_entry)
+		if payroll_entry.docstatus == 1:
+			payroll_entry.requeue_employees(employees)
+			frappe.db.commit()
+
 def get_payroll_entries_for_jv(doctype, txt, searchfield, start, page_len, filters):
 	return frappe.db.sql("""
 		select name from `tabPayroll Entry`
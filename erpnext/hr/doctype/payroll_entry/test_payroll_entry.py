@@ -36,6 +36,72 @@ class TestPayrollEntry(unittest.TestCase):
 		if not frappe.db.get_value("Salary Slip", {"start_date": dates.start_date, "end_date": dates.end_date}):
 			make_payroll_entry(start_date=dates.start_date, end_date=dates.end_date)
 
+	def test_payroll_entry_in_chunks(self):
+		from erpnext.hr.doctype.payroll_entry.payroll_entry import (create_salary_slips_for_chunk,
+			submit_salary_slips_for_chunk, complete_salary_slip_submission, PayrollEntry)
+
+		company = erpnext.get_default_company()
+		for data in frappe.get_all('Salary Component', fields = ["name"]):
+			if not frappe.db.get_value('Salary Component Account',
+				{'parent': data.name, 'company': company}, 'name'):
+				get_salary_component_account(data.name)
+
+		employee = make_employee("test_employee@payroll_chunks.com")
+		make_salary_structure("_Test Salary Structure for Chunks", "Monthly", employee)
+		dates = get_start_end_dates('Monthly', nowdate())
+
+		payroll_entry = frappe.new_doc("Payroll Entry")
+		payroll_entry.update({
+			"company": company,
+			"start_date": dates.start_date,
+			"end_date": dates.end_date,
+			"payment_account": get_payment_account(),
+			"posting_date": nowdate(),
+			"payroll_frequency": "Monthly"
+		})
+		payroll_entry.save()
+
+		# the jobs run one after the other here, each one as a chunk of a single employee
+		employees = [d.employee for d in payroll_entry.get_emp_list()]
+		payroll_entry.queue_employees(employees)
+		for emp in employees:
+			create_salary_slips_for_chunk([emp], payroll_entry.get_salary_slip_args())
+
+		payroll_entry.reload()
+		self.assertTrue(payroll_entry.salary_slips_created)
+		self.assertFalse([d.employee for d in payroll_entry.employees
+			if d.salary_slip_status in ("Queued", "Processing")])
+
+		row = [d for d in payroll_entry.employees if d.employee == employee][0]
+		self.assertEqual(row.salary_slip_status, "Created")
+		self.assertEqual(frappe.db.get_value("Salary Slip", row.salary_slip, "employee"), employee)
+
+		# running a chunk again does not make another slip
+		create_salary_slips_for_chunk([employee], payroll_entry.get_salary_slip_args())
+		self.assertEqual(frappe.db.count("Salary Slip", {"payroll_entry": payroll_entry.name,
+			"employee": employee}), 1)
+
+		salary_slips = [ss[0] for ss in payroll_entry.get_sal_slip_list(ss_status=0)]
+		payroll_entry.queue_employees(frappe.db.sql_list("""select employee from `tabSalary Slip`
+			where name in %s""", (tuple(salary_slips),)))
+		submit_salary_slips_for_chunk(payroll_entry.name, salary_slips)
+
+		payroll_entry.reload()
+		self.assertEqual(frappe.db.get_value("Salary Slip", row.salary_slip, "docstatus"), 1)
+		self.assertTrue(payroll_entry.salary_slips_submitted)
+		self.assertTrue(frappe.db.get_value("Salary Slip", row.salary_slip, "journal_entry"))
+
+		# a job completing the step again does not make another accrual entry
+		accrual_entries = []
+		make_accrual_jv_entry = PayrollEntry.make_accrual_jv_entry
+		PayrollEntry.make_accrual_jv_entry = lambda self, **kwargs: accrual_entries.append(self.name)
+		try:
+			complete_salary_slip_submission(payroll_entry.name)
+		finally:
+			PayrollEntry.make_accrual_jv_entry = make_accrual_jv_entry
+
+		self.assertEqual(accrual_entries, [])
+
 	def test_get_end_date(self):
 		self.assertEqual(get_end_date('2017-01-01', 'monthly'), {'end_date': '2017-01-31'})
 		self.assertEqual(get_end_date('2017-02-01', 'monthly'), {'end_date': '2017-02-28'})
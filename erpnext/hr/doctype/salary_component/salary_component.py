@@ -3,6 +3,7 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
+import frappe
 from frappe.model.document import Document
 from frappe.model.naming import append_number_if_name_exists
 
@@ -10,6 +11,12 @@ class SalaryComponent(Document):
 	def validate(self):
 		self.validate_abbr()
 
+	def on_update(self):
+		clear_salary_component_abbrs()
+
+	def on_trash(self):
+		clear_salary_component_abbrs()
+
 	def validate_abbr(self):
 		if not self.salary_component_abbr:
 			self.salary_component_abbr = ''.join([c[0] for c in
@@ -18,3 +25,11 @@ class SalaryComponent(Document):
 		self.salary_component_abbr = self.salary_component_abbr.strip()
 		self.salary_component_abbr = append_number_if_name_exists('Salary Component', self.salary_component_abbr,
 			'salary_component_abbr', separator='_', filters={"name": ["!=", self.name]})
+
+def get_salary_component_abbrs():
+	"""Returns the abbreviations of all the Salary Components, shared by all the salary slips until a component changes"""
+	return frappe.cache().get_value("salary_component_abbrs",
+		lambda: [d.salary_component_abbr for d in frappe.get_all("Salary Component", fields=["salary_component_abbr"])])
+
+def clear_salary_component_abbrs():
+	frappe.cache().delete_value("salary_component_abbrs")
@@ -17,6 +17,13 @@ from erpnext.hr.doctype.additional_salary.additional_salary import get_additiona
 from erpnext.hr.doctype.payroll_period.payroll_period import get_period_factor, get_payroll_period
 from erpnext.hr.doctype.employee_benefit_application.employee_benefit_application import get_benefit_component_amount
 from erpnext.hr.doctype.employee_benefit_claim.employee_benefit_claim import get_benefit_claim_amount, get_last_payroll_period_benefits
+from erpnext.hr.doctype.salary_component.salary_component import get_salary_component_abbrs
+
+# number of employees whose details are read per query when preloading a payroll
+EVAL_DATA_BATCH_SIZE = 500
+
+# code objects of the formulas and conditions, keyed by their text and shared by all the slips of the process
+compiled_formulas = {}
 
 class SalarySlip(TransactionBase):
 	def __init__(self, *args, **kwargs):
@@ -128,7 +135,7 @@ class SalarySlip(TransactionBase):
 			struct = self.check_sal_struct(joining_date, relieving_date)
 
 			if struct:
-				self._salary_structure_doc = frappe.get_doc('Salary Structure', struct)
+				self._salary_structure_doc = frappe.get_cached_doc('Salary Structure', struct)
 				self.salary_slip_based_on_timesheet = self._salary_structure_doc.salary_slip_based_on_timesheet or 0
 				self.set_time_sheet()
 				self.pull_sal_struct()
@@ -308,7 +315,7 @@ class SalarySlip(TransactionBase):
 
 	def calculate_component_amounts(self, component_type):
 		if not getattr(self, '_salary_structure_doc', None):
-			self._salary_structure_doc = frappe.get_doc('Salary Structure', self.salary_structure)
+			self._salary_structure_doc = frappe.get_cached_doc('Salary Structure', self.salary_structure)
 
 		payroll_period = get_payroll_period(self.start_date, self.end_date, self.company)
 
@@ -332,16 +339,14 @@ class SalarySlip(TransactionBase):
 		'''Returns data for evaluating formula'''
 		data = frappe._dict()
 
-		data.update(frappe.get_doc("Salary Structure Assignment",
-			{"employee": self.employee, "salary_structure": self.salary_structure}).as_dict())
-
-		data.update(frappe.get_doc("Employee", self.employee).as_dict())
+		assignment, employee = self.get_employee_data_for_eval()
+		data.update(assignment)
+		data.update(employee)
 		data.update(self.as_dict())
 
 		# set values for components
-		salary_components = frappe.get_all("Salary Component", fields=["salary_component_abbr"])
-		for sc in salary_components:
-			data.setdefault(sc.salary_component_abbr, 0)
+		for abbr in get_salary_component_abbrs():
+			data.setdefault(abbr, 0)
 
 		for key in ('earnings', 'deductions'):
 			for d in self.get(key):
@@ -349,17 +354,34 @@ class SalarySlip(TransactionBase):
 
 		return data
 
+	def get_employee_data_for_eval(self):
+		'''Returns the Salary Structure Assignment and the Employee details used in the formulas,
+			preloaded for all the slips of a Payroll Entry or loaded once per slip'''
+		key = (self.employee, self.salary_structure)
+
+		preloaded = frappe.flags.salary_slip_eval_data
+		if preloaded and key in preloaded.assignments and self.employee in preloaded.employees:
+			return preloaded.assignments[key], preloaded.employees[self.employee]
+
+		if getattr(self, '_eval_data_key', None) != key:
+			self._eval_assignment = frappe.get_doc("Salary Structure Assignment",
+				{"employee": self.employee, "salary_structure": self.salary_structure}).as_dict()
+			self._eval_employee = frappe.get_doc("Employee", self.employee).as_dict()
+			self._eval_data_key = key
+
+		return self._eval_assignment, self._eval_employee
+
 	def eval_condition_and_formula(self, d, data):
 		try:
 			condition = d.condition.strip().replace("\n", " ") if d.condition else None
 			if condition:
-				if not frappe.safe_eval(condition, self.whitelisted_globals, data):
+				if not safe_eval_compiled(condition, self.whitelisted_globals, data):
 					return None
 			amount = d.amount
 			if d.amount_based_on_formula:
 				formula = d.formula.strip().replace("\n", " ") if d.formula else None
 				if formula:
-					amount = flt(frappe.safe_eval(formula, self.whitelisted_globals, data), d.precision("amount"))
+					amount = flt(safe_eval_compiled(formula, self.whitelisted_globals, data), d.precision("amount"))
 			if amount:
 				data[d.abbr] = amount
 
@@ -786,7 +808,7 @@ class SalarySlip(TransactionBase):
 		try:
 			condition = condition.strip()
 			if condition:
-				return frappe.safe_eval(condition, self.whitelisted_globals, data)
+				return safe_eval_compiled(condition, self.whitelisted_globals, data)
 		except NameError as err:
 			frappe.throw(_("Name error: {0}".format(err)))
 		except SyntaxError as err:
@@ -938,6 +960,39 @@ class SalarySlip(TransactionBase):
 		self.get_leave_details(lwp=lwp)
 		self.calculate_net_pay()
 
+def safe_eval_compiled(expression, eval_globals, eval_locals):
+	"""Same as frappe.safe_eval, but every expression is compiled only once"""
+	code = compiled_formulas.get(expression)
+	if code is None:
+		if '__' in expression:
+			frappe.throw(_('Illegal rule {0}. Cannot use "__"').format(frappe.bold(expression)))
+
+		code = compiled_formulas[expression] = compile(expression, '<salary formula>', 'eval')
+
+	eval_globals['__builtins__'] = {}
+	eval_globals.update({"int": int, "float": float, "long": int, "round": round})
+	return eval(code, eval_globals, eval_locals)
+
+def preload_data_for_eval(employees):
+	"""Load the Employee and Salary Structure Assignment details used in the formulas
+		for all the employees of a Payroll Entry, instead of once per slip"""
+	preloaded = frappe._dict({"employees": {}, "assignments": {}})
+
+	for start in range(0, len(employees), EVAL_DATA_BATCH_SIZE):
+		batch = tuple(employees[start:start + EVAL_DATA_BATCH_SIZE])
+
+		for d in frappe.db.sql("""select * from `tabEmployee` where name in %s""", (batch,), as_dict=1):
+			preloaded.employees[d.name] = frappe.get_doc(dict(d, doctype="Employee")).as_dict()
+
+		# the latest modified assignment of the structure, like frappe.get_doc with filters
+		for d in frappe.db.sql("""select * from `tabSalary Structure Assignment`
+			where employee in %s order by modified desc""", (batch,), as_dict=1):
+			if (d.employee, d.salary_structure) not in preloaded.assignments:
+				preloaded.assignments[(d.employee, d.salary_structure)] = frappe.get_doc(
+					dict(d, doctype="Salary Structure Assignment")).as_dict()
+
+	frappe.flags.salary_slip_eval_data = preloaded
+
 def unlink_ref_doc_from_salary_slip(ref_no):
 	linked_ss = frappe.db.sql_list("""select name from `tabSalary Slip`
 	where journal_entry=%s and docstatus < 2""", (ref_no))
@@ -144,6 +144,27 @@ class TestSalarySlip(unittest.TestCase):
 		self.assertEqual(ss.total_loan_repayment, 582)
 		self.assertEqual(ss.net_pay, (flt(ss.gross_pay) - (flt(ss.total_deduction) + flt(ss.total_loan_repayment))))
 
+	def test_formula_evaluation_with_preloaded_data(self):
+		from erpnext.hr.doctype.salary_slip.salary_slip import (compiled_formulas,
+			preload_data_for_eval, safe_eval_compiled)
+
+		make_employee("test_employee@salary.com")
+		ss = make_employee_salary_slip("test_employee@salary.com", "Monthly")
+		data = ss.get_data_for_eval()
+
+		preload_data_for_eval([ss.employee])
+		try:
+			preloaded_data = frappe.get_doc("Salary Slip", ss.name).get_data_for_eval()
+		finally:
+			frappe.flags.salary_slip_eval_data = None
+
+		for key in ("base", "variable", "employee_name", "date_of_joining", "gross_pay"):
+			self.assertEqual(data.get(key), preloaded_data.get(key))
+
+		self.assertEqual(safe_eval_compiled("base * 2", {}, data), flt(data.base) * 2)
+		self.assertTrue("base * 2" in compiled_formulas)
+		self.assertRaises(frappe.ValidationError, safe_eval_compiled, "().__class__", {}, data)
+
 	def test_payroll_frequency(self):
 		fiscal_year = get_fiscal_year(nowdate(), company=erpnext.get_default_company())[0]
 		month = "%02d" % getdate(nowdate()).month
@@ -12,8 +12,9 @@ from erpnext.stock.get_item_details import get_price_list_rate
 from frappe.core.doctype.version.version import get_diff
 
 import functools
+import pickle
 
-from six import string_types
+from six import string_types, iteritems
 
 from operator import itemgetter
 
@@ -68,26 +69,33 @@ class BOM(WebsiteGenerator):
 		context.parents = [{'name': 'boms', 'title': _('All BOMs') }]
 
 	def on_update(self):
-		frappe.cache().hdel('bom_children', self.name)
+		update_bom_graph(self.name)
 		self.check_recursion()
 		self.update_stock_qty()
 		self.update_exploded_items()
 
 	def on_submit(self):
+		update_bom_graph(self.name)
 		self.manage_default_bom()
 
 	def on_cancel(self):
 		frappe.db.set(self, "is_active", 0)
 		frappe.db.set(self, "is_default", 0)
+		update_bom_graph(self.name)
 
 		# check if used in any other bom
 		self.validate_bom_links()
 		self.manage_default_bom()
 
 	def on_update_after_submit(self):
+		update_bom_graph(self.name)
 		self.validate_bom_links()
 		self.manage_default_bom()
 
+	def on_trash(self):
+		super(BOM, self).on_trash()
+		update_bom_graph(self.name, deleted=True)
+
 	def get_item_det(self, item_code):
 		item = frappe.db.sql("""select name, item_name, docstatus, description, image,
 			is_sub_contracted_item, stock_uom, default_bom, last_purchase_rate, include_item_in_manufacturing
@@ -187,7 +195,7 @@ class BOM(WebsiteGenerator):
 			rate = self.get_valuation_rate(arg)
 		elif arg:
 			#Customer Provided parts will have zero rate
-			if not frappe.db.get_value('Item', arg["item_code"], 'is_customer_provided_item'):
+			if not self.get_item_rate_details(arg["item_code"]).is_customer_provided_item:
 				if arg.get('bom_no') and self.set_rate_of_sub_assembly_item_based_on_bom:
 					rate = flt(self.get_bom_unitcost(arg['bom_no'])) * (arg.get("conversion_factor") or 1)
 				else:
@@ -195,7 +203,7 @@ class BOM(WebsiteGenerator):
 						rate = self.get_valuation_rate(arg) * (arg.get("conversion_factor") or 1)
 					elif self.rm_cost_as_per == 'Last Purchase Rate':
 						rate = flt(arg.get('last_purchase_rate') \
-							or frappe.db.get_value("Item", arg['item_code'], "last_purchase_rate")) \
+							or self.get_item_rate_details(arg['item_code']).last_purchase_rate) \
 								* (arg.get("conversion_factor") or 1)
 					elif self.rm_cost_as_per == "Price List":
 						if not self.buying_price_list:
@@ -298,13 +306,27 @@ class BOM(WebsiteGenerator):
 				where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
 				(cost, cost, self.name))
 
+	def get_item_rate_details(self, item_code):
+		# preloaded by the BOM cost rollup for all the items of the BOMs it updates
+		if self.flags.cost_rollup and item_code in self.flags.cost_rollup.items:
+			return self.flags.cost_rollup.items[item_code]
+
+		return frappe.db.get_value("Item", item_code,
+			["is_customer_provided_item", "last_purchase_rate", "valuation_rate"], as_dict=1) or frappe._dict()
+
 	def get_bom_unitcost(self, bom_no):
+		# the cost rollup writes the costs at the end, so the unit costs of the BOMs it updated are read from it
+		if self.flags.cost_rollup and bom_no in self.flags.cost_rollup.unit_costs:
+			return self.flags.cost_rollup.unit_costs[bom_no]
+
 		bom = frappe.db.sql("""select name, base_total_cost/quantity as unit_cost from `tabBOM`
 			where is_active = 1 and name = %s""", bom_no, as_dict=1)
 		return bom and bom[0]['unit_cost'] or 0
 
 	def get_valuation_rate(self, args):
 		""" Get weighted average of valuation rate from all warehouses """
+		if self.flags.cost_rollup and args['item_code'] in self.flags.cost_rollup.valuation_rates:
+			return self.flags.cost_rollup.valuation_rates[args['item_code']]
 
 		total_qty, total_value, valuation_rate = 0.0, 0.0, 0.0
 		for d in frappe.db.sql("""select actual_qty, stock_value from `tabBin`
@@ -324,7 +346,7 @@ class BOM(WebsiteGenerator):
 			valuation_rate = flt(last_valuation_rate[0][0]) if last_valuation_rate else 0
 
 		if not valuation_rate:
-			valuation_rate = frappe.db.get_value("Item", args['item_code'], "valuation_rate")
+			valuation_rate = self.get_item_rate_details(args['item_code']).valuation_rate
 
 		return flt(valuation_rate)
 
@@ -419,22 +441,11 @@ class BOM(WebsiteGenerator):
 
 	def check_recursion(self, bom_list=[]):
 		""" Check whether recursion occurs in any bom"""
+		children = get_bom_graph().children
 		bom_list = self.traverse_tree()
-		bom_nos = frappe.get_all('BOM Item', fields=["bom_no"],
-			filters={'parent': ('in', bom_list), 'parenttype': 'BOM'})
-
-		raise_exception = False
-		if bom_nos and self.name in [d.bom_no for d in bom_nos]:
-			raise_exception = True
-
-		if not raise_exception:
-			bom_nos = frappe.get_all('BOM Item', fields=["parent"],
-				filters={'bom_no': self.name, 'parenttype': 'BOM'})
 
-			if self.name in [d.parent for d in bom_nos]:
-				raise_exception = True
-
-		if raise_exception:
+		# the BOM is in a recursion if it is a child of itself or of any BOM below it
+		if any(self.name in children.get(bom, []) for bom in bom_list):
 			frappe.throw(_("BOM recursion: {0} cannot be parent or child of {1}").format(self.name, self.name))
 
 	def update_cost_and_exploded_items(self, bom_list=[]):
@@ -447,13 +458,7 @@ class BOM(WebsiteGenerator):
 		return bom_list
 
 	def traverse_tree(self, bom_list=None):
-		def _get_children(bom_no):
-			children = frappe.cache().hget('bom_children', bom_no)
-			if children is None:
-				children = frappe.db.sql_list("""SELECT `bom_no` FROM `tabBOM Item`
-					WHERE `parent`=%s AND `bom_no`!='' AND `parenttype`='BOM'""", bom_no)
-				frappe.cache().hset('bom_children', bom_no, children)
-			return children
+		children = get_bom_graph().children
 
 		count = 0
 		if not bom_list:
@@ -463,7 +468,7 @@ class BOM(WebsiteGenerator):
 			bom_list.append(self.name)
 
 		while(count < len(bom_list)):
-			for child_bom in _get_children(bom_list[count]):
+			for child_bom in children.get(bom_list[count], []):
 				if child_bom not in bom_list:
 					bom_list.append(child_bom)
 			count += 1
@@ -781,32 +786,147 @@ def get_children(doctype, parent=None, is_root=False, **filters):
 
 		return bom_items
 
+def get_bom_graph():
+	"""
+		Returns the sub-assembly links between the BOMs, as seen by the current transaction.
+
+		`children` has the sub-assembly BOMs of every BOM,
+		`parents` has the submitted active BOMs using every BOM.
+	"""
+	if not frappe.flags.bom_graph:
+		frappe.flags.bom_graph = make_bom_graph(get_bom_graph_nodes())
+
+	return frappe.flags.bom_graph
+
+def get_bom_graph_nodes():
+	"""Returns the sub-assembly BOMs and the status of every BOM, the shared copy is kept
+		in a cache hash with a field per BOM, so that a changed BOM is updated on its own"""
+	if frappe.flags.bom_graph_nodes is None:
+		nodes = {frappe.safe_decode(bom): node
+			for bom, node in iteritems(frappe.cache().hgetall("bom_graph") or {})}
+
+		if not nodes:
+			nodes = load_bom_graph_nodes()
+
+			# a graph read after this transaction changed BOMs may hold uncommitted links
+			if nodes and not frappe.flags.bom_graph_changes:
+				frappe.cache().hmset(frappe.cache().make_key("bom_graph"),
+					{bom: pickle.dumps(node) for bom, node in iteritems(nodes)})
+
+		frappe.flags.bom_graph_nodes = nodes
+
+	return frappe.flags.bom_graph_nodes
+
+def load_bom_graph_nodes(boms=None):
+	nodes = {}
+	for d in frappe.db.sql("""select bom.name, bom.docstatus, bom.is_active, bom_item.bom_no
+		from `tabBOM` bom
+		left join `tabBOM Item` bom_item on bom_item.parent = bom.name and bom_item.parenttype = 'BOM'
+			and ifnull(bom_item.bom_no, '') != ''
+		{0}""".format("where bom.name in ({0})".format(", ".join(["%s"] * len(boms))) if boms else ""),
+		tuple(boms or []), as_dict=1):
+		node = nodes.setdefault(d.name, {"children": [], "active": d.docstatus == 1 and cint(d.is_active)})
+		if d.bom_no:
+			node["children"].append(d.bom_no)
+
+	return nodes
+
+def make_bom_graph(nodes):
+	graph = frappe._dict({"children": {}, "parents": {}, "active_boms": []})
+	for bom in sorted(nodes):
+		node = nodes[bom]
+		if node["active"]:
+			graph.active_boms.append(bom)
+
+		if node["children"]:
+			graph.children[bom] = node["children"]
+
+		for child_bom in node["children"]:
+			parents = graph.parents.setdefault(child_bom, [])
+			if node["active"] and bom not in parents:
+				parents.append(bom)
+
+	return graph
+
+def update_bom_graph(bom, deleted=False):
+	"""
+		Update the links of the changed BOM in the graph of this request at once, and in
+		the shared graph after the transaction is committed, from the committed BOM
+	"""
+	if not frappe.flags.bom_graph_changes:
+		frappe.flags.bom_graph_changes = []
+
+	if bom not in frappe.flags.bom_graph_changes:
+		frappe.flags.bom_graph_changes.append(bom)
+
+	if not any(d[0] == enqueue_shared_bom_graph_update for d in frappe.local.before_commit):
+		frappe.local.before_commit.append([enqueue_shared_bom_graph_update, None, None])
+
+	nodes = get_bom_graph_nodes()
+	nodes.pop(bom, None)
+	if not deleted:
+		nodes.update(load_bom_graph_nodes([bom]))
+	frappe.flags.bom_graph = None
+
+def enqueue_shared_bom_graph_update():
+	"""Called before commit, updates the shared graph with the BOMs changed by the transaction once it is committed"""
+	boms = frappe.flags.bom_graph_changes
+	if not boms:
+		return
+
+	frappe.flags.bom_graph_changes = None
+	frappe.enqueue(update_shared_bom_graph, queue="short", enqueue_after_commit=True, boms=boms)
+
+def update_shared_bom_graph(boms):
+	if not frappe.cache().hlen(frappe.cache().make_key("bom_graph")):
+		# nothing cached yet, load the whole graph now that the changes are committed
+		frappe.flags.bom_graph_changes = frappe.flags.bom_graph_nodes = None
+		get_bom_graph_nodes()
+		return
+
+	nodes = load_bom_graph_nodes(boms)
+	for bom in boms:
+		if bom in nodes:
+			frappe.cache().hset("bom_graph", bom, nodes[bom])
+		else:
+			frappe.cache().hdel("bom_graph", bom)
+
 def get_boms_in_bottom_up_order(bom_no=None):
-	def _get_parent(bom_no):
-		return frappe.db.sql_list("""
-			select distinct bom_item.parent from `tabBOM Item` bom_item
-			where bom_item.bom_no = %s and bom_item.docstatus=1 and bom_item.parenttype='BOM'
-				and exists(select bom.name from `tabBOM` bom where bom.name=bom_item.parent and bom.is_active=1)
-		""", bom_no)
+	"""Returns all the submitted active BOMs, or the BOM and the BOMs using it,
+		with every BOM after the sub-assembly BOMs it uses"""
+	parents = get_bom_graph().parents
 
-	count = 0
-	bom_list = []
 	if bom_no:
-		bom_list.append(bom_no)
+		bom_list, count = [bom_no], 0
+		while(count < len(bom_list)):
+			for parent_bom in parents.get(bom_list[count], []):
+				if parent_bom not in bom_list:
+					bom_list.append(parent_bom)
+			count += 1
 	else:
-		# get all leaf BOMs
-		bom_list = frappe.db.sql_list("""select name from `tabBOM` bom
-			where docstatus=1 and is_active=1
-				and not exists(select bom_no from `tabBOM Item`
-					where parent=bom.name and ifnull(bom_no, '')!='')""")
-
-	while(count < len(bom_list)):
-		for child_bom in _get_parent(bom_list[count]):
-			if child_bom not in bom_list:
-				bom_list.append(child_bom)
+		bom_list = get_bom_graph().active_boms
+
+	# topological sort, a BOM is ready when all of its sub-assembly BOMs are in the list
+	pending_children = dict.fromkeys(bom_list, 0)
+	for bom in bom_list:
+		for parent_bom in parents.get(bom, []):
+			if parent_bom in pending_children:
+				pending_children[parent_bom] += 1
+
+	ordered_boms = [bom for bom in bom_list if not pending_children[bom]]
+	count = 0
+	while(count < len(ordered_boms)):
+		for parent_bom in parents.get(ordered_boms[count], []):
+			if parent_bom in pending_children:
+				pending_children[parent_bom] -= 1
+				if not pending_children[parent_bom]:
+					ordered_boms.append(parent_bom)
 		count += 1
 
-	return bom_list
+	# BOMs in a recursion are never ready, they are updated last
+	ordered_boms.extend(bom for bom in bom_list if pending_children[bom])
+
+	return ordered_boms
 
 def add_additional_cost(stock_entry, work_order):
 	# Add non stock items cost in the additional cost
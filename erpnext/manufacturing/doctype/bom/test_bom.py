@@ -163,6 +163,30 @@ class TestBOM(unittest.TestCase):
 
 		self.assertEqual(bom.items[0].rate, rate)
 
+	def test_bom_graph_updated_after_commit(self):
+		from erpnext.manufacturing.doctype.bom.bom import get_bom_graph, update_shared_bom_graph
+
+		frappe.cache().delete_value("bom_graph")
+		frappe.flags.bom_graph = frappe.flags.bom_graph_nodes = frappe.flags.bom_graph_changes = None
+
+		bom = frappe.copy_doc(test_records[2])
+		bom.insert()
+		sub_assembly_boms = [d.bom_no for d in bom.items if d.bom_no]
+
+		# the uncommitted links are only seen by this transaction
+		self.assertEqual(get_bom_graph().children.get(bom.name), sub_assembly_boms)
+		self.assertFalse(frappe.cache().hget("bom_graph", bom.name))
+		self.assertTrue(bom.name in frappe.flags.bom_graph_changes)
+
+		update_shared_bom_graph([bom.name])
+		self.assertEqual(frappe.cache().hget("bom_graph", bom.name)["children"], sub_assembly_boms)
+
+		bom.delete()
+		self.assertFalse(bom.name in get_bom_graph().children)
+
+		update_shared_bom_graph([bom.name])
+		self.assertFalse(frappe.cache().hget("bom_graph", bom.name))
+
 def get_default_bom(item_code="_Test FG Item 2"):
 	return frappe.db.get_value("BOM", {"item": item_code, "is_active": 1, "is_default": 1})
 
@@ -4,13 +4,25 @@
 
 from __future__ import unicode_literals
 import frappe, json
-from frappe.utils import cstr, flt
+from frappe.utils import cstr, flt, now
 from frappe import _
 from six import string_types
-from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+from erpnext.manufacturing.doctype.bom.bom import update_bom_graph, get_bom_graph, get_boms_in_bottom_up_order
 from frappe.model.document import Document
 import click
 
+# number of rows written per UPDATE query by the cost rollup
+BOM_COST_UPDATE_BATCH_SIZE = 500
+
+# cost fields written by the cost rollup
+BOM_COST_FIELDS = {
+	"BOM": ["operating_cost", "base_operating_cost", "raw_material_cost", "base_raw_material_cost",
+		"scrap_material_cost", "base_scrap_material_cost", "total_cost", "base_total_cost"],
+	"BOM Item": ["rate", "amount", "base_rate", "base_amount", "qty_consumed_per_unit"],
+	"BOM Scrap Item": ["rate", "amount", "base_rate", "base_amount"],
+	"BOM Operation": ["hour_rate", "base_hour_rate", "operating_cost", "base_operating_cost"]
+}
+
 class BOMUpdateTool(Document):
 	def replace_bom(self):
 		self.validate_bom()
@@ -18,8 +30,9 @@ class BOMUpdateTool(Document):
 		unit_cost = get_new_bom_unit_cost(self.new_bom)
 		self.update_new_bom(unit_cost)
 
-		frappe.cache().delete_key('bom_children')
 		bom_list = self.get_parent_boms(self.new_bom)
+		for bom in bom_list:
+			update_bom_graph(bom)
 
 		with click.progressbar(bom_list) as bom_list:
 			pass
@@ -87,7 +100,7 @@ def enqueue_update_cost():
 
 def update_latest_price_in_all_boms():
 	if frappe.db.get_single_value("Manufacturing Settings", "update_bom_costs_automatically"):
-		update_cost()
+		update_cost(only_changed=True)
 
 def replace_bom(args):
 	args = frappe._dict(args)
@@ -97,10 +110,133 @@ def replace_bom(args):
 	doc.new_bom = args.new_bom
 	doc.replace_bom()
 
-def update_cost():
+def update_cost(only_changed=False):
+	"""
+		Update the costs of the submitted active BOMs, sub-assembly BOMs first.
+
+		With `only_changed`, only the BOMs using items whose rates may have changed
+		since the last run, and the BOMs above them, are updated.
+	"""
 	frappe.db.auto_commit_on_many_writes = 1
-	bom_list = get_boms_in_bottom_up_order()
-	for bom in bom_list:
-		frappe.get_doc("BOM", bom).update_cost(update_parent=False, from_child_bom=True)
+	started_at = now()
+
+	updated_upto = only_changed and frappe.db.get_global("bom_costs_updated_upto")
+	bom_list = get_boms_to_update(updated_upto) if updated_upto else get_boms_in_bottom_up_order()
 
-	frappe.db.auto_commit_on_many_writes = 0
\ No newline at end of file
+	rollup = get_cost_rollup(bom_list)
+	for bom in bom_list:
+		bom_obj = frappe.get_doc("BOM", bom)
+		bom_obj.flags.cost_rollup = rollup
+		bom_obj.update_cost(update_parent=False, from_child_bom=True, save=False)
+
+		rollup.unit_costs[bom] = flt(bom_obj.base_total_cost) / flt(bom_obj.quantity or 1)
+		add_cost_rows(rollup, bom_obj)
+
+	write_cost_rows(rollup)
+	frappe.db.set_global("bom_costs_updated_upto", started_at)
+
+	frappe.db.auto_commit_on_many_writes = 0
+
+def get_boms_to_update(updated_upto):
+	"""Returns the BOMs using the items whose stock value, valuation rate, last purchase rate
+		or prices changed after the given time, the BOMs changed after it and all the BOMs above them"""
+	changed_items = """
+		select item_code from `tabBin` where modified > %(updated_upto)s
+		union select name from `tabItem` where modified > %(updated_upto)s
+		union select item_code from `tabItem Price` where modified > %(updated_upto)s
+		union select item_code from `tabPurchase Order Item` where modified > %(updated_upto)s
+		union select item_code from `tabPurchase Receipt Item` where modified > %(updated_upto)s
+		union select item_code from `tabPurchase Invoice Item` where modified > %(updated_upto)s"""
+
+	changed_boms = set(frappe.db.sql_list("""
+		select bom_item.parent from `tabBOM Item` bom_item
+		where bom_item.docstatus = 1 and bom_item.parenttype = 'BOM' and bom_item.item_code in ({0})
+		union select scrap_item.parent from `tabBOM Scrap Item` scrap_item
+		where scrap_item.docstatus = 1 and scrap_item.parenttype = 'BOM' and scrap_item.item_code in ({0})
+		union select name from `tabBOM` where docstatus = 1 and modified > %(updated_upto)s
+	""".format(changed_items), {"updated_upto": updated_upto}))
+
+	# the BOMs above use the costs and the exploded items of the changed BOMs
+	parents = get_bom_graph().parents
+	bom_list = list(changed_boms)
+	for bom in bom_list:
+		for parent_bom in parents.get(bom, []):
+			if parent_bom not in changed_boms:
+				changed_boms.add(parent_bom)
+				bom_list.append(parent_bom)
+
+	return [bom for bom in get_boms_in_bottom_up_order() if bom in changed_boms]
+
+def get_cost_rollup(bom_list):
+	"""Preload the item details and valuation rates used for the raw material rates of the BOMs"""
+	rollup = frappe._dict({
+		"items": {},
+		"valuation_rates": {},
+		"unit_costs": {},
+		"rows": {doctype: [] for doctype in BOM_COST_FIELDS}
+	})
+
+	for start in range(0, len(bom_list), BOM_COST_UPDATE_BATCH_SIZE):
+		boms = tuple(bom_list[start:start + BOM_COST_UPDATE_BATCH_SIZE])
+
+		for d in frappe.db.sql("""
+			select item.name, item.is_customer_provided_item, item.last_purchase_rate, item.valuation_rate,
+				ifnull(sum(bin.actual_qty), 0) as actual_qty, ifnull(sum(bin.stock_value), 0) as stock_value
+			from `tabItem` item left join `tabBin` bin on bin.item_code = item.name
+			where item.name in (
+				select item_code from `tabBOM Item` where parent in %(boms)s and parenttype = 'BOM'
+				union select item_code from `tabBOM Scrap Item` where parent in %(boms)s and parenttype = 'BOM')
+			group by item.name""", {"boms": boms}, as_dict=1):
+			if d.name in rollup.items:
+				continue
+
+			rollup.items[d.name] = frappe._dict({
+				"is_customer_provided_item": d.is_customer_provided_item,
+				"last_purchase_rate": d.last_purchase_rate,
+				"valuation_rate": d.valuation_rate
+			})
+
+			# same weighted average as BOM.get_valuation_rate
+			valuation_rate = flt(d.stock_value) / flt(d.actual_qty) if flt(d.actual_qty) else 0.0
+			if valuation_rate <= 0:
+				last_valuation_rate = frappe.db.sql("""select valuation_rate
+					from `tabStock Ledger Entry`
+					where item_code = %s and valuation_rate > 0
+					order by posting_date desc, posting_time desc, creation desc limit 1""", d.name)
+
+				valuation_rate = flt(last_valuation_rate[0][0]) if last_valuation_rate else 0
+
+			rollup.valuation_rates[d.name] = flt(valuation_rate or d.valuation_rate)
+
+	return rollup
+
+def add_cost_rows(rollup, bom_obj):
+	rollup.rows["BOM"].append(bom_obj)
+	rollup.rows["BOM Item"].extend(bom_obj.get("items"))
+	rollup.rows["BOM Scrap Item"].extend(bom_obj.get("scrap_items"))
+	rollup.rows["BOM Operation"].extend(bom_obj.get("operations"))
+
+	if len(rollup.rows["BOM"]) >= BOM_COST_UPDATE_BATCH_SIZE:
+		write_cost_rows(rollup)
+
+def write_cost_rows(rollup):
+	"""Write the cost fields of the updated BOMs and their rows, a batch of rows per query"""
+	for doctype, fields in BOM_COST_FIELDS.items():
+		rows = rollup.rows[doctype]
+		for start in range(0, len(rows), BOM_COST_UPDATE_BATCH_SIZE):
+			batch = rows[start:start + BOM_COST_UPDATE_BATCH_SIZE]
+
+			values = []
+			for d in batch:
+				values.append(d.name)
+				values.extend([flt(d.get(fieldname)) for fieldname in fields])
+
+			row_query = "select %s as name, {0}".format(", ".join("%s as `{0}`".format(fieldname)
+				for fieldname in fields))
+
+			frappe.db.sql("""update `tab{0}` t, ({1}) costs set {2} where t.name = costs.name""".format(
+				doctype, " union all ".join([row_query] * len(batch)),
+				", ".join("t.`{0}` = costs.`{0}`".format(fieldname) for fieldname in fields)),
+				tuple(values))
+
+		rollup.rows[doctype] = []
@@ -7,6 +7,7 @@ import unittest
 import frappe
 from erpnext.stock.doctype.item.test_item import create_item
 from erpnext.manufacturing.doctype.production_plan.test_production_plan import make_bom
+from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
 from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import update_cost
 
 test_records = frappe.get_test_records('BOM')
@@ -58,3 +59,36 @@ class TestBOMUpdateTool(unittest.TestCase):
 
 		doc.load_from_db()
 		self.assertEquals(doc.total_cost, 200)
+
+	def test_bom_cost_rollup_of_changed_items(self):
+		for item in ["BOM Rollup Test Item 1", "BOM Rollup Test Item 2", "BOM Rollup Test Item 3"]:
+			create_item(item, valuation_rate=100)
+			frappe.db.set_value("Item", item, "valuation_rate", 100)
+
+		sub_assembly_bom = frappe.db.get_value("BOM", {"item": "BOM Rollup Test Item 2", "docstatus": 1})
+		if not sub_assembly_bom:
+			sub_assembly_bom = make_bom(item="BOM Rollup Test Item 2",
+				raw_materials=["BOM Rollup Test Item 3"], currency="INR").name
+
+		# the sub-assembly BOM is picked from the default BOM of the item
+		bom = frappe.db.get_value("BOM", {"item": "BOM Rollup Test Item 1", "docstatus": 1})
+		if not bom:
+			bom = make_bom(item="BOM Rollup Test Item 1",
+				raw_materials=["BOM Rollup Test Item 2"], currency="INR").name
+
+		bom_list = get_boms_in_bottom_up_order()
+		self.assertTrue(bom_list.index(sub_assembly_bom) < bom_list.index(bom))
+		self.assertEqual(get_boms_in_bottom_up_order(sub_assembly_bom), [sub_assembly_bom, bom])
+
+		update_cost(only_changed=True)
+		frappe.db.set_value("Item", "BOM Rollup Test Item 3", "valuation_rate", 200)
+		update_cost(only_changed=True)
+
+		self.assertEqual(frappe.db.get_value("BOM", sub_assembly_bom, "total_cost"), 200)
+		self.assertEqual(frappe.db.get_value("BOM Explosion Item",
+			{"parent": bom, "item_code": "BOM Rollup Test Item 3"}, "rate"), 200)
+
+		frappe.db.set_value("Item", "BOM Rollup Test Item 3", "valuation_rate", 100)
+		update_cost(only_changed=True)
+
+		self.assertEqual(frappe.db.get_value("BOM", sub_assembly_bom, "total_cost"), 100)
@@ -15,6 +15,9 @@ from erpnext.manufacturing.doctype.work_order.work_order import get_item_details
 from erpnext.setup.doctype.item_group.item_group import get_item_group_defaults
 from erpnext.stock.doctype.item.item import get_uom_conv_factor
 
+# number of BOMs or items read per query while exploding the BOMs for material requests
+MRP_EXPLOSION_BATCH_SIZE = 500
+
 class ProductionPlan(Document):
 	def validate(self):
 		self.calculate_total_planned_qty()
@@ -385,6 +388,7 @@ class ProductionPlan(Document):
 		'''Create Material Requests grouped by Sales Order and Material Request Type'''
 		material_request_list = []
 		material_request_map = {}
+		sales_order_projects = {}
 
 		for item in self.mr_items:
 			item_doc = frappe.get_cached_doc('Item', item.item_code)
@@ -395,17 +399,19 @@ class ProductionPlan(Document):
 			key = '{}:{}:{}'.format(item.sales_order, material_request_type, item_doc.customer or '')
 			schedule_date = add_days(nowdate(), cint(item_doc.lead_time_days))
 
-			# make a new MR
-			material_request_map[key] = frappe.new_doc("Material Request")
+			if key not in material_request_map:
+				# make a new MR
+				material_request_map[key] = frappe.new_doc("Material Request")
+				material_request_map[key].update({
+					"transaction_date" : nowdate(),
+					"status": "Draft",
+					"company": self.company,
+					"requested_by": frappe.session.user,
+					"material_request_type": material_request_type,
+					"customer": item_doc.customer or ''
+				})
+
 			material_request_doc = material_request_map[key]
-			material_request_doc.update({
-				"transaction_date" : nowdate(),
-				"status": "Draft",
-				"company": self.company,
-				"requested_by": frappe.session.user,
-				"material_request_type": material_request_type,
-				"customer": item_doc.customer or ''
-			})
 
 			if item_doc.min_order_qty and item.quantity < item_doc.min_order_qty:
 				frappe.msgprint(_("Order Quantity is set to <b>{0}</b> as Minimum Order Qty for Item <b>{1}</b> is <b>{2}</b>").format(item_doc.min_order_qty, item_doc.item_code, item_doc.min_order_qty))
@@ -415,6 +421,9 @@ class ProductionPlan(Document):
 			if conversion_factor:
 				item.quantity = item.quantity * conversion_factor
 
+			if item.sales_order and item.sales_order not in sales_order_projects:
+				sales_order_projects[item.sales_order] = frappe.db.get_value("Sales Order", item.sales_order, "project")
+
 			# add item
 			material_request_doc.append("items", {
 				"item_code": item.item_code,
@@ -426,10 +435,11 @@ class ProductionPlan(Document):
 				'production_plan': self.name,
 				'material_request_plan_item': item.name,
 				'production_plan_item': item.name,
-				"project": frappe.db.get_value("Sales Order", item.sales_order, "project") \
-					if item.sales_order else None
+				"project": sales_order_projects.get(item.sales_order)
 			})
 
+		# each MR is saved once, with all of its items
+		for material_request_doc in material_request_map.values():
 			material_request_doc.run_method("set_missing_values")
 			material_request_doc.flags.ignore_permissions = 1
 			material_request_list.append(material_request_doc)
@@ -469,104 +479,81 @@ def download_raw_materials(production_plan):
 
 	build_csv_response(item_list, doc.name)
 
-def get_exploded_items(item_details, company, bom_no, include_non_stock_items, planned_qty=1, sales_order=None):
-	for d in frappe.db.sql("""select bei.item_code, item.default_bom as bom,
-			ifnull(sum(bei.stock_qty/ifnull(bom.quantity, 1)), 0)*%s as qty, item.item_name,
-			bei.description, bei.stock_uom, item.min_order_qty, bei.source_warehouse,
-			item.default_material_request_type, item.min_order_qty, item_default.default_warehouse,
-			item.purchase_uom, item_uom.conversion_factor
-		from
-			`tabBOM Explosion Item` bei
-			JOIN `tabBOM` bom ON bom.name = bei.parent
-			JOIN `tabItem` item ON item.name = bei.item_code
-			LEFT JOIN `tabItem Default` item_default
-				ON item_default.parent = item.name and item_default.company=%s
-			LEFT JOIN `tabUOM Conversion Detail` item_uom
-				ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
-		where
-			bei.docstatus < 2
-			and bom.name=%s and item.is_stock_item in (1, {0})
-		group by bei.item_code, bei.stock_uom""".format(0 if include_non_stock_items else 1),
-		(planned_qty, company, bom_no), as_dict=1):
-		d['sales_order'] = sales_order
-		item_details.setdefault(d.get('item_code'), d)
-	return item_details
+def explode_boms(explosions, company, item_details):
+	"""
+		Add the required qty of the raw materials of the BOMs to the item details.
 
-def get_exploded_items_with_subassembly(item_details, company, bom_no, include_non_stock_items, planned_qty=1, sales_order=None):
-	explosion_items = get_items_for_explode_and_subassembly("BOM Explosion Item", company, bom_no, include_non_stock_items, planned_qty)
-	bom_items = get_items_for_explode_and_subassembly("BOM Item", company, bom_no, include_non_stock_items, planned_qty)
+		`explosions` has the explosion settings as key, a tuple of the sales order, the BOM tables
+		to read, include non stock items, include subcontracted items and explode sub-assemblies,
+		and the planned qty of every BOM as value. The BOMs of a level of the explosion
+		are read together, the sub-assemblies found make the next level.
+	"""
+	while explosions:
+		next_explosions = {}
+		boms = list(set(bom_no for planned_boms in explosions.values() for bom_no in planned_boms))
+		bom_items = {table: get_bom_items_per_unit(table, boms, company)
+			for table in set(table for key in explosions for table in key[1])}
 
-	for d in explosion_items + bom_items:
-		item_details['sales_order'] = sales_order
-		item_details.setdefault(d.get('item_code'), d)
-	return item_details
+		for key, planned_boms in iteritems(explosions):
+			sales_order, tables, include_non_stock_items, include_subcontracted_items, explode = key
 
-def get_items_for_explode_and_subassembly(item, company, bom_no, include_non_stock_items, planned_qty=1):
-	items = frappe.db.sql("""select bei.item_code, item.default_bom as bom,
-			ifnull(sum(bei.stock_qty/ifnull(bom.quantity, 1)), 0)*%s as qty, item.item_name,
-			bei.description, bei.stock_uom, item.min_order_qty, bei.source_warehouse,
-			item.default_material_request_type, item.min_order_qty, item_default.default_warehouse,
-			item.purchase_uom, item_uom.conversion_factor
-		from
-			`tab{0}` bei
-			JOIN `tabBOM` bom ON bom.name = bei.parent
-			JOIN `tabItem` item ON item.name = bei.item_code
-			LEFT JOIN `tabItem Default` item_default
-				ON item_default.parent = item.name and item_default.company=%s
-			LEFT JOIN `tabUOM Conversion Detail` item_uom
-				ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
-		where
-			bei.docstatus < 2
-			and bom.name=%s and item.is_stock_item in (1, {1})
-		group by bei.item_code, bei.stock_uom""".format(item, 0 if include_non_stock_items else 1),
-		(planned_qty, company, bom_no), as_dict=1)
-	return items
-
-def get_subitems(doc, data, item_details, bom_no, company, include_non_stock_items,
-	include_subcontracted_items, parent_qty, planned_qty=1, sales_order=None):
-	items = frappe.db.sql("""
-		SELECT
-			bom_item.item_code, default_material_request_type, item.item_name,
-			ifnull(%(parent_qty)s * sum(bom_item.stock_qty/ifnull(bom.quantity, 1)) * %(planned_qty)s, 0) as qty,
-			item.is_sub_contracted_item as is_sub_contracted, bom_item.source_warehouse,
-			item.default_bom as default_bom, bom_item.description as description,
-			bom_item.stock_uom as stock_uom, item.min_order_qty as min_order_qty,
-			item_default.default_warehouse, item.purchase_uom, item_uom.conversion_factor
-		FROM
-			`tabBOM Item` bom_item
-			JOIN `tabBOM` bom ON bom.name = bom_item.parent
-			JOIN tabItem item ON bom_item.item_code = item.name
-			LEFT JOIN `tabItem Default` item_default
-				ON item.name = item_default.parent and item_default.company = %(company)s
-			LEFT JOIN `tabUOM Conversion Detail` item_uom
-				ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
-		where
-			bom.name = %(bom)s
-			and bom_item.docstatus < 2
-			and item.is_stock_item in (1, {0})
-		group by bom_item.item_code""".format(0 if include_non_stock_items else 1),{
-			'bom': bom_no,
-			'parent_qty': parent_qty,
-			'planned_qty': planned_qty,
-			'company': company
-		}, as_dict=1)
+			for bom_no, planned_qty in iteritems(planned_boms):
+				bom_item_details = {}
+				for table in tables:
+					for d in bom_items[table].get(bom_no, []):
+						if d.is_stock_item or include_non_stock_items:
+							bom_item_details.setdefault(d.item_code, d)
+
+				for d in bom_item_details.values():
+					qty = flt(d.qty) * flt(planned_qty)
+
+					if not explode or not d.default_bom:
+						add_item_requirement(item_details, d, qty, sales_order)
+
+					elif ((d.default_material_request_type in ["Manufacture", "Purchase"] and
+						not d.is_sub_contracted) or (d.is_sub_contracted and include_subcontracted_items)):
+						if qty > 0:
+							sub_assembly_boms = next_explosions.setdefault(key, {})
+							sub_assembly_boms[d.default_bom] = sub_assembly_boms.get(d.default_bom, 0) + qty
+
+		explosions = next_explosions
 
-	for d in items:
-		if not data.get('include_exploded_items') or not d.default_bom:
-			if d.item_code in item_details:
-				item_details[d.item_code].qty = item_details[d.item_code].qty + d.qty
-			else:
-				item_details[d.item_code] = d
-
-		if data.get('include_exploded_items') and d.default_bom:
-			if ((d.default_material_request_type in ["Manufacture", "Purchase"] and
-				not d.is_sub_contracted) or (d.is_sub_contracted and include_subcontracted_items)):
-				if d.qty > 0:
-					get_subitems(doc, data, item_details, d.default_bom, company,
-						include_non_stock_items, include_subcontracted_items, d.qty)
-		item_details['sales_order'] = sales_order
 	return item_details
 
+def get_bom_items_per_unit(table, boms, company):
+	"""Returns the items of the BOMs from the given BOM table (`BOM Item` or `BOM Explosion Item`)
+		with their stock qty for one unit of the BOM, keyed by BOM"""
+	bom_items = {}
+	for start in range(0, len(boms), MRP_EXPLOSION_BATCH_SIZE):
+		for d in frappe.db.sql("""select bei.parent as bom_no, bei.item_code, item.default_bom,
+				ifnull(sum(bei.stock_qty/ifnull(bom.quantity, 1)), 0) as qty, item.item_name,
+				item.is_stock_item, item.is_sub_contracted_item as is_sub_contracted,
+				bei.description, bei.stock_uom, item.min_order_qty, bei.source_warehouse,
+				item.default_material_request_type, item_default.default_warehouse,
+				item.purchase_uom, item_uom.conversion_factor
+			from
+				`tab{0}` bei
+				JOIN `tabBOM` bom ON bom.name = bei.parent
+				JOIN `tabItem` item ON item.name = bei.item_code
+				LEFT JOIN `tabItem Default` item_default
+					ON item_default.parent = item.name and item_default.company=%s
+				LEFT JOIN `tabUOM Conversion Detail` item_uom
+					ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
+			where
+				bei.docstatus < 2
+				and bom.name in %s
+			group by bei.parent, bei.item_code, bei.stock_uom""".format(table),
+			(company, tuple(boms[start:start + MRP_EXPLOSION_BATCH_SIZE])), as_dict=1):
+			bom_items.setdefault(d.bom_no, []).append(d)
+
+	return bom_items
+
+def add_item_requirement(item_details, row, qty, sales_order=None):
+	if row.item_code in item_details:
+		item_details[row.item_code].qty += qty
+	else:
+		item_details[row.item_code] = frappe._dict(row, qty=qty, sales_order=sales_order)
+
 def get_material_request_items(row, sales_order,
 	company, ignore_existing_ordered_qty, warehouse, bin_dict):
 	total_qty = row['qty']
@@ -672,6 +659,38 @@ def get_bin_details(row, company, for_warehouse=None, all_warehouse=False):
 		group by item_code, warehouse
 	""".format(conditions=conditions), { "item_code": row['item_code'] }, as_dict=1)
 
+def get_bin_details_for_items(items, company, for_warehouse=None):
+	"""Returns the bin details, as per `get_bin_details`, of every item in the warehouse it is planned for,
+		keyed by item code and warehouse. The bins of all the items planned for a warehouse are read together."""
+	items_by_warehouse = {}
+	for d in items:
+		warehouse = for_warehouse or d.get('source_warehouse') or d.get('default_warehouse')
+		items_by_warehouse.setdefault(warehouse, set()).add(d.item_code)
+
+	bin_details = {}
+	for warehouse, item_codes in iteritems(items_by_warehouse):
+		conditions = "company = %(company)s"
+		values = frappe._dict({"company": company})
+		if warehouse:
+			values.lft, values.rgt = frappe.db.get_value("Warehouse", warehouse, ["lft", "rgt"])
+			conditions += " and lft >= %(lft)s and rgt <= %(rgt)s"
+
+		item_codes = list(item_codes)
+		for start in range(0, len(item_codes), MRP_EXPLOSION_BATCH_SIZE):
+			values["item_codes"] = tuple(item_codes[start:start + MRP_EXPLOSION_BATCH_SIZE])
+
+			# the first warehouse of the item, like get_bin_details
+			for d in frappe.db.sql(""" select item_code, ifnull(sum(projected_qty),0) as projected_qty,
+				ifnull(sum(actual_qty),0) as actual_qty, warehouse from `tabBin`
+				where item_code in %(item_codes)s
+					and warehouse in (select name from `tabWarehouse` where {conditions})
+				group by item_code, warehouse
+				order by item_code, warehouse
+			""".format(conditions=conditions), values, as_dict=1):
+				bin_details.setdefault((d.item_code, warehouse), d)
+
+	return bin_details
+
 @frappe.whitelist()
 def get_items_for_material_requests(doc, ignore_existing_ordered_qty=None):
 	if isinstance(doc, string_types):
@@ -685,12 +704,13 @@ def get_items_for_material_requests(doc, ignore_existing_ordered_qty=None):
 	if not ignore_existing_ordered_qty:
 		ignore_existing_ordered_qty = doc.get('ignore_existing_ordered_qty')
 
-	so_item_details = frappe._dict()
+	# the BOMs of all the rows are exploded together, grouped by their explosion settings
+	explosions = {}
+	item_details = {}
 	for data in po_items:
 		planned_qty = data.get('required_qty') or data.get('planned_qty')
 		ignore_existing_ordered_qty = data.get('ignore_existing_ordered_qty') or ignore_existing_ordered_qty
 
-		item_details = {}
 		if data.get("bom") or data.get("bom_no"):
 			if data.get('required_qty'):
 				bom_no = data.get('bom')
@@ -705,17 +725,21 @@ def get_items_for_material_requests(doc, ignore_existing_ordered_qty=None):
 				frappe.throw(_("For row {0}: Enter Planned Qty").format(data.get('idx')))
 
 			if bom_no:
+				explode = 0
 				if data.get('include_exploded_items') and include_subcontracted_items and not doc.get("include_sub_assembly_with_exploded_item"):
 					# fetch exploded items from BOM
-					item_details = get_exploded_items(item_details,
-						company, bom_no, include_non_stock_items, planned_qty=planned_qty, sales_order=data.get("sales_order"))
+					tables = ("BOM Explosion Item",)
 				elif data.get('include_exploded_items') and include_subcontracted_items and doc.get("include_sub_assembly_with_exploded_item"):
 					# fetch exploded items with sub assembly item from BOM
-					item_details = get_exploded_items_with_subassembly(item_details,
-						company, bom_no, include_non_stock_items, planned_qty=planned_qty, sales_order=data.get("sales_order"))
+					tables = ("BOM Explosion Item", "BOM Item")
 				else:
-					item_details = get_subitems(doc, data, item_details, bom_no, company,
-						include_non_stock_items, include_subcontracted_items, 1, planned_qty=planned_qty, sales_order=data.get("sales_order"))
+					tables = ("BOM Item",)
+					explode = cint(data.get('include_exploded_items'))
+
+				key = (data.get("sales_order"), tables, cint(include_non_stock_items),
+					cint(include_subcontracted_items), explode)
+				planned_boms = explosions.setdefault(key, {})
+				planned_boms[bom_no] = planned_boms.get(bom_no, 0) + flt(planned_qty)
 		elif data.get('item_code'):
 			item_master = frappe.get_doc('Item', data['item_code']).as_dict()
 			purchase_uom = item_master.purchase_uom or item_master.stock_uom
@@ -724,7 +748,7 @@ def get_items_for_material_requests(doc, ignore_existing_ordered_qty=None):
 				if d.uom == purchase_uom:
 					conversion_factor = d.conversion_factor
 
-			item_details[item_master.name] = frappe._dict(
+			add_item_requirement(item_details, frappe._dict(
 				{
 					'item_name' : item_master.item_name,
 					'default_bom' : doc.bom,
@@ -732,37 +756,29 @@ def get_items_for_material_requests(doc, ignore_existing_ordered_qty=None):
 					'default_warehouse': item_master.default_warehouse,
 					'min_order_qty' : item_master.min_order_qty,
 					'default_material_request_type' : item_master.default_material_request_type,
-					'qty': planned_qty or 1,
 					'is_sub_contracted' : item_master.is_subcontracted_item,
 					'item_code' : item_master.name,
 					'description' : item_master.description,
 					'stock_uom' : item_master.stock_uom,
-					'conversion_factor' : conversion_factor,
-					'sales_order': data.get("sales_order")
+					'conversion_factor' : conversion_factor
 				}
-			)
+			), flt(planned_qty or 1), data.get("sales_order"))
 
-		sales_order = doc.get("sales_order")
+	explode_boms(explosions, company, item_details)
 
-		for item_code, details in iteritems(item_details):
-			so_item_details.setdefault(sales_order, frappe._dict())
-			if item_code in so_item_details.get(sales_order, {}):
-				so_item_details[sales_order][item_code]['qty'] = so_item_details[sales_order][item_code].get("qty", 0) + flt(details.qty)
-			else:
-				so_item_details[sales_order][item_code] = details
+	items = [d for d in item_details.values() if d.qty > 0]
+	bin_details = get_bin_details_for_items(items, company, warehouse)
 
 	mr_items = []
-	for sales_order, item_code in iteritems(so_item_details):
-		item_dict = so_item_details[sales_order]
-		for details in item_dict.values():
-			bin_dict = get_bin_details(details, doc.company, warehouse)
-			bin_dict = bin_dict[0] if bin_dict else {}
-
-			if details.qty > 0:
-				items = get_material_request_items(details, sales_order, company,
-					ignore_existing_ordered_qty, warehouse, bin_dict)
-				if items:
-					mr_items.append(items)
+	sales_order = doc.get("sales_order")
+	for details in items:
+		bin_dict = bin_details.get((details.item_code,
+			warehouse or details.get('source_warehouse') or details.get('default_warehouse'))) or {}
+
+		mr_item = get_material_request_items(details, sales_order, company,
+			ignore_existing_ordered_qty, warehouse, bin_dict)
+		if mr_item:
+			mr_items.append(mr_item)
 
 	if not mr_items:
 		frappe.msgprint(_("""As raw materials projected quantity is more than required quantity, there is no need to create material request.
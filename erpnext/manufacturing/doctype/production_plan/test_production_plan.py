@@ -98,6 +98,25 @@ class TestProductionPlan(unittest.TestCase):
 		sr2.cancel()
 		pln.cancel()
 
+	def test_material_request_items_for_multi_level_bom(self):
+		pln = create_production_plan(item_code='Test Production Item 1', planned_qty=2, do_not_save=1)
+		pln.po_items[0].include_exploded_items = 1
+
+		# the sub-assembly is also planned on its own, its BOM is exploded once for both the rows
+		pln.append('po_items', {
+			'include_exploded_items': 1,
+			'item_code': 'Subassembly Item 1',
+			'bom_no': frappe.db.get_value('Item', 'Subassembly Item 1', 'default_bom'),
+			'planned_qty': 3,
+			'planned_start_date': now_datetime()
+		})
+
+		mr_items = {d['item_code']: d['quantity'] for d in get_items_for_material_requests(pln.as_dict())}
+		self.assertEqual(mr_items.get('Raw Material Item 1'), 7)
+		self.assertEqual(mr_items.get('Raw Material Item 2'), 5)
+		self.assertEqual(mr_items.get('Test Non Stock Raw Material'), 2)
+		self.assertFalse('Subassembly Item 1' in mr_items)
+
 	def test_production_plan_sales_orders(self):
 		item = 'Test Production Item 1'
 		so = make_sales_order(item_code=item, qty=5)
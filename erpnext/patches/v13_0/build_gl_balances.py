@@ -0,0 +1,7 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.gl_balance.gl_balance import rebuild_gl_balances
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "gl_balance")
+	rebuild_gl_balances()
@@ -0,0 +1,9 @@
+from __future__ import unicode_literals
+import frappe
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "subscription")
+
+	# every open subscription is processed on the next run, which sets its actual next action date
+	frappe.db.sql("""update `tabSubscription` set next_action_date = curdate()
+		where status not in ('Cancelled', 'Completed')""")
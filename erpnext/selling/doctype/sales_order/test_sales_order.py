@@ -889,6 +889,29 @@ class TestSalesOrder(unittest.TestCase):
 		mr_doc = frappe.get_doc('Material Request',mr.get('name'))
 		self.assertEqual(mr_doc.items[0].sales_order, so.name)
 
+	def test_item_details_of_all_rows_read_together(self):
+		import erpnext.stock.get_item_details as get_item_details
+
+		item_list = [{"item_code": item_code, "warehouse": "_Test Warehouse - _TC", "qty": 1, "rate": 100}
+			for item_code in ["_Test Item", "_Test Item 2", "_Test Item"] * 10]
+		so = make_sales_order(item_list=item_list, do_not_save=True)
+
+		prefetched = []
+		prefetch_item_details = get_item_details.prefetch_item_details
+		def _prefetch_item_details(args_list):
+			prefetched.append(len(args_list))
+			return prefetch_item_details(args_list)
+
+		get_item_details.prefetch_item_details = _prefetch_item_details
+		try:
+			so.set_missing_item_details()
+		finally:
+			get_item_details.prefetch_item_details = prefetch_item_details
+
+		self.assertEqual(prefetched, [30])
+		for d in so.items:
+			self.assertEqual(d.stock_uom, frappe.db.get_value("Item", d.item_code, "stock_uom"))
+
 def make_sales_order(**args):
 	so = frappe.new_doc("Sales Order")
 	args = frappe._dict(args)
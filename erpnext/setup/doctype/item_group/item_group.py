@@ -12,6 +12,7 @@ from frappe.website.render import clear_cache
 from frappe.website.doctype.website_slideshow.website_slideshow import get_slideshow
 from erpnext.shopping_cart.product_info import set_product_info_for_website
 from erpnext.utilities.product import get_qty_in_stock
+from erpnext.utilities.tree_closure import get_descendants
 from six.moves.urllib.parse import quote
 
 class ItemGroup(NestedSet, WebsiteGenerator):
@@ -174,13 +175,7 @@ def get_child_groups(item_group_name):
 			and show_in_website = 1""", {"lft": item_group.lft, "rgt": item_group.rgt})
 
 def get_child_item_groups(item_group_name):
-	item_group = frappe.get_cached_value("Item Group",
-		item_group_name, ["lft", "rgt"], as_dict=1)
-
-	child_item_groups = [d.name for d in frappe.get_all('Item Group',
-		filters= {'lft': ('>=', item_group.lft),'rgt': ('<=', item_group.rgt)})]
-
-	return child_item_groups or {}
+	return get_descendants("Item Group", item_group_name) or {}
 
 def get_item_for_list_in_html(context):
 	# add missing absolute link in files
@@ -100,6 +100,49 @@ class TestItem(unittest.TestCase):
 
 		self.move_it_back()
 
+	def test_item_group_descendants_cache(self):
+		from erpnext.bloombrackets.coupon_commands.utils import flat_item_group_tree_list
+
+		self.assertEqual(sorted(flat_item_group_tree_list("_Test Item Group C")),
+			["_Test Item Group C", "_Test Item Group C - 1", "_Test Item Group C - 2"])
+
+		# moving a group under C invalidates the cached descendants
+		group_b = frappe.get_doc("Item Group", "_Test Item Group B")
+		group_b.parent_item_group = "_Test Item Group C"
+		group_b.save()
+
+		self.assertTrue("_Test Item Group B - 1" in flat_item_group_tree_list("_Test Item Group C"))
+
+		self.move_it_back()
+		self.assertFalse("_Test Item Group B - 1" in flat_item_group_tree_list("_Test Item Group C"))
+
+	def test_tree_closure(self):
+		from erpnext.utilities.tree_closure import get_ancestors, get_descendants, bump_tree_version
+
+		self.assertEqual(get_ancestors("Item Group", "_Test Item Group B - 3"),
+			["_Test Item Group B - 3", "_Test Item Group B", "All Item Groups"])
+		self.assertEqual(get_ancestors("Item Group", "_test item group b - 3"),
+			get_ancestors("Item Group", "_Test Item Group B - 3"))
+
+		# deleting a node rebuilds the closure of the transaction
+		frappe.delete_doc("Item Group", "_Test Item Group B - 3")
+		self.assertFalse("_Test Item Group B - 3" in get_descendants("Item Group", "_Test Item Group B"))
+		self.assertEqual(get_ancestors("Item Group", "_Test Item Group B - 3"), [])
+
+		frappe.copy_doc(test_records[6]).insert()
+		self.assertTrue("_Test Item Group B - 3" in get_descendants("Item Group", "_Test Item Group B"))
+
+		# a direct update of the tree is read once the version is bumped
+		frappe.db.sql("""update `tabItem Group` set parent_item_group = 'All Item Groups'
+			where name = '_Test Item Group B - 3'""")
+		bump_tree_version("Item Group")
+		self.assertEqual(get_ancestors("Item Group", "_Test Item Group B - 3"),
+			["_Test Item Group B - 3", "All Item Groups"])
+
+		frappe.db.sql("""update `tabItem Group` set parent_item_group = '_Test Item Group B'
+			where name = '_Test Item Group B - 3'""")
+		bump_tree_version("Item Group")
+
 	def test_move_group_into_root(self):
 		group_b = frappe.get_doc("Item Group", "_Test Item Group B")
 		group_b.parent_item_group = ""
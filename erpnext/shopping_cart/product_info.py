@@ -37,9 +37,9 @@ def get_product_info_for_website(item_code, skip_quotation_creation=False):
 		"stock_qty": stock_status.stock_qty,
 		"in_stock": stock_status.in_stock if stock_status.is_stock_item else get_non_stock_item_status(item_code, "website_warehouse"),
 		"qty": 0,
-		"uom": frappe.db.get_value("Item", item_code, "stock_uom"),
+		"uom": frappe.get_cached_value("Item", item_code, "stock_uom"),
 		"show_stock_qty": show_quantity_in_website(),
-		"sales_uom": frappe.db.get_value("Item", item_code, "sales_uom")
+		"sales_uom": frappe.get_cached_value("Item", item_code, "sales_uom")
 	}
 
 	if product_info["price"]:
@@ -114,6 +114,11 @@ class Batch(Document):
 		self.calculate_batch_qty()
 		self.validate_display_on_website()
 
+	def on_update(self):
+		# expiry date decides the sellable qty shown on the website
+		from erpnext.utilities.product import clear_website_stock_qty
+		clear_website_stock_qty(self.item)
+
 	def item_has_batch_enabled(self):
 		if frappe.db.get_value("Item", self.item, "has_batch_no") == 0:
 			frappe.throw(_("The selected item cannot have Batch"))
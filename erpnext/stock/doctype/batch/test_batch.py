@@ -175,6 +175,38 @@ class TestBatch(unittest.TestCase):
 
 		self.assertEqual(get_batch_qty('batch a', '_Test Warehouse - _TC'), 90)
 
+	def test_website_stock_qty_without_expired_batches(self):
+		from erpnext.utilities.product import get_qty_in_stock
+		from frappe.utils import add_days, nowdate
+
+		self.make_batch_item('ITEM-BATCH-3')
+		self.make_new_batch_and_entry('ITEM-BATCH-3', 'batch c', '_Test Warehouse - _TC')
+		self.make_new_batch_and_entry('ITEM-BATCH-3', 'batch d', '_Test Warehouse - _TC')
+
+		stock_qty = get_qty_in_stock('ITEM-BATCH-3', 'website_warehouse', '_Test Warehouse - _TC').stock_qty
+		self.assertEqual(stock_qty[0][0], 180)
+
+		# expiring a batch clears the cached qty
+		frappe.get_doc('Batch', 'batch c').db_set('expiry_date', add_days(nowdate(), -1))
+		frappe.get_doc('Batch', 'batch c').save()
+
+		stock_qty = get_qty_in_stock('ITEM-BATCH-3', 'website_warehouse', '_Test Warehouse - _TC').stock_qty
+		self.assertEqual(stock_qty[0][0], 90)
+
+		# new stock clears it too
+		self.make_new_batch_and_entry('ITEM-BATCH-3', 'batch d', '_Test Warehouse - _TC')
+
+		stock_qty = get_qty_in_stock('ITEM-BATCH-3', 'website_warehouse', '_Test Warehouse - _TC').stock_qty
+		self.assertEqual(stock_qty[0][0], 180)
+
+		# and so do bin updates saved by stock reposting
+		bin_doc = frappe.get_doc('Bin', {'item_code': 'ITEM-BATCH-3', 'warehouse': '_Test Warehouse - _TC'})
+		bin_doc.actual_qty -= 30
+		bin_doc.save()
+
+		stock_qty = get_qty_in_stock('ITEM-BATCH-3', 'website_warehouse', '_Test Warehouse - _TC').stock_qty
+		self.assertEqual(stock_qty[0][0], 150)
+
 	@classmethod
 	def make_new_batch_and_entry(cls, item_name, batch_name, warehouse):
 		'''Make a new stock entry for given target warehouse and batch name of item'''
@@ -3,6 +3,18 @@
 
 frappe.ui.form.on('Bin', {
 	refresh: function(frm) {
-
+		frappe.call({
+			method: "erpnext.stock.doctype.stock_repost_request.stock_repost_request.get_pending_reposts",
+			args: {
+				item_code: frm.doc.item_code,
+				warehouse: frm.doc.warehouse
+			},
+			callback: function(r) {
+				if (r.message && r.message.length) {
+					let vouchers = r.message.map(d => repl("%(voucher_type)s %(voucher_no)s", d));
+					frm.dashboard.set_headline(__("Valuation pending repost after: {0}", [vouchers.join(", ")]));
+				}
+			}
+		});
 	}
 });
@@ -3,7 +3,7 @@
 
 from __future__ import unicode_literals
 import frappe
-from frappe.utils import flt, nowdate
+from frappe.utils import cint, flt, nowdate, now
 import frappe.defaults
 from frappe.model.document import Document
 
@@ -31,8 +31,10 @@ class Bin(Document):
 				"warehouse": self.warehouse,
 				"posting_date": args.get("posting_date"),
 				"posting_time": args.get("posting_time"),
+				"voucher_type": args.get("voucher_type"),
 				"voucher_no": args.get("voucher_no")
-			}, allow_negative_stock=allow_negative_stock, via_landed_cost_voucher=via_landed_cost_voucher)
+			}, allow_negative_stock=allow_negative_stock, via_landed_cost_voucher=via_landed_cost_voucher,
+				defer_future_repost=cint(frappe.db.get_single_value("Stock Settings", "defer_future_stock_repost")))
 
 	def update_qty(self, args):
 		# update the stock values (for current quantities)
@@ -48,7 +50,11 @@ class Bin(Document):
 		self.planned_qty = flt(self.planned_qty) + flt(args.get("planned_qty"))
 
 		self.set_projected_qty()
+
+		# POS tills fetch the bins modified since their last sync
+		self.modified = now()
 		self.db_update()
+		self.clear_website_stock_qty()
 
 	def set_projected_qty(self):
 		self.projected_qty = (flt(self.actual_qty) + flt(self.ordered_qty)
@@ -89,6 +95,7 @@ class Bin(Document):
 
 		self.db_set('reserved_qty_for_production', flt(self.reserved_qty_for_production))
 		self.db_set('projected_qty', self.projected_qty)
+		self.clear_website_stock_qty()
 
 	def update_reserved_qty_for_sub_contracting(self):
 		#reserved qty
@@ -131,6 +138,15 @@ class Bin(Document):
 		self.db_set('reserved_qty_for_sub_contract', reserved_qty_for_sub_contract)
 		self.set_projected_qty()
 		self.db_set('projected_qty', self.projected_qty)
+		self.clear_website_stock_qty()
+
+	def on_update(self):
+		# qty updates through save, like the ones from stock reposting
+		self.clear_website_stock_qty()
+
+	def clear_website_stock_qty(self):
+		from erpnext.utilities.product import clear_website_stock_qty
+		clear_website_stock_qty(self.item_code, self.warehouse)
 
 def on_doctype_update():
 	frappe.db.add_index("Bin", ["item_code", "warehouse"])
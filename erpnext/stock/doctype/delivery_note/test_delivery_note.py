@@ -5,10 +5,10 @@
 from __future__ import unicode_literals
 import unittest
 import frappe
-import json
 import frappe.defaults
 from frappe.utils import cint, nowdate, nowtime, cstr, add_days, flt, today
 from erpnext.stock.stock_ledger import get_previous_sle
+from erpnext.stock.utils import load_stock_queue
 from erpnext.accounts.utils import get_balance_on
 from erpnext.stock.doctype.purchase_receipt.test_purchase_receipt \
 	import get_gl_entries, set_perpetual_inventory
@@ -46,12 +46,12 @@ class TestDeliveryNote(unittest.TestCase):
 		set_perpetual_inventory(0, company)
 		make_stock_entry(target="_Test Warehouse - _TC", qty=5, basic_rate=100)
 
-		stock_queue = json.loads(get_previous_sle({
+		stock_queue = load_stock_queue(get_previous_sle({
 			"item_code": "_Test Item",
 			"warehouse": "_Test Warehouse - _TC",
 			"posting_date": nowdate(),
 			"posting_time": nowtime()
-		}).stock_queue or "[]")
+		}).stock_queue)
 
 		dn = create_delivery_note()
 
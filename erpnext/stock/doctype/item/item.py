@@ -23,6 +23,7 @@ from frappe.website.website_generator import WebsiteGenerator
 
 from six import iteritems
 from erpnext.utilities.utils import get_abbr
+from erpnext.utilities.product import clear_website_stock_qty
 from erpnext import get_default_company
 from erpnext.accounts.utils import get_company_default
 
@@ -1023,6 +1024,7 @@ def invalidate_cache_for_item(doc):
 		invalidate_cache_for(doc, doc.old_item_group)
 
 	invalidate_item_variants_cache_for_website(doc)
+	clear_website_stock_qty(doc.name)
 
 
 def invalidate_item_variants_cache_for_website(doc):
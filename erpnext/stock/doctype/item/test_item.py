@@ -13,7 +13,7 @@ from erpnext.stock.doctype.item.item import StockExistsForTemplate, InvalidBarco
 from erpnext.stock.doctype.item.item import get_uom_conv_factor
 from frappe.model.rename_doc import rename_doc
 from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
-from erpnext.stock.get_item_details import get_item_details
+from erpnext.stock.get_item_details import get_item_details, get_items_details_bulk
 from erpnext.stock.doctype.warehouse.test_warehouse import create_warehouse
 
 from six import iteritems
@@ -108,6 +108,32 @@ class TestItem(unittest.TestCase):
 		for key, value in iteritems(to_check):
 			self.assertEqual(value, details.get(key))
 
+	def test_get_items_details_bulk(self):
+		frappe.db.sql("""delete from `tabItem Price`""")
+		make_test_objects("Item Price")
+
+		args = {
+			"company": "_Test Company",
+			"price_list": "_Test Price List",
+			"currency": "_Test Currency",
+			"doctype": "Sales Order",
+			"conversion_rate": 1,
+			"price_list_currency": "_Test Currency",
+			"plc_conversion_rate": 1,
+			"order_type": "Sales",
+			"customer": "_Test Customer",
+			"warehouse": "_Test Warehouse - _TC",
+			"transaction_date": frappe.utils.nowdate()
+		}
+
+		rows = []
+		for item_code, qty in (("_Test Item", 1), ("_Test Item 2", 5), ("_Test Item", 10)):
+			row = dict(args, item_code=item_code, qty=qty)
+			rows.append(row)
+
+		expected = [get_item_details(frappe._dict(row), args) for row in rows]
+		self.assertEqual(get_items_details_bulk(args, rows), expected)
+
 	def test_item_tax_template(self):
 		expected_item_tax_template = [
 			{"item_code": "_Test Item With Item Tax Template", "tax_category": "",
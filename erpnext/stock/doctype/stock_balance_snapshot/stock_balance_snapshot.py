@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, add_months, flt, get_last_day, getdate, nowdate, now
+
+# number of snapshot rows written per INSERT query
+SNAPSHOT_INSERT_BATCH_SIZE = 500
+
+class StockBalanceSnapshot(Document):
+	pass
+
+def make_stock_balance_snapshots(snapshot_upto=None):
+	"""
+		Write the month end balance of every item and warehouse up to the last month end.
+
+		Item-warehouses continue from their latest snapshot, so the snapshots removed
+		by a backdated posting are rebuilt from the month end before it.
+	"""
+	snapshot_upto = getdate(snapshot_upto or get_last_day(add_months(nowdate(), -1)))
+	latest_snapshots = get_latest_snapshots(snapshot_upto)
+
+	for d in frappe.db.sql("""select bin.item_code, bin.warehouse, wh.company
+		from `tabBin` bin, `tabWarehouse` wh
+		where bin.warehouse = wh.name""", as_dict=1):
+		last_snapshot = latest_snapshots.get((d.item_code, d.warehouse))
+		if last_snapshot and getdate(last_snapshot.posting_date) >= snapshot_upto:
+			continue
+
+		make_snapshots(d.item_code, d.warehouse, d.company, last_snapshot, snapshot_upto)
+		frappe.db.commit()
+
+def make_snapshots(item_code, warehouse, company, last_snapshot, snapshot_upto):
+	balance = frappe._dict({"qty_after_transaction": 0.0, "valuation_rate": 0.0, "stock_value": 0.0})
+	from_date, month_end = None, None
+
+	if last_snapshot:
+		balance.update(last_snapshot)
+		from_date = getdate(last_snapshot.posting_date)
+		month_end = get_last_day(add_days(from_date, 1))
+
+	sl_entries = frappe.db.sql("""
+		select posting_date, voucher_type, actual_qty, qty_after_transaction,
+			valuation_rate, stock_value_difference
+		from `tabStock Ledger Entry`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s and docstatus < 2
+			and posting_date <= %(snapshot_upto)s {0}
+		order by posting_date, posting_time, creation, actual_qty""".format(
+			"and posting_date > %(from_date)s" if from_date else ""), {
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"from_date": from_date,
+			"snapshot_upto": snapshot_upto
+		}, as_dict=1)
+
+	snapshots = []
+	def add_snapshot(posting_date):
+		snapshots.append(frappe._dict({
+			"company": company,
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"posting_date": posting_date,
+			"qty_after_transaction": flt(balance.qty_after_transaction),
+			"valuation_rate": flt(balance.valuation_rate),
+			"stock_value": flt(balance.stock_value)
+		}))
+
+	for sle in sl_entries:
+		if not month_end:
+			month_end = get_last_day(sle.posting_date)
+
+		while getdate(sle.posting_date) > month_end:
+			add_snapshot(month_end)
+			month_end = get_last_day(add_days(month_end, 1))
+
+		# same running balance as the Stock Balance report
+		if sle.voucher_type == "Stock Reconciliation":
+			balance.qty_after_transaction = flt(sle.qty_after_transaction)
+		else:
+			balance.qty_after_transaction += flt(sle.actual_qty)
+
+		balance.stock_value += flt(sle.stock_value_difference)
+		balance.valuation_rate = sle.valuation_rate
+
+	while month_end and month_end <= snapshot_upto:
+		add_snapshot(month_end)
+		month_end = get_last_day(add_days(month_end, 1))
+
+	frappe.db.sql("""delete from `tabStock Balance Snapshot`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+			and posting_date <= %(snapshot_upto)s {0}""".format(
+			"and posting_date > %(from_date)s" if from_date else ""), {
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"from_date": from_date,
+			"snapshot_upto": snapshot_upto
+		})
+
+	if snapshots:
+		insert_snapshots(snapshots)
+
+def insert_snapshots(snapshots):
+	timestamp, user = now(), frappe.session.user
+	columns = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"company", "item_code", "warehouse", "posting_date", "qty_after_transaction",
+		"valuation_rate", "stock_value"]
+
+	for start in range(0, len(snapshots), SNAPSHOT_INSERT_BATCH_SIZE):
+		batch = snapshots[start:start + SNAPSHOT_INSERT_BATCH_SIZE]
+
+		values = []
+		for d in batch:
+			d.update({
+				"name": frappe.generate_hash(length=10),
+				"creation": timestamp,
+				"modified": timestamp,
+				"owner": user,
+				"modified_by": user,
+				"docstatus": 0
+			})
+			values.extend([d.get(column) for column in columns])
+
+		frappe.db.sql("""insert into `tabStock Balance Snapshot` ({0}) values {1}""".format(
+			", ".join("`{0}`".format(column) for column in columns),
+			", ".join(["({0})".format(", ".join(["%s"] * len(columns)))] * len(batch))),
+			tuple(values))
+
+def get_latest_snapshots(snapshot_upto):
+	latest_snapshots = {}
+	for d in frappe.db.sql("""
+		select sbs.item_code, sbs.warehouse, sbs.posting_date,
+			sbs.qty_after_transaction, sbs.valuation_rate, sbs.stock_value
+		from `tabStock Balance Snapshot` sbs,
+			(select item_code, warehouse, max(posting_date) as posting_date
+				from `tabStock Balance Snapshot`
+				where posting_date <= %s
+				group by item_code, warehouse) latest
+		where sbs.item_code = latest.item_code and sbs.warehouse = latest.warehouse
+			and sbs.posting_date = latest.posting_date""", snapshot_upto, as_dict=1):
+		latest_snapshots[(d.item_code, d.warehouse)] = d
+
+	return latest_snapshots
+
+def get_snapshot_date(before_date):
+	"""Returns the latest month end before the given date for which snapshots exist"""
+	return frappe.db.sql("""select max(posting_date) from `tabStock Balance Snapshot`
+		where posting_date < %s""", before_date)[0][0]
+
+def invalidate_stock_balance_snapshots(item_code, warehouse, posting_date=None):
+	"""Remove the snapshots on or after a backdated posting, the next scheduled run rebuilds them"""
+	frappe.db.sql("""delete from `tabStock Balance Snapshot`
+		where item_code = %s and warehouse = %s and posting_date >= %s""",
+		(item_code, warehouse, posting_date or "1900-01-01"))
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Balance Snapshot", ["item_code", "warehouse", "posting_date"])
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_months, flt, get_first_day, get_last_day, nowdate
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import make_stock_balance_snapshots
+from erpnext.stock.report.stock_balance.stock_balance import execute
+
+class TestStockBalanceSnapshot(unittest.TestCase):
+	def test_opening_balance_from_snapshot(self):
+		item_code, warehouse = "_Test Snapshot Item", "_Test Warehouse - _TC"
+		make_item(item_code, {"is_stock_item": 1})
+		posting_date = get_first_day(add_months(nowdate(), -2))
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100,
+			posting_date=posting_date)
+		make_stock_balance_snapshots()
+
+		snapshot = frappe.db.get_value("Stock Balance Snapshot", {"item_code": item_code,
+			"warehouse": warehouse, "posting_date": get_last_day(posting_date)},
+			["qty_after_transaction", "stock_value"], as_dict=1)
+		self.assertEqual(flt(snapshot.qty_after_transaction), 10)
+		self.assertEqual(flt(snapshot.stock_value), 1000)
+
+		self.assertEqual(get_opening_balance(item_code), (10, 1000))
+
+		# backdated entry removes the snapshots after it, the report reads the ledger instead
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100,
+			posting_date=posting_date)
+		self.assertFalse(frappe.db.exists("Stock Balance Snapshot", {"item_code": item_code,
+			"warehouse": warehouse, "posting_date": get_last_day(posting_date)}))
+		self.assertEqual(get_opening_balance(item_code), (15, 1500))
+
+		make_stock_balance_snapshots()
+		self.assertEqual(get_opening_balance(item_code), (15, 1500))
+
+def get_opening_balance(item_code):
+	columns, data = execute(frappe._dict({
+		"company": "_Test Company",
+		"item_code": item_code,
+		"warehouse": "_Test Warehouse - _TC",
+		"from_date": nowdate(),
+		"to_date": nowdate()
+	}))
+
+	return flt(data[0]["opening_qty"]), flt(data[0]["opening_val"])
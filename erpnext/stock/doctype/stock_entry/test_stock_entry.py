@@ -9,6 +9,7 @@ from erpnext.stock.doctype.serial_no.serial_no import *
 from erpnext import set_perpetual_inventory
 from erpnext.stock.doctype.stock_ledger_entry.stock_ledger_entry import StockFreezeError
 from erpnext.stock.stock_ledger import get_previous_sle
+from erpnext.stock.utils import load_stock_queue
 from frappe.permissions import add_user_permission, remove_user_permission
 from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import create_stock_reconciliation
 from erpnext.stock.doctype.item.test_item import set_item_variant_settings, make_item_variant, create_item
@@ -45,30 +46,30 @@ class TestStockEntry(unittest.TestCase):
 		make_stock_entry(item_code=item_code, target=warehouse, qty=1, basic_rate=10)
 		sle = get_sle(item_code = item_code, warehouse = warehouse)[0]
 
-		self.assertEqual([[1, 10]], frappe.safe_eval(sle.stock_queue))
+		self.assertEqual([[1, 10]], load_stock_queue(sle.stock_queue))
 
 		# negative qty
 		make_stock_entry(item_code=item_code, source=warehouse, qty=2, basic_rate=10)
 		sle = get_sle(item_code = item_code, warehouse = warehouse)[0]
 
-		self.assertEqual([[-1, 10]], frappe.safe_eval(sle.stock_queue))
+		self.assertEqual([[-1, 10]], load_stock_queue(sle.stock_queue))
 
 		# further negative
 		make_stock_entry(item_code=item_code, source=warehouse, qty=1)
 		sle = get_sle(item_code = item_code, warehouse = warehouse)[0]
 
-		self.assertEqual([[-2, 10]], frappe.safe_eval(sle.stock_queue))
+		self.assertEqual([[-2, 10]], load_stock_queue(sle.stock_queue))
 
 		# move stock to positive
 		make_stock_entry(item_code=item_code, target=warehouse, qty=3, basic_rate=20)
 		sle = get_sle(item_code = item_code, warehouse = warehouse)[0]
-		self.assertEqual([[1, 20]], frappe.safe_eval(sle.stock_queue))
+		self.assertEqual([[1, 20]], load_stock_queue(sle.stock_queue))
 
 		# incoming entry with diff rate
 		make_stock_entry(item_code=item_code, target=warehouse, qty=1, basic_rate=30)
 		sle = get_sle(item_code = item_code, warehouse = warehouse)[0]
 
-		self.assertEqual([[1, 20],[1, 30]], frappe.safe_eval(sle.stock_queue))
+		self.assertEqual([[1, 20],[1, 30]], load_stock_queue(sle.stock_queue))
 
 		frappe.db.set_default("allow_negative_stock", 0)
 
@@ -119,6 +120,14 @@ class TestStockEntry(unittest.TestCase):
 			variant.save()
 
 		from erpnext.stock.reorder_item import reorder_item
+
+		# a dry run plans the same requests without creating them
+		mr_count = frappe.db.count("Material Request")
+		planned = reorder_item(dry_run=True)
+		self.assertEqual(frappe.db.count("Material Request"), mr_count)
+		self.assertTrue(item_code in [d["item_code"] for mr in planned.material_requests for d in mr.items])
+		self.assertTrue("planning" in planned.timings)
+
 		mr_list = reorder_item()
 
 		frappe.db.set_value("Stock Settings", None, "auto_indent", 0)
@@ -10,6 +10,7 @@ from frappe.model.document import Document
 from datetime import date
 from erpnext.controllers.item_variant import ItemTemplateCannotHaveStock
 from erpnext.accounts.utils import get_fiscal_year
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import invalidate_stock_balance_snapshots
 
 class StockFreezeError(frappe.ValidationError): pass
 
@@ -47,6 +48,8 @@ class StockLedgerEntry(Document):
 			from erpnext.stock.doctype.serial_no.serial_no import process_serial_no
 			process_serial_no(self)
 
+		invalidate_stock_balance_snapshots(self.item_code, self.warehouse, self.posting_date)
+
 	#check for item quantity available in stock
 	def actual_amt_check(self):
 		if self.batch_no and not self.get("allow_negative_stock"):
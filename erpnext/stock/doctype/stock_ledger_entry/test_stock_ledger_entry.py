@@ -5,8 +5,49 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import add_days, nowdate, flt
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.utils import load_stock_queue, dump_stock_queue
 
 # test_records = frappe.get_test_records('Stock Ledger Entry')
 
 class TestStockLedgerEntry(unittest.TestCase):
-	pass
+	def test_batched_repost_of_future_entries(self):
+		import erpnext.stock.stock_ledger as stock_ledger
+
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+		frappe.db.set_value("Item", item_code, "valuation_method", "FIFO")
+
+		for i in range(5):
+			make_stock_entry(item_code=item_code, target=warehouse, qty=1, basic_rate=100,
+				posting_date=add_days(nowdate(), -5 + i))
+
+		batch_size = stock_ledger.SLE_UPDATE_BATCH_SIZE
+		stock_ledger.SLE_UPDATE_BATCH_SIZE = 2
+		try:
+			# backdated receipt reposts all the entries above in batches of 2
+			make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=200,
+				posting_date=add_days(nowdate(), -10))
+		finally:
+			stock_ledger.SLE_UPDATE_BATCH_SIZE = batch_size
+
+		entries = frappe.get_all("Stock Ledger Entry",
+			filters={"item_code": item_code, "warehouse": warehouse},
+			fields=["actual_qty", "qty_after_transaction", "stock_value", "stock_value_difference"],
+			order_by="posting_date asc, posting_time asc, creation asc")
+
+		qty, value = 0.0, 0.0
+		for sle in entries:
+			qty += flt(sle.actual_qty)
+			value += flt(sle.stock_value_difference)
+			self.assertEqual(flt(sle.qty_after_transaction), qty)
+			self.assertEqual(flt(sle.stock_value, 2), flt(value, 2))
+
+	def test_stock_queue_encoding(self):
+		stock_queue = [[10, 100.5], [-2.25, 0.1], [0, 0]]
+
+		self.assertEqual(load_stock_queue(dump_stock_queue(stock_queue)), stock_queue)
+
+		# queues stored as JSON are still readable
+		self.assertEqual(load_stock_queue("[[10, 100.5], [-2.25, 0.1]]"), [[10, 100.5], [-2.25, 0.1]])
+		self.assertEqual(load_stock_queue(None), [])
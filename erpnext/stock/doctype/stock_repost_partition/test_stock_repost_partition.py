@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.stock.stock_balance import (get_item_warehouses, get_partition_no, get_repost_progress,
+	repost_partition, set_repost_progress)
+
+class TestStockRepostPartition(unittest.TestCase):
+	def test_partitions_cover_all_item_warehouses(self):
+		item_warehouses = [tuple(d) for d in get_item_warehouses()]
+
+		partitioned = []
+		for partition_no in range(3):
+			partitioned.extend([d for d in item_warehouses if get_partition_no(d[0], 3) == partition_no])
+
+		self.assertEqual(sorted(partitioned), sorted(item_warehouses))
+
+	def test_resume_from_checkpoint(self):
+		repost_id = frappe.generate_hash(length=10)
+		item_warehouses = [tuple(d) for d in get_item_warehouses() if get_partition_no(d[0], 2) == 0]
+		self.assertTrue(len(item_warehouses) > 1)
+
+		# a run that stopped half way through the partition
+		done = len(item_warehouses) // 2
+		set_repost_progress(repost_id, 0, frappe._dict({
+			"partitions": 2,
+			"status": "Running",
+			"completed": done,
+			"last_item_warehouse": list(item_warehouses[done - 1])
+		}))
+
+		self.assertEqual([tuple(d) for d in get_item_warehouses(after=item_warehouses[done - 1])
+			if get_partition_no(d[0], 2) == 0], item_warehouses[done:])
+
+		repost_partition(repost_id, 0, 2, only_bin=True)
+
+		# the checkpoints are read back from the database
+		progress = get_repost_progress(repost_id)[0]
+		self.assertEqual(progress.status, "Completed")
+		self.assertEqual(progress.total, len(item_warehouses))
+		self.assertEqual(progress.completed, len(item_warehouses))
+		self.assertEqual(tuple(progress.last_item_warehouse), item_warehouses[-1])
+		self.assertEqual(progress.failed, [])
+
+	def test_failed_item_warehouse_is_logged(self):
+		import erpnext.stock.stock_balance as stock_balance
+
+		repost_id = frappe.generate_hash(length=10)
+		item_warehouses = [list(d) for d in get_item_warehouses() if get_partition_no(d[0], 2) == 0]
+
+		def repost_stock(item_code, warehouse, *args):
+			raise frappe.ValidationError("Repost failed for {0}".format(item_code))
+
+		_repost_stock = stock_balance.repost_stock
+		stock_balance.repost_stock = repost_stock
+		try:
+			repost_partition(repost_id, 0, 2, only_bin=True)
+		finally:
+			stock_balance.repost_stock = _repost_stock
+
+		progress = get_repost_progress(repost_id)[0]
+		self.assertEqual(progress.failed, item_warehouses)
+		self.assertIn("Repost failed for {0}".format(item_warehouses[0][0]), progress.error_log)
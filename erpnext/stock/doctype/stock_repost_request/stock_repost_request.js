@@ -0,0 +1,10 @@
+// Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Stock Repost Request', {
+	refresh: function(frm) {
+		if (frm.doc.status == "Failed") {
+			frm.dashboard.set_headline(__("Reposting failed, see the error log below."));
+		}
+	}
+});
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import cint, add_to_date, now_datetime
+
+# attempts after which a failed request is no longer retried and the System Managers are told
+STOCK_REPOST_MAX_RETRIES = 3
+
+# seconds after which a request still processing is taken to be left by a killed run
+STOCK_REPOST_TIMEOUT = 3600
+
+class StockRepostRequest(Document):
+	pass
+
+def queue_repost_for_future_entries(args):
+	"""Queue a repost request if stock ledger entries exist after the given posting datetime"""
+	future_sle = frappe.db.sql("""select name from `tabStock Ledger Entry`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+		and ifnull(is_cancelled, 'No') = 'No'
+		and timestamp(posting_date, posting_time) > timestamp(%(posting_date)s, %(posting_time)s)
+		limit 1""", args)
+
+	if not future_sle:
+		return
+
+	repost_request = frappe.get_doc({
+		"doctype": "Stock Repost Request",
+		"item_code": args.get("item_code"),
+		"warehouse": args.get("warehouse"),
+		"posting_date": args.get("posting_date"),
+		"posting_time": args.get("posting_time"),
+		"voucher_type": args.get("voucher_type"),
+		"voucher_no": args.get("voucher_no")
+	})
+	repost_request.flags.ignore_permissions = True
+	repost_request.insert()
+
+	return repost_request.name
+
+@frappe.whitelist()
+def get_pending_reposts(item_code, warehouse):
+	"""Returns the transactions whose future stock ledger entries are yet to be reposted"""
+	return frappe.get_all("Stock Repost Request",
+		filters={"item_code": item_code, "warehouse": warehouse, "status": ["!=", "Completed"]},
+		fields=["name", "voucher_type", "voucher_no", "posting_date", "posting_time"],
+		order_by="posting_date asc, posting_time asc, creation asc")
+
+def process_repost_requests():
+	"""
+		Repost future stock ledger entries for all queued requests.
+
+		Overlapping requests of an item-warehouse are merged, the chain is reposted once
+		from the earliest requested posting datetime and committed per item-warehouse.
+		Failed requests are retried `STOCK_REPOST_MAX_RETRIES` times.
+	"""
+	from erpnext.stock.stock_ledger import update_entries_after
+
+	requests_map = {}
+	for d in frappe.db.sql("""select name, item_code, warehouse, posting_date, posting_time
+		from `tabStock Repost Request`
+		where status = 'Queued' or (status = 'Failed' and retries < %s)
+			or (status = 'Processing' and modified < %s)
+		order by posting_date asc, posting_time asc, creation asc""",
+		(STOCK_REPOST_MAX_RETRIES, get_stale_processing_time()), as_dict=1):
+		requests_map.setdefault((d.item_code, d.warehouse), []).append(d)
+
+	allow_negative_stock = cint(frappe.db.get_single_value("Stock Settings", "allow_negative_stock"))
+
+	for (item_code, warehouse), requests in requests_map.items():
+		names = claim_requests([d.name for d in requests])
+		if not names:
+			continue
+
+		earliest = [d for d in requests if d.name in names][0]
+
+		try:
+			update_entries_after({
+				"item_code": item_code,
+				"warehouse": warehouse,
+				"posting_date": earliest.posting_date,
+				"posting_time": earliest.posting_time
+			}, allow_negative_stock=allow_negative_stock, verbose=0)
+
+			set_status(names, "Completed")
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			traceback = frappe.get_traceback()
+			set_status(names, "Failed", traceback, failed=True)
+			frappe.log_error(traceback, _("Stock Repost Failed for {0} in {1}").format(item_code, warehouse))
+			frappe.db.commit()
+
+			notify_failed_requests(item_code, warehouse, names)
+
+def claim_requests(names):
+	"""
+		Returns the requests not picked by another run and marks them as processing.
+		The locking read waits for a run processing the same requests and sees its status.
+	"""
+	names = frappe.db.sql_list("""select name from `tabStock Repost Request`
+		where name in ({0}) and (status in ('Queued', 'Failed') or (status = 'Processing' and modified < %s))
+		for update""".format(", ".join(["%s"] * len(names))), tuple([get_stale_processing_time()] + names))
+
+	if names:
+		set_status(names, "Processing")
+	frappe.db.commit()
+
+	return names
+
+def get_stale_processing_time():
+	"""Requests processing since before this time were picked by a run that was killed"""
+	return add_to_date(now_datetime(), seconds=-STOCK_REPOST_TIMEOUT)
+
+def set_status(names, status, error_log=None, failed=False):
+	frappe.db.sql("""update `tabStock Repost Request`
+		set status = %s, error_log = %s, retries = retries + %s, modified = %s
+		where name in ({0})""".format(", ".join(["%s"] * len(names))),
+		tuple([status, error_log, cint(failed), now_datetime()] + names))
+
+def notify_failed_requests(item_code, warehouse, names):
+	"""Tell the System Managers about the requests that will not be retried again"""
+	names = frappe.db.sql_list("""select name from `tabStock Repost Request`
+		where name in ({0}) and retries >= %s""".format(", ".join(["%s"] * len(names))),
+		tuple(names + [STOCK_REPOST_MAX_RETRIES]))
+	if not names:
+		return
+
+	subject = _("[Important] [ERPNext] Stock Repost Failed")
+	content = _("Dear System Manager,") + "<br>" \
+		+ _("The stock ledger entries of {0} in {1} could not be reposted after {2} attempts, \
+		the valuation and the stock balance of the item are not correct until this is rectified:").format(
+			frappe.get_desk_link("Item", item_code), frappe.get_desk_link("Warehouse", warehouse),
+			STOCK_REPOST_MAX_RETRIES) + "<br>"
+
+	for name in names:
+		content += """<div class='small text-muted'>{0}</div>""".format(
+			frappe.get_desk_link("Stock Repost Request", name))
+
+	content += "<br>" + _("Regards,") + "<br>" + _("Administrator")
+
+	from frappe.email import sendmail_to_system_managers
+	sendmail_to_system_managers(subject, content)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, add_months, get_first_day, get_last_day, nowdate, flt
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.item.test_item import create_item
+from erpnext.stock.stock_ledger import NegativeStockError
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import make_stock_balance_snapshots
+from erpnext.stock.doctype.stock_repost_request.stock_repost_request import (get_pending_reposts,
+	process_repost_requests)
+
+class TestStockRepostRequest(unittest.TestCase):
+	def setUp(self):
+		frappe.db.set_value("Stock Settings", None, "defer_future_stock_repost", 1)
+
+	def tearDown(self):
+		frappe.db.set_value("Stock Settings", None, "defer_future_stock_repost", 0)
+
+	def test_deferred_repost(self):
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+		frappe.db.sql("""delete from `tabStock Repost Request`""")
+		actual_qty = frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		backdated = make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100,
+			posting_date=add_days(nowdate(), -3))
+
+		pending = get_pending_reposts(item_code, warehouse)
+		self.assertEqual([d.voucher_no for d in pending], [backdated.name])
+
+		self.assertEqual(flt(frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
+			"actual_qty")), flt(actual_qty) + 10)
+
+		process_repost_requests()
+		self.assertFalse(get_pending_reposts(item_code, warehouse))
+
+		last_sle = frappe.get_all("Stock Ledger Entry",
+			filters={"item_code": item_code, "warehouse": warehouse},
+			fields=["qty_after_transaction"], order_by="posting_date desc, posting_time desc, creation desc",
+			limit=1)[0]
+		self.assertEqual(flt(last_sle.qty_after_transaction),
+			flt(frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")))
+
+	def test_deferred_repost_validates_future_qty(self):
+		item_code, warehouse = "_Test Deferred Repost Item", "_Test Warehouse - _TC"
+		create_item(item_code)
+		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 0)
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100,
+			posting_date=add_days(nowdate(), -5))
+		make_stock_entry(item_code=item_code, source=warehouse, qty=10, posting_date=nowdate())
+
+		# the later issue would have no stock left
+		self.assertRaises(NegativeStockError, make_stock_entry, item_code=item_code, source=warehouse,
+			qty=5, posting_date=add_days(nowdate(), -3))
+
+	def test_failed_repost_is_retried(self):
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+		frappe.db.sql("""delete from `tabStock Repost Request`""")
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100,
+			posting_date=add_days(nowdate(), -3))
+
+		name = get_pending_reposts(item_code, warehouse)[0].name
+		frappe.db.set_value("Stock Repost Request", name, {"status": "Failed", "retries": 1})
+
+		process_repost_requests()
+		self.assertEqual(frappe.db.get_value("Stock Repost Request", name, "status"), "Completed")
+		self.assertFalse(get_pending_reposts(item_code, warehouse))
+
+	def test_deferred_repost_invalidates_snapshots(self):
+		item_code, warehouse = "_Test Deferred Snapshot Item", "_Test Warehouse - _TC"
+		create_item(item_code)
+		posting_date = get_first_day(add_months(nowdate(), -2))
+		snapshot_date = get_last_day(add_months(nowdate(), -1))
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100,
+			posting_date=posting_date)
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100,
+			posting_date=add_months(posting_date, 1))
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=200,
+			posting_date=posting_date)
+
+		# built before the later entries are reposted
+		make_stock_balance_snapshots()
+		self.assertTrue(frappe.db.exists("Stock Balance Snapshot", {"item_code": item_code,
+			"warehouse": warehouse, "posting_date": snapshot_date}))
+
+		process_repost_requests()
+		self.assertFalse(frappe.db.exists("Stock Balance Snapshot", {"item_code": item_code,
+			"warehouse": warehouse, "posting_date": snapshot_date}))
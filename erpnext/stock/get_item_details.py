@@ -86,7 +86,7 @@ def get_item_details(args, doc=None, for_validate=False, overwrite_warehouse=Tru
 			args[key] = value
 
 	data = get_pricing_rule_for_item(args, out.price_list_rate,
-		doc, for_validate=for_validate)
+		doc, for_validate=for_validate, pricing_rule_index=get_prefetched("pricing_rule_index"))
 
 	out.update(data)
 
@@ -106,6 +106,103 @@ def get_item_details(args, doc=None, for_validate=False, overwrite_warehouse=Tru
 
 	return out
 
+@frappe.whitelist()
+def get_items_details_bulk(doc, rows, for_validate=False, overwrite_warehouse=True):
+	"""
+		Returns `get_item_details` of every row of a document, in the same order.
+
+		Item, Item Price, Bin and UOM Conversion Detail records of all the rows are read
+		with one query per table before the rows are processed, and the pricing rule index
+		is shared between the rows.
+
+		:param doc: parent document
+		:param rows: list of `get_item_details` args, one per item row
+	"""
+	if isinstance(doc, string_types):
+		doc = json.loads(doc)
+
+	if isinstance(rows, string_types):
+		rows = json.loads(rows)
+
+	args_list = [process_args(args) for args in rows]
+
+	frappe.flags.prefetched_item_details = prefetch_item_details(args_list)
+	try:
+		return [get_item_details(args, doc, for_validate=for_validate,
+			overwrite_warehouse=overwrite_warehouse) for args in args_list]
+	finally:
+		frappe.flags.prefetched_item_details = None
+
+def prefetch_item_details(args_list):
+	from erpnext.accounts.doctype.pricing_rule.utils import get_pricing_rule_index
+
+	prefetched = frappe._dict({
+		"pricing_rule_index": get_pricing_rule_index(),
+		"items": {},
+		"item_prices": {},
+		"bins": {},
+		"uom_conversion_factors": {}
+	})
+
+	item_codes = list(set([args.item_code for args in args_list if args.item_code]))
+	if not item_codes:
+		return prefetched
+
+	for d in frappe.db.sql("""select name, variant_of, stock_uom from `tabItem`
+		where name in ({0})""".format(", ".join(["%s"] * len(item_codes))), tuple(item_codes), as_dict=1):
+		prefetched["items"][d.name] = d
+
+	# prices and conversion factors of templates are used for their variants
+	item_codes = list(set(item_codes + [d.variant_of for d in prefetched["items"].values() if d.variant_of]))
+	price_lists = list(set([args.price_list for args in args_list if args.price_list]))
+
+	for item_code in item_codes:
+		prefetched["bins"][item_code] = {}
+		prefetched["uom_conversion_factors"][item_code] = {}
+		for price_list in price_lists:
+			prefetched["item_prices"][(item_code, price_list)] = []
+
+	if price_lists:
+		for d in frappe.db.sql("""select name, item_code, price_list, price_list_rate, uom,
+				customer, supplier, valid_from, valid_upto
+			from `tabItem Price`
+			where item_code in ({0}) and price_list in ({1})""".format(
+				", ".join(["%s"] * len(item_codes)), ", ".join(["%s"] * len(price_lists))),
+			tuple(item_codes + price_lists), as_dict=1):
+			prefetched["item_prices"].setdefault((d.item_code, d.price_list), []).append(d)
+
+	for d in frappe.db.sql("""select item_code, warehouse, projected_qty, actual_qty, reserved_qty
+		from `tabBin` where item_code in ({0})""".format(", ".join(["%s"] * len(item_codes))),
+		tuple(item_codes), as_dict=1):
+		prefetched["bins"].setdefault(d.item_code, {})[get_match_key(d.warehouse)] = frappe._dict({
+			"projected_qty": d.projected_qty,
+			"actual_qty": d.actual_qty,
+			"reserved_qty": d.reserved_qty
+		})
+
+	for d in frappe.db.sql("""select parent, uom, conversion_factor from `tabUOM Conversion Detail`
+		where parent in ({0}) order by idx""".format(", ".join(["%s"] * len(item_codes))),
+		tuple(item_codes), as_dict=1):
+		prefetched["uom_conversion_factors"].setdefault(d.parent, {}).setdefault(get_match_key(d.uom),
+			d.conversion_factor)
+
+	return prefetched
+
+def get_prefetched(key, name=None):
+	"""Returns the data prefetched by `get_items_details_bulk`, None if it was not prefetched"""
+	prefetched = frappe.flags.prefetched_item_details
+	if not prefetched:
+		return None
+
+	if name is None:
+		return prefetched.get(key)
+
+	return prefetched[key].get(name)
+
+def get_match_key(value):
+	# match values the way the database collation does, ignoring case and trailing spaces
+	return cstr(value).lower().rstrip(" ")
+
 def update_stock(args, out):
 	if (args.get("doctype") == "Delivery Note" or
 		(args.get("doctype") == "Sales Invoice" and args.get('update_stock'))) \
@@ -620,6 +717,10 @@ def get_item_price(args, item_code, ignore_party=False):
 
 	args['item_code'] = item_code
 
+	item_prices = get_prefetched("item_prices", (item_code, args.get("price_list")))
+	if item_prices is not None:
+		return filter_item_prices(item_prices, args, ignore_party)
+
 	conditions = """where item_code=%(item_code)s
 		and price_list=%(price_list)s
 		and ifnull(uom, '') in ('', %(uom)s)"""
@@ -640,6 +741,37 @@ def get_item_price(args, item_code, ignore_party=False):
 		from `tabItem Price` {conditions}
 		order by valid_from desc, uom desc """.format(conditions=conditions), args)
 
+def filter_item_prices(item_prices, args, ignore_party=False):
+	"""Returns the prefetched Item Prices matching the conditions of `get_item_price`, in the same order"""
+	def matches(d):
+		if d.uom and (args.get("uom") is None or get_match_key(d.uom) != get_match_key(args.get("uom"))):
+			return False
+
+		if not ignore_party:
+			if args.get("customer"):
+				if get_match_key(d.customer) != get_match_key(args.get("customer")):
+					return False
+			elif args.get("supplier"):
+				if get_match_key(d.supplier) != get_match_key(args.get("supplier")):
+					return False
+			elif d.customer or d.supplier:
+				return False
+
+		if args.get("transaction_date"):
+			transaction_date = getdate(args.get("transaction_date"))
+			if not (getdate(d.valid_from or "2000-01-01") <= transaction_date
+				<= getdate(d.valid_upto or "2500-12-31")):
+				return False
+
+		return True
+
+	# order by valid_from desc, uom desc, nulls are sorted last
+	item_prices = sorted([d for d in item_prices if matches(d)], key=lambda d: (
+		d.valid_from is not None, getdate(d.valid_from) if d.valid_from else None,
+		d.uom is not None, get_match_key(d.uom)), reverse=True)
+
+	return tuple((d.name, d.price_list_rate, d.uom) for d in item_prices)
+
 def get_price_list_rate_for(args, item_code):
 	"""
 		:param customer: link to Customer DocType
@@ -842,6 +974,13 @@ def get_serial_no_batchwise(args, sales_order=None):
 
 @frappe.whitelist()
 def get_conversion_factor(item_code, uom):
+	item = get_prefetched("items", item_code)
+	if item:
+		conversion_factor = (get_prefetched("uom_conversion_factors", item_code).get(get_match_key(uom))
+			or (item.variant_of and get_prefetched("uom_conversion_factors", item.variant_of).get(get_match_key(uom)))
+			or get_uom_conv_factor(uom, item.stock_uom))
+		return {"conversion_factor": conversion_factor or 1.0}
+
 	variant_of = frappe.db.get_value("Item", item_code, "variant_of", cache=True)
 	filters = {"parent": item_code, "uom": uom}
 	if variant_of:
@@ -860,6 +999,11 @@ def get_projected_qty(item_code, warehouse):
 
 @frappe.whitelist()
 def get_bin_details(item_code, warehouse):
+	item_bins = get_prefetched("bins", item_code)
+	if item_bins is not None:
+		return item_bins.get(get_match_key(warehouse)) \
+			or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
+
 	return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
 		["projected_qty", "actual_qty", "reserved_qty"], as_dict=True, cache=True) \
 			or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
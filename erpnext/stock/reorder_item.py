@@ -5,105 +5,138 @@ from __future__ import unicode_literals
 import frappe
 import erpnext
 import json
+import time
 from frappe.utils import flt, nowdate, add_days, cint
 from frappe import _
 
-def reorder_item():
+# items whose reorder levels are checked per query
+REORDER_ITEM_BATCH_SIZE = 1000
+
+# items per auto generated Material Request
+MATERIAL_REQUEST_MAX_ITEMS = 500
+
+def reorder_item(dry_run=False):
 	""" Reorder item if stock reaches reorder level"""
 	# if initial setup not completed, return
 	if not (frappe.db.a_row_exists("Company") and frappe.db.a_row_exists("Fiscal Year")):
 		return
 
-	if cint(frappe.db.get_value('Stock Settings', None, 'auto_indent')):
-		return _reorder_item()
+	if dry_run or cint(frappe.db.get_value('Stock Settings', None, 'auto_indent')):
+		return _reorder_item(dry_run)
 
-def _reorder_item():
+def _reorder_item(dry_run=False):
+	"""
+		Create Material Requests for the item warehouses below their reorder level.
+
+		With `dry_run`, returns the planned Material Requests and the time taken
+		to plan them, without creating them.
+	"""
+	start = time.time()
 	material_requests = {"Purchase": {}, "Transfer": {}, "Material Issue": {}, "Manufacture": {}}
-	warehouse_company = frappe._dict(frappe.db.sql("""select name, company from `tabWarehouse`
-		where disabled=0"""))
 	default_company = (erpnext.get_default_company() or
 		frappe.db.sql("""select name from tabCompany limit 1""")[0][0])
 
-	items_to_consider = frappe.db.sql_list("""select name from `tabItem` item
-		where is_stock_item=1 and has_variants=0
-			and disabled=0
-			and (end_of_life is null or end_of_life='0000-00-00' or end_of_life > %(today)s)
-			and (exists (select name from `tabItem Reorder` ir where ir.parent=item.name)
-				or (variant_of is not null and variant_of != ''
-				and exists (select name from `tabItem Reorder` ir where ir.parent=item.variant_of))
-			)""",
-		{"today": nowdate()})
-
-	if not items_to_consider:
-		return
-
-	item_warehouse_projected_qty = get_item_warehouse_projected_qty(items_to_consider)
-
-	def add_to_material_request(item_code, warehouse, reorder_level, reorder_qty, material_request_type, warehouse_group=None):
-		if warehouse not in warehouse_company:
-			# a disabled warehouse
-			return
-
-		reorder_level = flt(reorder_level)
-		reorder_qty = flt(reorder_qty)
-
-		# projected_qty will be 0 if Bin does not exist
-		if warehouse_group:
-			projected_qty = flt(item_warehouse_projected_qty.get(item_code, {}).get(warehouse_group))
-		else:
-			projected_qty = flt(item_warehouse_projected_qty.get(item_code, {}).get(warehouse))
-
-		if (reorder_level or reorder_qty) and projected_qty < reorder_level:
-			deficiency = reorder_level - projected_qty
-			if deficiency > reorder_qty:
-				reorder_qty = deficiency
-
-			company = warehouse_company.get(warehouse) or default_company
-
-			material_requests[material_request_type].setdefault(company, []).append({
-				"item_code": item_code,
-				"warehouse": warehouse,
-				"reorder_qty": reorder_qty
+	for d in get_reorder_deficiencies():
+		reorder_qty = flt(d.reorder_qty)
+		deficiency = flt(d.reorder_level) - flt(d.projected_qty)
+		if deficiency > reorder_qty:
+			reorder_qty = deficiency
+
+		material_requests[d.material_request_type].setdefault(d.company or default_company, []).append({
+			"item_code": d.item_code,
+			"warehouse": d.warehouse,
+			"reorder_qty": reorder_qty
+		})
+
+	if dry_run:
+		return frappe._dict({
+			"material_requests": [frappe._dict({
+				"material_request_type": request_type,
+				"company": company,
+				"items": items
+			}) for request_type, company, items in get_material_request_chunks(material_requests)],
+			"timings": {"planning": time.time() - start}
+		})
+
+	return create_material_request(material_requests)
+
+def get_reorder_deficiencies():
+	"""
+		Yields the reorder levels of the items whose projected qty is below the level,
+		checking REORDER_ITEM_BATCH_SIZE items per query.
+
+		Variants without reorder levels use the levels of their template. For a warehouse group,
+		the projected qty of all the warehouses in the group is compared.
+	"""
+	last_item_code = ""
+	while True:
+		items = frappe.db.sql_list("""select name from `tabItem` item
+			where is_stock_item=1 and has_variants=0
+				and disabled=0
+				and (end_of_life is null or end_of_life='0000-00-00' or end_of_life > %(today)s)
+				and (exists (select name from `tabItem Reorder` ir where ir.parent=item.name)
+					or (variant_of is not null and variant_of != ''
+					and exists (select name from `tabItem Reorder` ir where ir.parent=item.variant_of))
+				)
+				and name > %(last_item_code)s
+			order by name
+			limit %(limit)s""", {
+				"today": nowdate(),
+				"last_item_code": last_item_code,
+				"limit": REORDER_ITEM_BATCH_SIZE
 			})
 
-	for item_code in items_to_consider:
-		item = frappe.get_doc("Item", item_code)
-
-		if item.variant_of and not item.get("reorder_levels"):
-			item.update_template_tables()
-
-		if item.get("reorder_levels"):
-			for d in item.get("reorder_levels"):
-				add_to_material_request(item_code, d.warehouse, d.warehouse_reorder_level,
-					d.warehouse_reorder_qty, d.material_request_type, warehouse_group=d.warehouse_group)
-
-	if material_requests:
-		return create_material_request(material_requests)
-
-def get_item_warehouse_projected_qty(items_to_consider):
-	item_warehouse_projected_qty = {}
-
-	for item_code, warehouse, projected_qty in frappe.db.sql("""select item_code, warehouse, projected_qty
-		from tabBin where item_code in ({0})
-			and (warehouse != "" and warehouse is not null)"""\
-		.format(", ".join(["%s"] * len(items_to_consider))), items_to_consider):
-
-		if item_code not in item_warehouse_projected_qty:
-			item_warehouse_projected_qty.setdefault(item_code, {})
-
-		if warehouse not in item_warehouse_projected_qty.get(item_code):
-			item_warehouse_projected_qty[item_code][warehouse] = flt(projected_qty)
-
-		warehouse_doc = frappe.get_doc("Warehouse", warehouse)
-
-		while warehouse_doc.parent_warehouse:
-			if not item_warehouse_projected_qty.get(item_code, {}).get(warehouse_doc.parent_warehouse):
-				item_warehouse_projected_qty.setdefault(item_code, {})[warehouse_doc.parent_warehouse] = flt(projected_qty)
-			else:
-				item_warehouse_projected_qty[item_code][warehouse_doc.parent_warehouse] += flt(projected_qty)
-			warehouse_doc = frappe.get_doc("Warehouse", warehouse_doc.parent_warehouse)
-
-	return item_warehouse_projected_qty
+		if not items:
+			break
+
+		item_condition = ", ".join(frappe.db.escape(d) for d in items)
+		for d in frappe.db.sql("""
+			select ir.item_code, ir.warehouse, ir.material_request_type,
+				ir.reorder_level, ir.reorder_qty, wh.company,
+				ifnull(sum(bin.projected_qty), 0) as projected_qty
+			from (
+				select item.name as item_code, ir.name as reorder_row, ir.idx, ir.warehouse,
+					ir.warehouse_group, ir.warehouse_reorder_level as reorder_level,
+					ir.warehouse_reorder_qty as reorder_qty, ir.material_request_type
+				from `tabItem` item, `tabItem Reorder` ir
+				where ir.parent = item.name and ir.parenttype = 'Item' and item.name in ({0})
+				union all
+				select item.name, ir.name, ir.idx, ir.warehouse,
+					null, ir.warehouse_reorder_level,
+					ir.warehouse_reorder_qty, ir.material_request_type
+				from `tabItem` item, `tabItem Reorder` ir
+				where ir.parent = item.variant_of and ir.parenttype = 'Item' and item.name in ({0})
+					and not exists (select name from `tabItem Reorder` own
+						where own.parent = item.name and own.parenttype = 'Item')
+			) ir
+			inner join `tabWarehouse` wh on wh.name = ir.warehouse and wh.disabled = 0
+			left join `tabWarehouse` target on target.name = ifnull(nullif(ir.warehouse_group, ''), ir.warehouse)
+			left join `tabWarehouse` child on child.lft >= target.lft and child.rgt <= target.rgt
+			left join `tabBin` bin on bin.item_code = ir.item_code and bin.warehouse = child.name
+			group by ir.item_code, ir.reorder_row
+			having (ir.reorder_level != 0 or ir.reorder_qty != 0) and projected_qty < ir.reorder_level
+			order by ir.item_code, ir.idx""".format(item_condition), as_dict=1):
+			yield d
+
+		last_item_code = items[-1]
+
+def get_material_request_chunks(material_requests):
+	"""Yields the request type, company and items of each Material Request to be created"""
+	for request_type in material_requests:
+		for company in material_requests[request_type]:
+			items = material_requests[request_type][company]
+			for start in range(0, len(items), MATERIAL_REQUEST_MAX_ITEMS):
+				yield request_type, company, items[start:start + MATERIAL_REQUEST_MAX_ITEMS]
+
+def get_item_details_map(item_codes):
+	return {d.name: d for d in frappe.db.sql("""
+		select item.name, item.item_name, item.description, item.item_group, item.brand,
+			item.stock_uom, item.purchase_uom, item.lead_time_days,
+			uom.conversion_factor as purchase_conversion_factor
+		from `tabItem` item
+		left join `tabUOM Conversion Detail` uom on uom.parent = item.name and uom.uom = item.purchase_uom
+		where item.name in ({0})""".format(", ".join(["%s"] * len(item_codes))),
+		tuple(item_codes), as_dict=1)}
 
 def create_material_request(material_requests):
 	"""	Create indent on reaching reorder level	"""
@@ -119,55 +152,54 @@ def create_material_request(material_requests):
 
 		frappe.log_error(frappe.get_traceback())
 
-	for request_type in material_requests:
-		for company in material_requests[request_type]:
-			try:
-				items = material_requests[request_type][company]
-				if not items:
-					continue
-
-				mr = frappe.new_doc("Material Request")
-				mr.update({
-					"company": company,
-					"transaction_date": nowdate(),
-					"material_request_type": "Material Transfer" if request_type=="Transfer" else request_type
+	for request_type, company, items in get_material_request_chunks(material_requests):
+		try:
+			if not items:
+				continue
+
+			item_details = get_item_details_map(list(set(d["item_code"] for d in items)))
+
+			mr = frappe.new_doc("Material Request")
+			mr.update({
+				"company": company,
+				"transaction_date": nowdate(),
+				"material_request_type": "Material Transfer" if request_type=="Transfer" else request_type
+			})
+
+			for d in items:
+				d = frappe._dict(d)
+				item = item_details[d.item_code]
+				uom = item.stock_uom
+				conversion_factor = 1.0
+
+				if request_type == 'Purchase':
+					uom = item.purchase_uom or item.stock_uom
+					if uom != item.stock_uom:
+						conversion_factor = flt(item.purchase_conversion_factor) or 1.0
+
+				mr.append("items", {
+					"doctype": "Material Request Item",
+					"item_code": d.item_code,
+					"schedule_date": add_days(nowdate(),cint(item.lead_time_days)),
+					"qty": d.reorder_qty / conversion_factor,
+					"uom": uom,
+					"stock_uom": item.stock_uom,
+					"warehouse": d.warehouse,
+					"item_name": item.item_name,
+					"description": item.description,
+					"item_group": item.item_group,
+					"brand": item.brand,
 				})
 
-				for d in items:
-					d = frappe._dict(d)
-					item = frappe.get_doc("Item", d.item_code)
-					uom = item.stock_uom
-					conversion_factor = 1.0
-
-					if request_type == 'Purchase':
-						uom = item.purchase_uom or item.stock_uom
-						if uom != item.stock_uom:
-							conversion_factor = frappe.db.get_value("UOM Conversion Detail",
-								{'parent': item.name, 'uom': uom}, 'conversion_factor') or 1.0
-
-					mr.append("items", {
-						"doctype": "Material Request Item",
-						"item_code": d.item_code,
-						"schedule_date": add_days(nowdate(),cint(item.lead_time_days)),
-						"qty": d.reorder_qty / conversion_factor,
-						"uom": uom,
-						"stock_uom": item.stock_uom,
-						"warehouse": d.warehouse,
-						"item_name": item.item_name,
-						"description": item.description,
-						"item_group": item.item_group,
-						"brand": item.brand,
-					})
-
-				schedule_dates = [d.schedule_date for d in mr.items]
-				mr.schedule_date = max(schedule_dates or [nowdate()])
-				mr.flags.ignore_mandatory = True
-				mr.insert()
-				mr.submit()
-				mr_list.append(mr)
-
-			except:
-				_log_exception()
+			schedule_dates = [d.schedule_date for d in mr.items]
+			mr.schedule_date = max(schedule_dates or [nowdate()])
+			mr.flags.ignore_mandatory = True
+			mr.insert()
+			mr.submit()
+			mr_list.append(mr)
+
+		except:
+			_log_exception()
 
 	if mr_list:
 		if getattr(frappe.local, "reorder_email_notify", None) is None:
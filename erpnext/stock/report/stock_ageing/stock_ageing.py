@@ -6,8 +6,13 @@ import frappe
 from frappe import _
 from frappe.utils import date_diff, flt
 from six import iteritems
+from collections import OrderedDict, deque
+from itertools import groupby
 from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos
 
+# number of items whose stock ledger entries are read per query
+AGEING_ITEM_BATCH_SIZE = 100
+
 def execute(filters=None):
 
 	columns = get_columns(filters)
@@ -135,19 +140,40 @@ def get_columns(filters):
 	return columns
 
 def get_fifo_queue(filters, sle=None):
+	"""
+		Returns the FIFO queue of every item, or item-warehouse if `show_warehouse_wise_stock` is set.
+
+		Entries are processed one item at a time, transfers between warehouses keep the
+		age of the transferred stock. If `sle` is not given, the entries are read from the
+		database in batches of items instead of loading the complete ledger.
+	"""
 	item_details = {}
-	transferred_item_details = {}
-	serial_no_batch_purchase_details = {}
 
 	if sle == None:
-		sle = get_stock_ledger_entries(filters)
+		item_wise_sle = get_item_wise_stock_ledger_entries(filters)
+	else:
+		item_wise_sle = group_by_item(sle)
 
-	for d in sle:
+	for item_sle in item_wise_sle:
+		item_details.update(get_item_fifo_queue(filters, item_sle))
+
+	return item_details
+
+def get_item_fifo_queue(filters, item_sle):
+	"""Returns the FIFO queues of an item, `item_sle` are its entries in posting order"""
+	item_details = {}
+	transferred_item_details = {}
+	serial_no_batch_purchase_details = {}
+
+	for d in item_sle:
 		key = (d.name, d.warehouse) if filters.get('show_warehouse_wise_stock') else d.name
-		item_details.setdefault(key, {"details": d, "fifo_queue": []})
-		fifo_queue = item_details[key]["fifo_queue"]
+		if key not in item_details:
+			# qty batches are dequeued from the left, serial nos are removed by their index
+			item_details[key] = {"details": d, "batches": deque(), "serial_nos": OrderedDict()}
 
-		transferred_item_details.setdefault((d.voucher_no, d.name), [])
+		batches = item_details[key]["batches"]
+		serial_nos = item_details[key]["serial_nos"]
+		transferred_batches = transferred_item_details.setdefault(d.voucher_no, deque())
 
 		if d.voucher_type == "Stock Reconciliation":
 			d.actual_qty = flt(d.qty_after_transaction) - flt(item_details[key].get("qty_after_transaction", 0))
@@ -155,38 +181,34 @@ def get_fifo_queue(filters, sle=None):
 		serial_no_list = get_serial_nos(d.serial_no) if d.serial_no else []
 
 		if d.actual_qty > 0:
-			if transferred_item_details.get((d.voucher_no, d.name)):
-				batch = transferred_item_details[(d.voucher_no, d.name)][0]
-				fifo_queue.append(batch)
-				transferred_item_details[((d.voucher_no, d.name))].pop(0)
+			if transferred_batches:
+				batches.append(transferred_batches.popleft())
 			else:
 				if serial_no_list:
 					for serial_no in serial_no_list:
-						if serial_no_batch_purchase_details.get(serial_no):
-							fifo_queue.append([serial_no, serial_no_batch_purchase_details.get(serial_no)])
-						else:
-							serial_no_batch_purchase_details.setdefault(serial_no, d.posting_date)
-							fifo_queue.append([serial_no, d.posting_date])
+						if serial_no not in serial_no_batch_purchase_details:
+							serial_no_batch_purchase_details[serial_no] = d.posting_date
+
+						serial_nos[serial_no] = [serial_no, serial_no_batch_purchase_details[serial_no]]
 				else:
-					fifo_queue.append([d.actual_qty, d.posting_date])
+					batches.append([d.actual_qty, d.posting_date])
 		else:
 			if serial_no_list:
-				for serial_no in fifo_queue:
-					if serial_no[0] in serial_no_list:
-						fifo_queue.remove(serial_no)
+				for serial_no in serial_no_list:
+					serial_nos.pop(serial_no, None)
 			else:
 				qty_to_pop = abs(d.actual_qty)
 				while qty_to_pop:
-					batch = fifo_queue[0] if fifo_queue else [0, None]
+					batch = batches[0] if batches else [0, None]
 					if 0 < batch[0] <= qty_to_pop:
 						# if batch qty > 0
 						# not enough or exactly same qty in current batch, clear batch
 						qty_to_pop -= batch[0]
-						transferred_item_details[(d.voucher_no, d.name)].append(fifo_queue.pop(0))
+						transferred_batches.append(batches.popleft())
 					else:
 						# all from current batch
 						batch[0] -= qty_to_pop
-						transferred_item_details[(d.voucher_no, d.name)].append([qty_to_pop, batch[1]])
+						transferred_batches.append([qty_to_pop, batch[1]])
 						qty_to_pop = 0
 
 		item_details[key]["qty_after_transaction"] = d.qty_after_transaction
@@ -196,9 +218,36 @@ def get_fifo_queue(filters, sle=None):
 		else:
 			item_details[key]["total_qty"] += d.actual_qty
 
+	for details in item_details.values():
+		details["fifo_queue"] = list(details.pop("batches")) + list(details.pop("serial_nos").values())
+
 	return item_details
 
-def get_stock_ledger_entries(filters):
+def group_by_item(sle):
+	item_wise_sle = OrderedDict()
+	for d in sle:
+		item_wise_sle.setdefault(d.name, []).append(d)
+
+	return item_wise_sle.values()
+
+def get_item_wise_stock_ledger_entries(filters):
+	"""Yields the entries of one item at a time, reading `AGEING_ITEM_BATCH_SIZE` items per query"""
+	items = frappe.db.sql_list("""select name from `tabItem` {item_conditions}
+		order by name""".format(item_conditions=get_item_conditions(filters)), filters)
+
+	for start in range(0, len(items), AGEING_ITEM_BATCH_SIZE):
+		sle = get_stock_ledger_entries(filters, items[start:start + AGEING_ITEM_BATCH_SIZE])
+
+		for item_code, item_sle in groupby(sle, key=lambda d: d.name):
+			yield item_sle
+
+def get_stock_ledger_entries(filters, items=None):
+	item_sle_conditions, order_by = "", ""
+	if items:
+		item_sle_conditions = "and item_code in ({0})".format(
+			", ".join([frappe.db.escape(d) for d in items]))
+		order_by = "item_code, "
+
 	return frappe.db.sql("""select
 			item.name, item.item_name, item_group, brand, description, item.stock_uom,
 			actual_qty, posting_date, voucher_type, voucher_no, serial_no, batch_no, qty_after_transaction, warehouse
@@ -208,10 +257,12 @@ def get_stock_ledger_entries(filters):
 		where item_code = item.name and
 			company = %(company)s and
 			posting_date <= %(to_date)s
-			{sle_conditions}
-			order by posting_date, posting_time, sle.creation, actual_qty""" #nosec
+			{sle_conditions} {item_sle_conditions}
+			order by {order_by}posting_date, posting_time, sle.creation, actual_qty""" #nosec
 		.format(item_conditions=get_item_conditions(filters),
-			sle_conditions=get_sle_conditions(filters)), filters, as_dict=True)
+			sle_conditions=get_sle_conditions(filters),
+			item_sle_conditions=item_sle_conditions,
+			order_by=order_by), filters, as_dict=True)
 
 def get_item_conditions(filters):
 	conditions = []
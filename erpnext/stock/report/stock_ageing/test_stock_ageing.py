@@ -0,0 +1,43 @@
+# Copyright (c) 2015, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, getdate
+from erpnext.stock.report.stock_ageing.stock_ageing import get_fifo_queue
+
+class TestStockAgeing(unittest.TestCase):
+	def test_fifo_queue(self):
+		posting_date = getdate("2019-01-01")
+		sle = [
+			make_sle("Item A", "Stores", 10, posting_date, "SE-1"),
+			make_sle("Item B", "Stores", 1, posting_date, "SE-2", serial_no="SN-1\nSN-2"),
+			make_sle("Item A", "Stores", 5, add_days(posting_date, 10), "SE-3"),
+			# transfer keeps the age of the oldest stock
+			make_sle("Item A", "Stores", -12, add_days(posting_date, 20), "SE-4"),
+			make_sle("Item A", "Finished Goods", 12, add_days(posting_date, 20), "SE-4"),
+			make_sle("Item B", "Stores", -1, add_days(posting_date, 30), "SE-5", serial_no="SN-1")
+		]
+
+		item_details = get_fifo_queue(frappe._dict({"show_warehouse_wise_stock": 1}), sle)
+
+		self.assertEqual(item_details[("Item A", "Stores")]["fifo_queue"],
+			[[3, add_days(posting_date, 10)]])
+		self.assertEqual(item_details[("Item A", "Finished Goods")]["fifo_queue"],
+			[[10, posting_date]])
+		self.assertEqual(item_details[("Item B", "Stores")]["fifo_queue"],
+			[["SN-2", posting_date]])
+
+def make_sle(item_code, warehouse, qty, posting_date, voucher_no, serial_no=None):
+	return frappe._dict({
+		"name": item_code,
+		"warehouse": warehouse,
+		"actual_qty": qty,
+		"qty_after_transaction": 0,
+		"posting_date": posting_date,
+		"voucher_type": "Stock Entry",
+		"voucher_no": voucher_no,
+		"serial_no": serial_no
+	})
@@ -7,6 +7,7 @@ from frappe import _
 from frappe.utils import flt, cint, getdate, now, date_diff
 from erpnext.stock.utils import add_additional_uom_columns
 from erpnext.stock.report.stock_ledger.stock_ledger import get_item_group_condition
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import get_snapshot_date
 
 from erpnext.stock.report.stock_ageing.stock_ageing import get_fifo_queue, get_average_age
 
@@ -23,18 +24,25 @@ def execute(filters=None):
 	include_uom = filters.get("include_uom")
 	columns = get_columns(filters)
 	items = get_items(filters)
-	sle = get_stock_ledger_entries(filters, items)
+
+	# start from the month end balances before from date, stock ageing needs the full ledger
+	snapshot_date = None
+	if not filters.get('show_stock_ageing_data'):
+		snapshot_date = get_snapshot_date(from_date)
+
+	opening_balances = get_opening_balances(filters, items, snapshot_date)
+	sle = get_stock_ledger_entries(filters, items, snapshot_date, opening_balances)
 
 	if filters.get('show_stock_ageing_data'):
 		filters['show_warehouse_wise_stock'] = True
 		item_wise_fifo_queue = get_fifo_queue(filters, sle)
 
 	# if no stock ledger entry found return
-	if not sle:
+	if not sle and not opening_balances:
 		return columns, []
 
-	iwb_map = get_item_warehouse_map(filters, sle)
-	item_map = get_item_details(items, sle, filters)
+	iwb_map = get_item_warehouse_map(filters, sle, opening_balances)
+	item_map = get_item_details(items, list(sle) + list(opening_balances), filters)
 	item_reorder_detail_map = get_item_reorder_details(item_map.keys())
 
 	data = []
@@ -146,32 +154,83 @@ def get_conditions(filters):
 
 	return conditions
 
-def get_stock_ledger_entries(filters, items):
-	item_conditions_sql = ''
-	if items:
-		item_conditions_sql = ' and sle.item_code in ({})'\
-			.format(', '.join([frappe.db.escape(i, percent=False) for i in items]))
-
+def get_stock_ledger_entries(filters, items, snapshot_date=None, opening_balances=None):
+	item_conditions_sql = get_item_conditions(items)
 	conditions = get_conditions(filters)
 
+	if not snapshot_date:
+		return get_sl_entries(item_conditions_sql + conditions)
+
+	# only the entries after the snapshot date, the balances upto it are in the snapshots
+	sl_entries = get_sl_entries(item_conditions_sql + conditions
+		+ " and sle.posting_date > {0}".format(frappe.db.escape(snapshot_date)))
+
+	# the item-warehouses without a snapshot are read from the start of the ledger
+	item_warehouses_with_snapshot = set((d.item_code, d.warehouse) for d in opening_balances or [])
+	item_warehouses = [d for d in frappe.db.sql("""select sle.item_code, sle.warehouse
+		from `tabBin` sle where 1=1 %s""" % item_conditions_sql) #nosec
+		if (d[0], d[1]) not in item_warehouses_with_snapshot]
+
+	if not item_warehouses:
+		return sl_entries
+
+	return get_sl_entries(conditions
+		+ " and sle.posting_date <= {0} and (sle.item_code, sle.warehouse) in ({1})".format(
+			frappe.db.escape(snapshot_date), ", ".join("({0}, {1})".format(
+				frappe.db.escape(item_code, percent=False), frappe.db.escape(warehouse, percent=False))
+				for item_code, warehouse in item_warehouses)),
+		index_hint="") + sl_entries
+
+def get_sl_entries(conditions, index_hint="force index (posting_sort_index)"):
 	return frappe.db.sql("""
 		select
 			sle.item_code, warehouse, sle.posting_date, sle.actual_qty, sle.valuation_rate,
 			sle.company, sle.voucher_type, sle.qty_after_transaction, sle.stock_value_difference,
 			sle.item_code as name, sle.voucher_no
 		from
-			`tabStock Ledger Entry` sle force index (posting_sort_index)
-		where sle.docstatus < 2 %s %s
+			`tabStock Ledger Entry` sle %s
+		where sle.docstatus < 2 %s
 		order by sle.posting_date, sle.posting_time, sle.creation, sle.actual_qty""" % #nosec
-		(item_conditions_sql, conditions), as_dict=1)
+		(index_hint, conditions), as_dict=1)
 
-def get_item_warehouse_map(filters, sle):
+def get_item_conditions(items):
+	item_conditions_sql = ''
+	if items:
+		item_conditions_sql = ' and sle.item_code in ({})'\
+			.format(', '.join([frappe.db.escape(i, percent=False) for i in items]))
+
+	return item_conditions_sql
+
+def get_opening_balances(filters, items, snapshot_date):
+	"""Returns the stock balance snapshots taken on the snapshot date"""
+	if not snapshot_date:
+		return []
+
+	return frappe.db.sql("""
+		select
+			sle.company, sle.item_code, sle.warehouse, sle.qty_after_transaction,
+			sle.valuation_rate, sle.stock_value
+		from
+			`tabStock Balance Snapshot` sle
+		where sle.posting_date = %s %s %s""" % #nosec
+		(frappe.db.escape(snapshot_date), get_item_conditions(items), get_conditions(filters)), as_dict=1)
+
+def get_item_warehouse_map(filters, sle, opening_balances=None):
 	iwb_map = {}
 	from_date = getdate(filters.get("from_date"))
 	to_date = getdate(filters.get("to_date"))
 
 	float_precision = cint(frappe.db.get_default("float_precision")) or 3
 
+	for d in opening_balances or []:
+		iwb_map[(d.company, d.item_code, d.warehouse)] = frappe._dict({
+			"opening_qty": flt(d.qty_after_transaction), "opening_val": flt(d.stock_value),
+			"in_qty": 0.0, "in_val": 0.0,
+			"out_qty": 0.0, "out_val": 0.0,
+			"bal_qty": flt(d.qty_after_transaction), "bal_val": flt(d.stock_value),
+			"val_rate": flt(d.valuation_rate)
+		})
+
 	for d in sle:
 		key = (d.company, d.item_code, d.warehouse)
 		if key not in iwb_map:
@@ -2,8 +2,8 @@
 # License: GNU General Public License v3. See license.txt
 
 from __future__ import print_function, unicode_literals
-import frappe
-from frappe.utils import flt, cstr, nowdate, nowtime
+import frappe, json, time, zlib
+from frappe.utils import flt, cstr, cint, nowdate, nowtime, now
 from erpnext.stock.utils import update_bin
 from erpnext.stock.stock_ledger import update_entries_after
 from erpnext.controllers.stock_controller import update_gl_entries_after
@@ -18,13 +18,7 @@ def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False,
 		existing_allow_negative_stock = frappe.db.get_value("Stock Settings", None, "allow_negative_stock")
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
 
-	item_warehouses = frappe.db.sql("""
-		select distinct item_code, warehouse
-		from
-			(select item_code, warehouse from tabBin
-			union
-			select item_code, warehouse from `tabStock Ledger Entry`) a
-	""")
+	item_warehouses = get_item_warehouses()
 	for d in item_warehouses:
 		try:
 			repost_stock(d[0], d[1], allow_zero_rate, only_actual, only_bin, allow_negative_stock)
@@ -36,6 +30,144 @@ def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False,
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", existing_allow_negative_stock)
 	frappe.db.auto_commit_on_many_writes = 0
 
+def get_item_warehouses(after=None):
+	"""Returns item-warehouse pairs in order, only the ones after the given pair if set"""
+	return frappe.db.sql("""
+		select distinct item_code, warehouse
+		from
+			(select item_code, warehouse from tabBin
+			union
+			select item_code, warehouse from `tabStock Ledger Entry`) a
+		{0}
+		order by item_code, warehouse
+	""".format("where (item_code, warehouse) > (%s, %s)" if after else ""), tuple(after or ()))
+
+def repost_in_partitions(partitions=4, only_actual=False, allow_negative_stock=False,
+	allow_zero_rate=False, only_bin=False, repost_id=None):
+	"""
+	Repost all item-warehouses in parallel background jobs.
+
+	Item-warehouse pairs are split into `partitions` by item code, so that every
+	partition can be reposted by a separate worker. Pass the `repost_id` of an
+	earlier run to resume each partition from its last checkpoint.
+	"""
+	partitions = cint(partitions) or 1
+	repost_id = repost_id or frappe.generate_hash(length=10)
+
+	progress = get_repost_progress(repost_id)
+	for partition_no in range(partitions):
+		if partition_no not in progress:
+			set_repost_progress(repost_id, partition_no, frappe._dict({"partitions": partitions,
+				"status": "Queued"}))
+	frappe.db.commit()
+
+	for partition_no in range(partitions):
+		frappe.enqueue(repost_partition, queue="long", timeout=24 * 3600,
+			repost_id=repost_id, partition_no=partition_no, partitions=partitions,
+			only_actual=only_actual, allow_negative_stock=allow_negative_stock,
+			allow_zero_rate=allow_zero_rate, only_bin=only_bin)
+
+	return repost_id
+
+def get_partition_no(item_code, partitions):
+	return zlib.crc32(cstr(item_code).encode("utf-8")) % partitions
+
+def repost_partition(repost_id, partition_no, partitions, only_actual=False,
+	allow_negative_stock=False, allow_zero_rate=False, only_bin=False):
+	"""Repost item-warehouses of a partition, checkpointing with every committed pair"""
+	frappe.db.auto_commit_on_many_writes = 1
+
+	progress = get_repost_progress(repost_id).get(partition_no) or frappe._dict()
+	progress.update({
+		"partitions": partitions,
+		"total": len([d for d in get_item_warehouses() if get_partition_no(d[0], partitions) == partition_no]),
+		"status": "Running",
+		"started_on": now()
+	})
+	set_repost_progress(repost_id, partition_no, progress)
+	frappe.db.commit()
+
+	# pairs after the checkpoint are read in the database collation, the same one they are ordered by
+	item_warehouses = [d for d in get_item_warehouses(after=progress.last_item_warehouse)
+		if get_partition_no(d[0], partitions) == partition_no]
+
+	for item_code, warehouse in item_warehouses:
+		start = time.time()
+		try:
+			repost_stock(item_code, warehouse, allow_zero_rate, only_actual, only_bin, allow_negative_stock)
+		except Exception:
+			frappe.db.rollback()
+			traceback = frappe.get_traceback()
+			frappe.log_error(traceback, "Stock Repost Failed for {0} in {1}".format(item_code, warehouse))
+
+			progress.failed.append([item_code, warehouse])
+			progress.error_log = "{0}{1} / {2}\n{3}\n".format(progress.error_log or "",
+				item_code, warehouse, traceback)
+
+		progress.completed += 1
+		progress.elapsed += time.time() - start
+		progress.last_item_warehouse = [item_code, warehouse]
+
+		# the checkpoint is committed with the reposted pair
+		set_repost_progress(repost_id, partition_no, progress)
+		frappe.db.commit()
+
+	progress.update({
+		"status": "Completed",
+		"completed_on": now()
+	})
+	set_repost_progress(repost_id, partition_no, progress)
+	frappe.db.commit()
+
+	frappe.db.auto_commit_on_many_writes = 0
+
+def get_repost_progress(repost_id):
+	"""Returns progress and timings of every partition of a partitioned repost"""
+	progress = {}
+	for d in frappe.get_all("Stock Repost Partition", filters={"repost_id": repost_id},
+		fields=["partition_no", "partitions", "status", "total", "completed", "last_item_code",
+			"last_warehouse", "failed", "error_log", "elapsed", "started_on", "completed_on"]):
+		d.update({
+			"completed": cint(d.completed),
+			"elapsed": flt(d.elapsed),
+			"failed": json.loads(d.failed) if d.failed else [],
+			"last_item_warehouse": [d.last_item_code, d.last_warehouse] if d.last_item_code else None
+		})
+		progress[cint(d.partition_no)] = d
+
+	return progress
+
+def set_repost_progress(repost_id, partition_no, progress):
+	# one row per partition, so that workers never overwrite each other
+	progress.setdefault("completed", 0)
+	progress.setdefault("failed", [])
+	progress.setdefault("elapsed", 0.0)
+
+	values = {
+		"partitions": progress.get("partitions"),
+		"status": progress.get("status"),
+		"total": progress.get("total"),
+		"completed": progress.completed,
+		"last_item_code": (progress.get("last_item_warehouse") or [None, None])[0],
+		"last_warehouse": (progress.get("last_item_warehouse") or [None, None])[1],
+		"failed": json.dumps(progress.failed),
+		"error_log": progress.get("error_log"),
+		"elapsed": progress.elapsed,
+		"started_on": progress.get("started_on"),
+		"completed_on": progress.get("completed_on")
+	}
+
+	name = frappe.db.get_value("Stock Repost Partition", {"repost_id": repost_id, "partition_no": partition_no})
+	if name:
+		frappe.db.set_value("Stock Repost Partition", name, values, update_modified=False)
+	else:
+		values.update({
+			"doctype": "Stock Repost Partition",
+			"repost_id": repost_id,
+			"partition_no": partition_no
+		})
+		frappe.get_doc(values).insert(ignore_permissions=True)
+
 def repost_stock(item_code, warehouse, allow_zero_rate=False,
 	only_actual=False, only_bin=False, allow_negative_stock=False):
 
@@ -174,6 +306,7 @@ def update_bin_qty(item_code, warehouse, qty_dict=None):
 		bin.set_projected_qty()
 		bin.db_update()
 		bin.clear_cache()
+		bin.clear_website_stock_qty()
 
 def set_stock_balance_as_per_serial_no(item_code=None, posting_date=None, posting_time=None,
 	 	fiscal_year=None):
@@ -5,8 +5,8 @@ from __future__ import unicode_literals
 import frappe, erpnext
 from frappe import _
 from frappe.utils import cint, flt, cstr, now
-from erpnext.stock.utils import get_valuation_method
-import json
+from erpnext.stock.utils import get_valuation_method, load_stock_queue, dump_stock_queue
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import invalidate_stock_balance_snapshots
 
 from six import iteritems
 
@@ -16,6 +16,11 @@ class NegativeStockError(frappe.ValidationError): pass
 _exceptions = frappe.local('stockledger_exceptions')
 # _exceptions = []
 
+# number of reposted stock ledger entries written back per UPDATE query
+SLE_UPDATE_BATCH_SIZE = 500
+SLE_REPOST_FIELDS = ("qty_after_transaction", "valuation_rate", "stock_value",
+	"stock_queue", "stock_value_difference")
+
 def make_sl_entries(sl_entries, is_amended=None, allow_negative_stock=False, via_landed_cost_voucher=False):
 	if sl_entries:
 		from erpnext.stock.utils import update_bin
@@ -75,12 +80,17 @@ class update_entries_after(object):
 				"posting_date": "2012-12-12",
 				"posting_time": "12:00"
 			}
+
+		If `defer_future_repost` is set, only entries up to the given posting datetime
+		are reposted and the rest are queued as a Stock Repost Request
 	"""
-	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False, verbose=1):
+	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False,
+		verbose=1, defer_future_repost=False):
 		from frappe.model.meta import get_field_precision
 
 		self.exceptions = []
 		self.verbose = verbose
+		self.defer_future_repost = defer_future_repost
 		self.allow_zero_rate = allow_zero_rate
 		self.allow_negative_stock = allow_negative_stock
 		self.via_landed_cost_voucher = via_landed_cost_voucher
@@ -103,9 +113,10 @@ class update_entries_after(object):
 			currency=frappe.get_cached_value('Company',  self.company,  "default_currency"))
 
 		self.prev_stock_value = self.previous_sle.stock_value or 0.0
-		self.stock_queue = json.loads(self.previous_sle.stock_queue or "[]")
+		self.stock_queue = load_stock_queue(self.previous_sle.stock_queue)
 		self.valuation_method = get_valuation_method(self.item_code)
 		self.stock_value_difference = 0.0
+		self.sle_updates = []
 		self.build()
 
 	def build(self):
@@ -115,12 +126,29 @@ class update_entries_after(object):
 		for sle in entries_to_fix:
 			self.process_sle(sle)
 
+		# write back any reposted entries still pending
+		self.update_sle_values()
+
+		# month end balances after the reposted entries are built again by the next scheduled run
+		invalidate_stock_balance_snapshots(self.item_code, self.warehouse, self.args.get("posting_date"))
+
 		if self.exceptions:
 			self.raise_exceptions()
 
-		self.update_bin()
+		repost_request = None
+		if self.defer_future_repost:
+			from erpnext.stock.doctype.stock_repost_request.stock_repost_request import queue_repost_for_future_entries
+			self.validate_future_negative_qty()
+			repost_request = queue_repost_for_future_entries(self.args)
 
-	def update_bin(self):
+		if repost_request:
+			# the balance after the backdated entry is not the current balance,
+			# so only its difference is added to the bin until the repost runs
+			self.update_bin(only_difference=True)
+		else:
+			self.update_bin()
+
+	def update_bin(self, only_difference=False):
 		# update bin
 		bin_name = frappe.db.get_value("Bin", {
 			"item_code": self.item_code,
@@ -137,11 +165,21 @@ class update_entries_after(object):
 		else:
 			bin_doc = frappe.get_doc("Bin", bin_name)
 
-		bin_doc.update({
-			"valuation_rate": self.valuation_rate,
-			"actual_qty": self.qty_after_transaction,
-			"stock_value": self.stock_value
-		})
+		if only_difference:
+			# actual qty is already updated by `Bin.update_qty`
+			stock_value = flt(bin_doc.stock_value) + flt(self.stock_value) \
+				- flt(self.previous_sle.get("stock_value"))
+			bin_doc.update({
+				"valuation_rate": flt(stock_value) / flt(bin_doc.actual_qty) if flt(bin_doc.actual_qty) \
+					else bin_doc.valuation_rate,
+				"stock_value": flt(stock_value, self.precision)
+			})
+		else:
+			bin_doc.update({
+				"valuation_rate": self.valuation_rate,
+				"actual_qty": self.qty_after_transaction,
+				"stock_value": self.stock_value
+			})
 		bin_doc.flags.via_stock_ledger_entry = True
 
 		bin_doc.save(ignore_permissions=True)
@@ -189,10 +227,20 @@ class update_entries_after(object):
 		sle.qty_after_transaction = self.qty_after_transaction
 		sle.valuation_rate = self.valuation_rate
 		sle.stock_value = self.stock_value
-		sle.stock_queue = json.dumps(self.stock_queue)
+		sle.stock_queue = dump_stock_queue(self.stock_queue)
 		sle.stock_value_difference = stock_value_difference
-		sle.doctype="Stock Ledger Entry"
-		frappe.get_doc(sle).db_update()
+
+		self.sle_updates.append(sle)
+		if len(self.sle_updates) >= SLE_UPDATE_BATCH_SIZE:
+			self.update_sle_values()
+
+	def update_sle_values(self):
+		"""Write the reposted values of pending entries back with a single multi-row update"""
+		if not self.sle_updates:
+			return
+
+		update_sle_values(self.sle_updates)
+		self.sle_updates = []
 
 	def validate_negative_stock(self, sle):
 		"""
@@ -209,6 +257,31 @@ class update_entries_after(object):
 		else:
 			return True
 
+	def validate_future_negative_qty(self):
+		"""
+			validate the quantities of the entries whose repost is deferred,
+			only their values are left to the repost
+		"""
+		if cint(self.allow_negative_stock):
+			return
+
+		qty_after_transaction = self.qty_after_transaction
+		for sle in frappe.db.sql("""select actual_qty, qty_after_transaction, voucher_type, voucher_no,
+				batch_no, posting_date, posting_time
+			from `tabStock Ledger Entry`
+			where item_code = %(item_code)s and warehouse = %(warehouse)s
+				and ifnull(is_cancelled, 'No') = 'No'
+				and timestamp(posting_date, posting_time) > timestamp(%(posting_date)s, %(posting_time)s)
+			order by timestamp(posting_date, posting_time) asc, creation asc""", self.args, as_dict=1):
+			if sle.voucher_type == "Stock Reconciliation" and not sle.batch_no:
+				qty_after_transaction = flt(sle.qty_after_transaction)
+				continue
+
+			qty_after_transaction += flt(sle.actual_qty)
+			if qty_after_transaction < 0 and abs(qty_after_transaction) > 0.0001:
+				self.exceptions.append(sle.update({"diff": qty_after_transaction}))
+				self.raise_exceptions()
+
 	def get_serialized_values(self, sle):
 		incoming_rate = flt(sle.incoming_rate)
 		actual_qty = flt(sle.actual_qty)
@@ -407,9 +480,14 @@ class update_entries_after(object):
 
 	def get_sle_after_datetime(self):
 		"""get Stock Ledger Entries after a particular datetime, for reposting"""
+		till_timestamp = None
+		if self.defer_future_repost:
+			# entries after the current transaction are reposted in the background
+			till_timestamp = (self.args.get("posting_date"), self.args.get("posting_time"))
+
 		return get_stock_ledger_entries(self.previous_sle or frappe._dict({
 				"item_code": self.args.get("item_code"), "warehouse": self.args.get("warehouse") }),
-			">", "asc", for_update=True, check_serial_no=False)
+			">", "asc", for_update=True, check_serial_no=False, till_timestamp=till_timestamp)
 
 	def raise_exceptions(self):
 		deficiency = min(e["diff"] for e in self.exceptions)
@@ -432,6 +510,27 @@ class update_entries_after(object):
 		else:
 			raise NegativeStockError(msg)
 
+def update_sle_values(entries, fields=SLE_REPOST_FIELDS, batch_size=SLE_UPDATE_BATCH_SIZE):
+	"""
+		update reposted fields of the given stock ledger entries
+		using one `update ... case name when ...` query per batch
+	"""
+	for start in range(0, len(entries), batch_size):
+		batch = entries[start:start + batch_size]
+
+		set_clauses, values = [], []
+		for fieldname in fields:
+			set_clauses.append("`{0}` = case name {1} end".format(fieldname,
+				" ".join(["when %s then %s"] * len(batch))))
+			for sle in batch:
+				values.extend([sle.name, sle.get(fieldname)])
+
+		values.extend([sle.name for sle in batch])
+
+		frappe.db.sql("""update `tabStock Ledger Entry` set {0}
+			where name in ({1})""".format(", ".join(set_clauses), ", ".join(["%s"] * len(batch))),
+			tuple(values))
+
 def get_previous_sle(args, for_update=False):
 	"""
 		get the last sle on or before the current time-bucket,
@@ -451,9 +550,12 @@ def get_previous_sle(args, for_update=False):
 	return sle and sle[0] or {}
 
 def get_stock_ledger_entries(previous_sle, operator=None,
-	order="desc", limit=None, for_update=False, debug=False, check_serial_no=True):
+	order="desc", limit=None, for_update=False, debug=False, check_serial_no=True, till_timestamp=None):
 	"""get stock ledger entries filtered by specific posting datetime conditions"""
 	conditions = " and timestamp(posting_date, posting_time) {0} timestamp(%(posting_date)s, %(posting_time)s)".format(operator)
+	if till_timestamp:
+		conditions += " and timestamp(posting_date, posting_time) <= timestamp({0}, {1})".format(
+			frappe.db.escape(cstr(till_timestamp[0])), frappe.db.escape(cstr(till_timestamp[1])))
 	if previous_sle.get("warehouse"):
 		conditions += " and warehouse = %(warehouse)s"
 	elif previous_sle.get("warehouse_condition"):
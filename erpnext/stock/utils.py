@@ -4,13 +4,16 @@
 from __future__ import unicode_literals
 import frappe, erpnext
 from frappe import _
-import json
+import json, struct, base64
 from frappe.utils import flt, cstr, nowdate, nowtime
 
 from six import string_types
 
 class InvalidWarehouseCompany(frappe.ValidationError): pass
 
+# stock queues are stored as base64 encoded little-endian (qty, rate) double pairs
+STOCK_QUEUE_PREFIX = "b64:"
+
 def get_stock_value_from_bin(warehouse=None, item_code=None):
 	values = {}
 	conditions = ""
@@ -199,7 +202,7 @@ def get_incoming_rate(args, raise_error_if_no_rate=True):
 		previous_sle = get_previous_sle(args)
 		if valuation_method == 'FIFO':
 			if previous_sle:
-				previous_stock_queue = json.loads(previous_sle.get('stock_queue', '[]') or '[]')
+				previous_stock_queue = load_stock_queue(previous_sle.get('stock_queue'))
 				in_rate = get_fifo_rate(previous_stock_queue, args.get("qty") or 0) if previous_stock_queue else 0
 		elif valuation_method == 'Moving Average':
 			in_rate = previous_sle.get('valuation_rate') or 0
@@ -228,6 +231,32 @@ def get_valuation_method(item_code):
 		val_method = frappe.db.get_value("Stock Settings", None, "valuation_method") or "FIFO"
 	return val_method
 
+def load_stock_queue(stock_queue):
+	"""Returns the FIFO queue as a list of [qty, rate] from a stored (packed or JSON) value"""
+	if not stock_queue:
+		return []
+
+	if isinstance(stock_queue, list):
+		return stock_queue
+
+	if stock_queue.startswith(STOCK_QUEUE_PREFIX):
+		data = base64.b64decode(stock_queue[len(STOCK_QUEUE_PREFIX):])
+		values = struct.unpack(str("<{0}d").format(len(data) // 8), data)
+		return [[values[i], values[i + 1]] for i in range(0, len(values), 2)]
+
+	# queues saved before the packed format
+	return json.loads(stock_queue)
+
+def dump_stock_queue(stock_queue):
+	"""Returns the packed representation of a FIFO queue of [qty, rate]"""
+	values = []
+	for qty, rate in stock_queue:
+		values.append(flt(qty))
+		values.append(flt(rate))
+
+	data = struct.pack(str("<{0}d").format(len(values)), *values)
+	return STOCK_QUEUE_PREFIX + base64.b64encode(data).decode("ascii")
+
 def get_fifo_rate(previous_stock_queue, qty):
 	"""get FIFO (average) Rate from Queue"""
 	if flt(qty) >= 0:
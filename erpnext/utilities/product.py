@@ -4,21 +4,36 @@
 from __future__ import unicode_literals
 
 import frappe
-from frappe.utils import cint, fmt_money, flt, nowdate, getdate
+from frappe.utils import cint, fmt_money, flt, nowdate
 from erpnext.accounts.doctype.pricing_rule.pricing_rule import get_pricing_rule_for_item
-from erpnext.stock.doctype.batch.batch import get_batch_qty
 
 def get_qty_in_stock(item_code, item_warehouse_field, warehouse=None):
 	in_stock, stock_qty = 0, ''
-	template_item_code, is_stock_item = frappe.db.get_value("Item", item_code, ["variant_of", "is_stock_item"])
+	template_item_code, is_stock_item = frappe.get_cached_value("Item", item_code, ["variant_of", "is_stock_item"])
 
 	if not warehouse:
-		warehouse = frappe.db.get_value("Item", item_code, item_warehouse_field)
+		warehouse = frappe.get_cached_value("Item", item_code, item_warehouse_field)
 
 	if not warehouse and template_item_code and template_item_code != item_code:
-		warehouse = frappe.db.get_value("Item", template_item_code, item_warehouse_field)
+		warehouse = frappe.get_cached_value("Item", template_item_code, item_warehouse_field)
 
 	if warehouse:
+		stock_qty = get_website_stock_qty(item_code, warehouse)
+		if stock_qty:
+			in_stock = stock_qty[0][0] > 0 and 1 or 0
+
+	return frappe._dict({"in_stock": in_stock, "stock_qty": stock_qty, "is_stock_item": is_stock_item})
+
+def get_website_stock_qty(item_code, warehouse):
+	"""
+		Sellable qty of the item in the warehouse in sales uom, without expired batches.
+
+		Cached per item and warehouse for the day, Bin, Batch and Item updates clear it.
+	"""
+	today = nowdate()
+	cached = frappe.cache().hget(get_website_stock_qty_key(item_code), warehouse)
+
+	if not cached or cached["date"] != today:
 		stock_qty = frappe.db.sql("""
 			select GREATEST(S.actual_qty - S.reserved_qty - S.reserved_qty_for_production - S.reserved_qty_for_sub_contract, 0) / IFNULL(C.conversion_factor, 1)
 			from tabBin S
@@ -28,44 +43,51 @@ def get_qty_in_stock(item_code, item_warehouse_field, warehouse=None):
 
 		if stock_qty:
 			stock_qty = adjust_qty_for_expired_items(item_code, stock_qty, warehouse)
-			in_stock = stock_qty[0][0] > 0 and 1 or 0
 
-	return frappe._dict({"in_stock": in_stock, "stock_qty": stock_qty, "is_stock_item": is_stock_item})
+		# only the warehouse's own field is written, the other warehouses of the item are left as they are
+		cached = {"date": today, "stock_qty": [list(d) for d in stock_qty]}
+		frappe.cache().hset(get_website_stock_qty_key(item_code), warehouse, cached)
+
+	return cached["stock_qty"]
+
+def get_website_stock_qty_key(item_code):
+	return "website_stock_qty:" + item_code
 
+def clear_website_stock_qty(item_code, warehouse=None):
+	"""
+		Clear the cached qty of the item, in all the warehouses if no warehouse is given.
+
+		A request reading the qty before this transaction commits may cache the old qty again,
+		it is kept at most until the end of the day.
+	"""
+	if warehouse:
+		frappe.cache().hdel(get_website_stock_qty_key(item_code), warehouse)
+	else:
+		frappe.cache().delete_value(get_website_stock_qty_key(item_code))
 
 def adjust_qty_for_expired_items(item_code, stock_qty, warehouse):
-	batches = frappe.get_all('Batch', filters=[{'item': item_code}], fields=['expiry_date', 'name'])
-	expired_batches = get_expired_batches(batches)
 	stock_qty = [list(item) for item in stock_qty]
 
-	for batch in expired_batches:
-		if warehouse:
-			stock_qty[0][0] = max(0, stock_qty[0][0] - get_batch_qty(batch, warehouse))
-		else:
-			stock_qty[0][0] = max(0, stock_qty[0][0] - qty_from_all_warehouses(get_batch_qty(batch)))
+	for batch in get_expired_batch_qty(item_code, warehouse):
+		stock_qty[0][0] = max(0, stock_qty[0][0] - flt(batch.qty))
 
 		if not stock_qty[0][0]:
 			break
 
 	return stock_qty
 
-
-def get_expired_batches(batches):
-	"""
-	:param batches: A list of dict in the form [{'expiry_date': datetime.date(20XX, 1, 1), 'name': 'batch_id'}, ...]
-	"""
-	return [b.name for b in batches if b.expiry_date and b.expiry_date <= getdate(nowdate())]
-
-
-def qty_from_all_warehouses(batch_info):
-	"""
-	:param batch_info: A list of dict in the form [{u'warehouse': u'Stores - I', u'qty': 0.8}, ...]
-	"""
-	qty = 0
-	for batch in batch_info:
-		qty = qty + batch.qty
-
-	return qty
+def get_expired_batch_qty(item_code, warehouse=None):
+	"""Qty of each expired batch of the item, in all the warehouses if no warehouse is given"""
+	return frappe.db.sql("""
+		select sle.batch_no, sum(sle.actual_qty) as qty
+		from `tabStock Ledger Entry` sle, `tabBatch` batch
+		where sle.batch_no = batch.name and batch.item = %(item_code)s
+			and batch.expiry_date <= %(today)s {0}
+		group by sle.batch_no""".format("and sle.warehouse = %(warehouse)s" if warehouse else ""), {
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"today": nowdate()
+		}, as_dict=1)
 
 def get_price(item_code, price_list, customer_group, company, qty=1):
 	template_item_code = frappe.db.get_value("Item", item_code, "variant_of")
@@ -0,0 +1,137 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import cstr
+
+# nested set trees whose closure is cached, the closure of a tree is rebuilt
+# whenever the version stamp of the tree changes
+TREE_DOCTYPES = ("Item Group", "Warehouse", "Account", "Cost Center", "Territory",
+	"Customer Group", "Supplier Group")
+
+def get_ancestors(doctype, name, throw=False):
+	"""Returns the node followed by its ancestors up to the root"""
+	node = get_node(doctype, name, throw)
+	return list(get_tree_closure(doctype).ancestors[node]) if node else []
+
+def get_descendants(doctype, name, throw=False):
+	"""Returns the node and all of its descendants, in tree order"""
+	node = get_node(doctype, name, throw)
+	return list(get_tree_closure(doctype).descendants[node]) if node else []
+
+def get_node(doctype, name, throw=False):
+	closure = get_tree_closure(doctype)
+
+	# names are matched like the database collation does, ignoring case and trailing spaces
+	node = name if name in closure.ancestors else closure.nodes.get(get_node_key(name))
+	if not node and throw:
+		frappe.throw(_("Invalid {0}").format(name))
+
+	return node
+
+def get_node_key(name):
+	return cstr(name).lower().rstrip(" ")
+
+def get_tree_closure(doctype):
+	"""Returns the ancestors and descendants of every node of the tree, shared by all the requests
+	of the site that read the same version of the tree"""
+	if not frappe.flags.tree_closures:
+		frappe.flags.tree_closures = {}
+
+	if doctype not in frappe.flags.tree_closures:
+		if doctype in (frappe.flags.changed_tree_doctypes or []):
+			# the tree was changed by this transaction, its closure is not shared before commit
+			closure = build_tree_closure(doctype)
+		else:
+			version = get_tree_version(doctype)
+			closure = frappe.cache().hget("tree_closure", doctype)
+
+			if not closure or closure.version != version:
+				closure = build_tree_closure(doctype)
+				closure.version = version
+				frappe.cache().hset("tree_closure", doctype, closure)
+
+		frappe.flags.tree_closures[doctype] = closure
+
+	return frappe.flags.tree_closures[doctype]
+
+def build_tree_closure(doctype):
+	parent_field = "parent_" + frappe.scrub(doctype)
+	closure = frappe._dict({"nodes": {}, "ancestors": {}, "descendants": {}})
+
+	nodes = frappe.db.sql("""select name, `{0}` as parent from `tab{1}` order by lft""".format(
+		parent_field, doctype), as_dict=1)
+	parents = {d.name: d.parent for d in nodes}
+
+	for d in nodes:
+		ancestors = [d.name]
+		parent = d.parent
+		# the parent check also stops at broken links and cycles
+		while parent and parent in parents and parent not in ancestors:
+			ancestors.append(parent)
+			parent = parents[parent]
+
+		closure.nodes[get_node_key(d.name)] = d.name
+		closure.ancestors[d.name] = ancestors
+
+		# nodes are read in tree order, so descendants keep it
+		for ancestor in ancestors:
+			closure.descendants.setdefault(ancestor, []).append(d.name)
+
+	return closure
+
+def get_tree_version(doctype):
+	return frappe.cache().hget("tree_closure_version", doctype) or bump_tree_version(doctype)
+
+def bump_tree_version(doctype):
+	"""Rebuild the closure of the tree on its next use, to be called after the tree is
+	rebuilt or updated directly"""
+	version = frappe.generate_hash(length=10)
+	frappe.cache().hset("tree_closure_version", doctype, version)
+
+	if frappe.flags.tree_closures:
+		frappe.flags.tree_closures.pop(doctype, None)
+
+	return version
+
+def bump_tree_versions(doctypes):
+	for doctype in doctypes:
+		bump_tree_version(doctype)
+
+def bump_all_tree_versions():
+	"""Rebuild all the closures after migrate, patches rebuild nested sets directly"""
+	bump_tree_versions(TREE_DOCTYPES)
+
+def clear_tree_closure(doc, method=None, *args):
+	"""Bump the version of the tree once the save, move, rename or delete of its node is committed"""
+	if doc.doctype not in TREE_DOCTYPES:
+		return
+
+	if frappe.flags.tree_closures:
+		frappe.flags.tree_closures.pop(doc.doctype, None)
+
+	if not frappe.flags.changed_tree_doctypes:
+		frappe.flags.changed_tree_doctypes = []
+
+	if doc.doctype not in frappe.flags.changed_tree_doctypes:
+		frappe.flags.changed_tree_doctypes.append(doc.doctype)
+
+	if not any(d[0] == bump_changed_tree_versions for d in frappe.local.before_commit):
+		frappe.local.before_commit.append([bump_changed_tree_versions, None, None])
+
+def bump_changed_tree_versions():
+	"""
+		Bump the versions of the trees changed by the transaction, called right before commit.
+
+		A request can still cache a closure read before the commit under the new version,
+		so the versions are bumped again by a job enqueued after the commit.
+	"""
+	doctypes = frappe.flags.changed_tree_doctypes
+	if not doctypes:
+		return
+
+	frappe.flags.changed_tree_doctypes = None
+	bump_tree_versions(doctypes)
+	frappe.enqueue(bump_tree_versions, queue="short", enqueue_after_commit=True, doctypes=doctypes)